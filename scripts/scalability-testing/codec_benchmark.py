@@ -0,0 +1,127 @@
+#!python
+
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#}}}
+
+'''Compare VIP payload codecs on typical driver scrape payloads.
+
+Builds the pubsub.push notifications a driver scrape produces from a
+registry CSV (one "all" message plus one message per point) and reports
+the encoded size and the time taken to encode and decode them with each
+available codec. Run from this directory in an activated environment:
+
+    python codec_benchmark.py fake18.csv
+'''
+
+import argparse
+import csv
+import random
+import timeit
+
+from volttron.platform import jsonrpc
+from volttron.platform.vip import codec
+
+
+def scrape_pushes(registry_file, device='devices/campus/building1/device'):
+    with open(registry_file) as f:
+        points = [row['Volttron Point Name'] for row in csv.DictReader(f)]
+    results = {point: random.uniform(0, 100) for point in points}
+    meta = {point: {'units': 'F', 'type': 'float', 'tz': 'US/Pacific'}
+            for point in points}
+    headers = {'Date': '2016-11-14T18:00:00.000000+00:00',
+               'TimeStamp': '2016-11-14T18:00:00.000000+00:00',
+               'min_compatible_version': '3.0',
+               'max_compatible_version': ''}
+
+    def push(topic, message):
+        return jsonrpc.json_method(
+            None, 'pubsub.push',
+            ['platform.driver', '', topic, headers, message], None)
+
+    pushes = [push(device + '/all', [results, meta])]
+    pushes.extend(push(device + '/' + point, [results[point], meta[point]])
+                  for point in points)
+    return pushes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('registry', help='registry CSV for one device')
+    parser.add_argument('--number', type=int, default=1000,
+                        help='number of scrapes to time')
+    args = parser.parse_args()
+
+    pushes = scrape_pushes(args.registry)
+    print('{:<10} {:>12} {:>12} {:>14} {:>14}'.format(
+        'codec', 'all bytes', 'scrape bytes', 'encode us', 'decode us'))
+    for name in codec.available():
+        peer_codec = codec.get(name)
+        encoded = [peer_codec.dumps(push) for push in pushes]
+        frame = peer_codec.join(encoded)
+        encode = timeit.timeit(
+            lambda: peer_codec.join([peer_codec.dumps(push)
+                                     for push in pushes]),
+            number=args.number)
+        decode = timeit.timeit(lambda: peer_codec.loads(frame),
+                               number=args.number)
+        print('{:<10} {:>12} {:>12} {:>14.1f} {:>14.1f}'.format(
+            name, len(encoded[0]), len(frame),
+            encode / args.number * 1e6, decode / args.number * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#}}}
+
+'''Measure router and RPC latency on a running platform during a publish storm.
+
+A probe process pings the router and calls control.serverkey while
+idle and then while a publisher process floods device "all" messages
+to subscribers in a third process. Compare a platform started with and
+without --pubsub-thread. Run from this directory in an activated
+environment with VOLTTRON_HOME pointing at the running platform:
+
+    python pubsub_storm_benchmark.py --subscribers 10 --messages 5000
+'''
+
+import argparse
+import logging
+import multiprocessing
+import time
+
+
+TOPIC = 'devices/campus/building1/device{}/all'
+
+
+def connect(identity):
+    from volttron.platform.vip.agent.utils import build_agent
+    logging.getLogger().setLevel(logging.WARNING)
+    return build_agent(identity=identity)
+
+
+def subscribe(count, received, ready, done):
+    import gevent
+    counts = [0]
+
+    def on_message(peer, sender, bus, topic, headers, message):
+        counts[0] += 1
+
+    agents = []
+    for i in range(count):
+        agent = connect('storm.subscriber.{}'.format(i))
+        agent.vip.pubsub.subscribe('pubsub', 'devices/', on_message).get()
+        agents.append(agent)
+    gevent.sleep(1)
+    ready.set()
+    while not done.is_set():
+        gevent.sleep(0.1)
+    received.value = counts[0]
+    for agent in agents:
+        agent.core.stop()
+
+
+def publish(number, points, window, started, finished):
+    import gevent
+    agent = connect('storm.publisher')
+    values = {'point{}'.format(i): float(i) for i in range(points)}
+    meta = {name: {'units': 'F', 'type': 'float', 'tz': 'US/Pacific'}
+            for name in values}
+    started.set()
+    results = []
+    for i in range(number):
+        results.append(agent.vip.pubsub.publish(
+            'pubsub', TOPIC.format(i % 100), message=[values, meta]))
+        if len(results) >= window:
+            gevent.wait(results)
+            results = []
+    gevent.wait(results)
+    finished.set()
+    agent.core.stop()
+
+
+def probe(interval, phase, results):
+    import gevent
+    agent = connect('storm.probe')
+    pings, rpcs = [], []
+    while phase.value < 2:
+        start = time.time()
+        agent.vip.ping('', 'probe').get(timeout=30)
+        ping = time.time() - start
+        start = time.time()
+        agent.vip.rpc.call('control', 'serverkey').get(timeout=30)
+        rpc = time.time() - start
+        if phase.value == 1:
+            pings.append(ping)
+            rpcs.append(rpc)
+        gevent.sleep(interval)
+    results.put((pings, rpcs))
+    agent.core.stop()
+
+
+def summary(samples):
+    samples = sorted(samples)
+    if not samples:
+        return 'no samples'
+    pick = lambda q: samples[min(int(q * len(samples)), len(samples) - 1)]
+    return ('median {:8.2f} ms  p99 {:8.2f} ms  max {:8.2f} ms  '
+            '({} samples)'.format(pick(0.5) * 1e3, pick(0.99) * 1e3,
+                                  samples[-1] * 1e3, len(samples)))
+
+
+def measure(probe_interval, during, results, phase):
+    prober = multiprocessing.Process(
+        target=probe, args=(probe_interval, phase, results))
+    prober.start()
+    phase.value = 1
+    during()
+    phase.value = 2
+    pings, rpcs = results.get()
+    prober.join()
+    return pings, rpcs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--subscribers', type=int, default=10,
+                        help='number of subscribing agents')
+    parser.add_argument('--messages', type=int, default=5000,
+                        help='number of messages to publish')
+    parser.add_argument('--points', type=int, default=18,
+                        help='number of points in each message')
+    parser.add_argument('--window', type=int, default=100,
+                        help='publishes outstanding before waiting')
+    parser.add_argument('--interval', type=float, default=0.01,
+                        help='seconds between latency probes')
+    args = parser.parse_args()
+
+    received = multiprocessing.Value('l', 0)
+    ready, done = multiprocessing.Event(), multiprocessing.Event()
+    subscriber = multiprocessing.Process(
+        target=subscribe, args=(args.subscribers, received, ready, done))
+    subscriber.start()
+    ready.wait()
+
+    results = multiprocessing.Queue()
+    idle = measure(args.interval, lambda: time.sleep(3), results,
+                   multiprocessing.Value('i', 0))
+
+    started, finished = multiprocessing.Event(), multiprocessing.Event()
+    publisher = multiprocessing.Process(
+        target=publish, args=(args.messages, args.points, args.window,
+                              started, finished))
+    times = []
+
+    def storm():
+        publisher.start()
+        started.wait()
+        times.append(time.time())
+        finished.wait()
+        times.append(time.time())
+
+    busy = measure(args.interval, storm, results,
+                   multiprocessing.Value('i', 0))
+    publisher.join()
+    time.sleep(1)
+    done.set()
+    subscriber.join()
+
+    elapsed = times[1] - times[0]
+    print('published {} messages in {:.2f} s ({:.0f} msg/s), '
+          '{} pushes received'.format(args.messages, elapsed,
+                                      args.messages / elapsed,
+                                      received.value))
+    for name, (pings, rpcs) in [('idle', idle), ('storm', busy)]:
+        print('{:<6} router ping  {}'.format(name, summary(pings)))
+        print('{:<6} control RPC  {}'.format(name, summary(rpcs)))
+
+
+if __name__ == '__main__':
+    main()
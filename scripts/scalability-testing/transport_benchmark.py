@@ -0,0 +1,155 @@
+#!python
+
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#}}}
+
+'''Compare VIP local transports between two processes on one host.
+
+Measures round-trip latency and one-way throughput of a DEALER talking
+to a ROUTER over an ipc socket, once with CURVE encryption (the
+vip_local_address path) and once without (the --vip-ipc-address path,
+where peers are authenticated by their process credentials). Run from
+this directory in an activated environment:
+
+    python transport_benchmark.py --size 1024
+'''
+
+import argparse
+import multiprocessing
+import os
+import time
+
+import zmq
+
+
+def echo(address, secretkey, ready):
+    context = zmq.Context()
+    sock = context.socket(zmq.ROUTER)
+    if secretkey:
+        sock.curve_server = True
+        sock.curve_secretkey = secretkey
+    sock.bind(address)
+    ready.set()
+    while True:
+        frames = sock.recv_multipart()
+        if frames[1] == b'quit':
+            break
+        if frames[1] == b'ping':
+            sock.send_multipart(frames)
+        elif frames[1] == b'count':
+            sock.send_multipart([frames[0], b'done'])
+    sock.close(linger=0)
+    context.term()
+
+
+def measure(address, curve, size, number):
+    if curve:
+        server_public, server_secret = zmq.curve_keypair()
+    else:
+        server_secret = None
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(
+        target=echo, args=(address, server_secret, ready))
+    server.start()
+    ready.wait()
+    context = zmq.Context()
+    sock = context.socket(zmq.DEALER)
+    if curve:
+        sock.curve_serverkey = server_public
+        sock.curve_publickey, sock.curve_secretkey = zmq.curve_keypair()
+    sock.connect(address)
+    payload = os.urandom(size)
+    try:
+        sock.send_multipart([b'ping', payload])
+        sock.recv_multipart()
+        start = time.time()
+        for _ in xrange(number):
+            sock.send_multipart([b'ping', payload])
+            sock.recv_multipart()
+        latency = (time.time() - start) / number
+        start = time.time()
+        for _ in xrange(number):
+            sock.send_multipart([b'data', payload])
+        sock.send_multipart([b'count'])
+        sock.recv_multipart()
+        throughput = number / (time.time() - start)
+        sock.send_multipart([b'quit'])
+    finally:
+        sock.close(linger=1000)
+        context.term()
+        server.join()
+    return latency, throughput
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=1024,
+                        help='message payload size in bytes')
+    parser.add_argument('--number', type=int, default=10000,
+                        help='number of messages to send')
+    args = parser.parse_args()
+
+    address = 'ipc://@transport-benchmark-{}'.format(os.getpid())
+    print('{:<8} {:>14} {:>16}'.format('mode', 'round trip us', 'messages/s'))
+    for mode, curve in [('curve', True), ('ipc', False)]:
+        latency, throughput = measure(address, curve, args.size, args.number)
+        print('{:<8} {:>14.1f} {:>16.0f}'.format(
+            mode, latency * 1e6, throughput))
+
+
+if __name__ == '__main__':
+    main()
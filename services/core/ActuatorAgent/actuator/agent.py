@@ -742,6 +742,7 @@ class ActuatorAgent(Agent):
             else:
                 device_states = self._device_states.iteritems()
 
+            announcements = []
             for device, state in device_states:
                 _log.debug("device, state -  {}, {}".format(device, state))
                 header = self._get_headers(state.agent_id,
@@ -750,7 +751,9 @@ class ActuatorAgent(Agent):
                 header['window'] = state.time_remaining
                 topic = topics.ACTUATOR_SCHEDULE_ANNOUNCE_RAW.replace('{device}',
                                                                       device)
-                self.vip.pubsub.publish('pubsub', topic, headers=header)
+                announcements.append((topic, header, None))
+            if announcements:
+                self.vip.pubsub.publish_many('pubsub', announcements)
 
         if self._update_event is not None:
             # This won't hurt anything if we are canceling ourselves.
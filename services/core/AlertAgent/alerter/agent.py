@@ -169,7 +169,7 @@ class AlertGroup(Agent):
                 timeout = config[topic]
                 self.watch_topic(topic, timeout)
 
-    def watch_topic(self, topic, timeout):
+    def watch_topic(self, topic, timeout, points=None):
         """Listen for a topic to be published within a given
         number of seconds or send alerts.
 
@@ -177,12 +177,16 @@ class AlertGroup(Agent):
         :type topic: str
         :param timeout: Seconds before an alert is sent.
         :type timeout: int
+        :param points: Points to receive from a device's ALL topic,
+            or None for all of them.
+        :type points: [str]
         """
         self.wait_time[topic] = timeout
         self.topic_ttl[topic] = timeout
         self.vip.pubsub.subscribe(peer='pubsub',
                                   prefix=topic,
-                                  callback=self.reset_time)
+                                  callback=self.reset_time,
+                                  points=points)
         _log.info("Expecting {} every {} seconds"
                    .format(topic, timeout))
 
@@ -203,7 +207,7 @@ class AlertGroup(Agent):
         for p in points:
             self.point_ttl[topic][p] = timeout
 
-        self.watch_topic(topic, timeout)
+        self.watch_topic(topic, timeout, points)
 
     def ignore_topic(self, topic):
         """Remove a topic from the group watchlist
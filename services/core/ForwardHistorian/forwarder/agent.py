@@ -69,6 +69,7 @@ from volttron.platform.vip.agent import Agent, Core, compat, Unreachable
 from volttron.platform.vip.agent.utils import build_agent
 from volttron.platform.agent.base_historian import BaseHistorian, add_timing_data_to_header
 from volttron.platform.agent import utils
+from volttron.platform.jsonrpc import MethodNotFound, RemoteError
 from volttron.platform.keystore import KnownHostsStore
 from volttron.platform.messaging import topics, headers as headers_mod
 from volttron.platform.messaging.health import (STATUS_BAD,
@@ -114,6 +115,8 @@ def historian(config_path, **kwargs):
             self._num_failures = 0
             self._last_timeout = 0
             self._target_platform = None
+            # Cleared when the target platform predates publish_many.
+            self._publish_many = True
             super(ForwardHistorian, self).__init__(**kwargs)
 
         @Core.receiver("onstart")
@@ -239,6 +242,7 @@ def historian(config_path, **kwargs):
                         STATUS_BAD, err)
                     return
 
+            to_send = []
             for x in to_publish_list:
                 topic = x['topic']
                 value = x['value']
@@ -258,54 +262,69 @@ def historian(config_path, **kwargs):
                 if gather_timing_data:
                     add_timing_data_to_header(headers, self.core.agent_uuid or self.core.identity,"forwarded")
 
-                if timeout_occurred:
-                    _log.error(
-                        'A timeout has occurred so breaking out of publishing')
-                    break
-                with gevent.Timeout(30):
+                to_send.append((topic, headers, payload['message']))
+
+            try:
+                _log.debug('debugger: forwarding {} items'.format(
+                    len(to_send)))
+
+                # Each request gets its own timeout. The target
+                # distributes none of a batch that raises an error,
+                # so only records it has acknowledged are handled
+                # and the rest are published one at a time.
+                pubsub = self._target_platform.vip.pubsub
+                if self._publish_many:
                     try:
-                        _log.debug('debugger: {} {} {}'.format(topic,
-                                                               headers,
-                                                               payload))
-
-                        self._target_platform.vip.pubsub.publish(
-                            peer='pubsub',
-                            topic=topic,
-                            headers=headers,
-                            message=payload['message']).get()
-                    except gevent.Timeout:
-                        _log.debug("Timeout occurred email should send!")
-                        timeout_occurred = True
-                        self._last_timeout = self.timestamp()
-                        self._num_failures += 1
-                        # Stop the current platform from attempting to
-                        # connect
-                        self._target_platform.core.stop()
-                        self._target_platform = None
-                        self.vip.health.set_status(
-                            STATUS_BAD, "Timeout occured")
-                    except Unreachable:
-                        _log.error("Target not reachable. Wait till it's ready!")
-                    except ZMQError as exc:
-                        if exc.errno == ENOTSOCK:
-                            # Stop the current platform from attempting to
-                            # connect
-                            _log.error("Target disconnected. Stopping target platform agent")
-                            self._target_platform = None
-                            self.vip.health.set_status(
-                                STATUS_BAD, "Target platform disconnected")
-                    except Exception as e:
-                        err = "Unhandled error publishing to target platfom."
-                        _log.error(err)
-                        _log.error(traceback.format_exc())
-                        self.vip.health.set_status(
-                            STATUS_BAD, err)
-                        # Before returning lets mark any that weren't errors
-                        # as sent.
-                        self.report_handled(handled_records)
-                        return
+                        pubsub.publish_many(
+                            peer='pubsub', messages=to_send).get(timeout=30)
+                    except MethodNotFound:
+                        _log.info('Target platform does not support '
+                                  'publish_many; publishing topics one '
+                                  'at a time')
+                        self._publish_many = False
+                    except RemoteError as exc:
+                        _log.warning('publish_many failed on target '
+                                     'platform, publishing topics one '
+                                     'at a time: {}'.format(exc))
                     else:
-                        handled_records.append(x)
+                        handled_records = list(to_publish_list)
+                unacked = zip(to_publish_list, to_send)[len(handled_records):]
+                for record, (topic, headers, message) in unacked:
+                    pubsub.publish(peer='pubsub', topic=topic,
+                                   headers=headers,
+                                   message=message).get(timeout=30)
+                    handled_records.append(record)
+            except gevent.Timeout:
+                _log.debug("Timeout occurred email should send!")
+                timeout_occurred = True
+                self._last_timeout = self.timestamp()
+                self._num_failures += 1
+                # Stop the current platform from attempting to
+                # connect
+                self._target_platform.core.stop()
+                self._target_platform = None
+                self.vip.health.set_status(
+                    STATUS_BAD, "Timeout occured")
+            except Unreachable:
+                _log.error("Target not reachable. Wait till it's ready!")
+            except ZMQError as exc:
+                if exc.errno == ENOTSOCK:
+                    # Stop the current platform from attempting to
+                    # connect
+                    _log.error("Target disconnected. Stopping target platform agent")
+                    self._target_platform = None
+                    self.vip.health.set_status(
+                        STATUS_BAD, "Target platform disconnected")
+            except Exception as e:
+                err = "Unhandled error publishing to target platfom."
+                _log.error(err)
+                _log.error(traceback.format_exc())
+                self.vip.health.set_status(
+                    STATUS_BAD, err)
+                # Before returning lets mark any that weren't errors
+                # as sent.
+                self.report_handled(handled_records)
+                return
 
             _log.debug("handled: {} number of items".format(
                 len(to_publish_list)))
@@ -339,6 +358,7 @@ def historian(config_path, **kwargs):
                                            status)
             else:
                 self._target_platform = agent
+                self._publish_many = True
 
 
     return ForwardHistorian(backup_storage_limit_gb=backup_storage_limit_gb,
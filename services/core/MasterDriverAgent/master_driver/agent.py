@@ -58,6 +58,7 @@ import sys
 import os
 import gevent
 from volttron.platform.vip.agent import Agent, Core, RPC
+from volttron.platform.vip.agent.timerwheel import TimerWheel
 from volttron.platform.agent import utils
 from volttron.platform.agent import math_utils
 from volttron.platform.agent.known_identities import PLATFORM_DRIVER
@@ -130,6 +131,8 @@ def master_driver_agent(config_path, **kwargs):
     publish_depth_first = bool(get_config("publish_depth_first", True))
     publish_breadth_first = bool(get_config("publish_breadth_first", True))
 
+    timer_wheel = bool(get_config("timer_wheel", False))
+
     return MasterDriverAgent(driver_config_list, scalability_test,
                              scalability_test_iterations,
                              driver_scrape_interval,
@@ -140,6 +143,7 @@ def master_driver_agent(config_path, **kwargs):
                              publish_breadth_first_all,
                              publish_depth_first,
                              publish_breadth_first,
+                             timer_wheel,
                              heartbeat_autostart=True, **kwargs)
 
 class MasterDriverAgent(Agent):
@@ -153,6 +157,7 @@ class MasterDriverAgent(Agent):
                  publish_breadth_first_all=True,
                  publish_depth_first=True,
                  publish_breadth_first=True,
+                 timer_wheel=False,
                  **kwargs):
         super(MasterDriverAgent, self).__init__(**kwargs)
         self.instances = {}
@@ -165,6 +170,9 @@ class MasterDriverAgent(Agent):
         self.system_socket_limit = system_socket_limit
         self.freed_time_slots = []
         self._name_map = {}
+        # If enabled, all drivers share one scheduler rather than
+        # running one each.
+        self.timer_wheel = TimerWheel() if timer_wheel else None
 
         self.publish_depth_first_all = publish_depth_first_all
         self.publish_breadth_first_all = publish_breadth_first_all
@@ -188,7 +196,8 @@ class MasterDriverAgent(Agent):
                                "publish_depth_first_all": publish_depth_first_all,
                                "publish_breadth_first_all": publish_breadth_first_all,
                                "publish_depth_first": publish_depth_first,
-                               "publish_breadth_first": publish_breadth_first}
+                               "publish_breadth_first": publish_breadth_first,
+                               "timer_wheel": timer_wheel}
 
         self.vip.config.set_default("config", self.default_config)
         self.vip.config.subscribe(self.configure_main, actions=["NEW", "UPDATE"], pattern="config")
@@ -247,6 +256,9 @@ class MasterDriverAgent(Agent):
             if self.max_concurrent_publishes != config["max_concurrent_publishes"]:
                 _log.info("The master driver must be restarted for changes to the max_concurrent_publishes setting to take effect")
 
+            if (self.timer_wheel is not None) != bool(config["timer_wheel"]):
+                _log.info("The master driver must be restarted for changes to the timer_wheel setting to take effect")
+
             if self.scalability_test != bool(config["scalability_test"]):
                 if not self.scalability_test:
                     _log.info(
@@ -360,6 +372,8 @@ class MasterDriverAgent(Agent):
                              self.publish_breadth_first_all,
                              self.publish_depth_first,
                              self.publish_breadth_first)
+        if self.timer_wheel is not None:
+            driver.core.timer_wheel = self.timer_wheel
         gevent.spawn(driver.core.run)
         self.instances[topic] = driver
         self._name_map[topic.lower()] = topic
@@ -278,59 +278,59 @@ class DriverAgent(BasicAgent):
         
             
 
+        messages = []
         if self.publish_depth_first or self.publish_breadth_first:
             for point, value in results.iteritems():
                 depth_first_topic, breadth_first_topic = self.get_paths_for_point(point)
                 message = [value, self.meta_data[point]]
-                   
-                if self.publish_depth_first:  
-                    self._publish_wrapper(depth_first_topic, 
-                                          headers=headers, 
-                                          message=message)
-                
+
+                if self.publish_depth_first:
+                    messages.append((depth_first_topic, headers, message))
+
                 if self.publish_breadth_first:
-                    self._publish_wrapper(breadth_first_topic, 
-                                          headers=headers, 
-                                          message=message)
-         
-        message = [results, self.meta_data] 
+                    messages.append((breadth_first_topic, headers, message))
+
+        message = [results, self.meta_data]
         if self.publish_depth_first_all:
-            self._publish_wrapper(self.all_path_depth, 
-                                  headers=headers, 
-                                  message=message)
-        
-        if self.publish_breadth_first_all: 
-            self._publish_wrapper(self.all_path_breadth, 
-                                  headers=headers, 
-                                  message=message)
+            messages.append((self.all_path_depth, headers, message))
+
+        if self.publish_breadth_first_all:
+            messages.append((self.all_path_breadth, headers, message))
+
+        if messages:
+            self._publish_wrapper(messages)
 
         self.parent.scrape_ending(self.device_name)
         
         
-    def _publish_wrapper(self, topic, headers, message):
+    def _publish_wrapper(self, messages):
+        """Publish a whole scrape with a single confirmation."""
         while True:
             try:
                 with publish_lock():
-                    _log.debug("publishing: " + topic)
-                    self.vip.pubsub.publish('pubsub', 
-                                        topic, 
-                                        headers=headers, 
-                                        message=message).get(timeout=10.0)
-                                        
-                    _log.debug("finish publishing: " + topic)
+                    _log.debug("publishing {} topics for {}".format(
+                        len(messages), self.device_name))
+                    # Scrapes travel in the bulk lane so they do not
+                    # delay actuator writes and other control traffic.
+                    self.vip.pubsub.publish_many('pubsub', messages,
+                                                 bulk=True).get(timeout=10.0)
+
+                    _log.debug("finish publishing: " + self.device_name)
             except gevent.Timeout:
-                _log.warn("Did not receive confirmation of publish to "+topic)
-                break                           
+                _log.warn("Did not receive confirmation of publish for " +
+                          self.device_name)
+                break
             except Again:
-                _log.warn("publish delayed: " + topic + " pubsub is busy")
+                _log.warn("publish delayed: " + self.device_name +
+                          " pubsub is busy")
                 gevent.sleep(random.random())
             except VIPError as ex:
-                _log.warn("driver failed to publish " + topic + ": " + str(ex))
+                _log.warn("driver failed to publish " + self.device_name +
+                          ": " + str(ex))
                 break
             else:
                 break
-            
-    
+
     def heart_beat(self):
         if self.heart_beat_point is None:
             return
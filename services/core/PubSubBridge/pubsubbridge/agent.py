@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+# }}}
+from __future__ import absolute_import, print_function
+
+from collections import deque
+import logging
+import sys
+
+import gevent
+from gevent.event import Event
+from zmq.green import ZMQError
+
+from volttron.platform.jsonrpc import MethodNotFound
+from volttron.platform.vip.agent import Agent, Core, RPC, Unreachable
+from volttron.platform.vip.agent.subsystems.pubsub import (
+    is_pattern, topic_matches)
+from volttron.platform.vip.agent.utils import build_agent
+from volttron.platform.agent import utils
+from volttron.platform.keystore import KnownHostsStore
+
+utils.setup_logging()
+_log = logging.getLogger(__name__)
+__version__ = '0.1'
+
+# Header naming the original sender of a bridged message. Bridges do
+# not forward messages carrying it, which prevents forwarding loops.
+BRIDGED_FROM = 'X-Bridged-From'
+
+# Errors after which the connection to the destination is rebuilt and
+# the messages in hand are sent again.
+_CONNECTION_ERRORS = (gevent.Timeout, Unreachable, ZMQError)
+
+
+def pubsub_bridge(config_path, **kwargs):
+    """Load the PubSubBridge agent configuration and return an instance
+    of the agent created using that configuration.
+
+    :param config_path: Path to a configuration file.
+
+    :type config_path: str
+    :returns: PubSubBridge agent instance
+    :rtype: PubSubBridge agent
+    """
+    config = utils.load_config(config_path)
+    destination_vip = config['destination-vip']
+    hosts = KnownHostsStore()
+    destination_serverkey = hosts.serverkey(destination_vip)
+    if destination_serverkey is None:
+        _log.info("Destination serverkey not found in known hosts file, "
+                  "using config")
+        destination_serverkey = config['destination-serverkey']
+    return PubSubBridge(destination_vip, destination_serverkey,
+                        topics=config.get('topics', ['']),
+                        sync_interval=config.get('sync_interval', 30),
+                        buffer_size=config.get('buffer_size', 10000),
+                        batch_size=config.get('batch_size', 500),
+                        **kwargs)
+
+
+class PubSubBridge(Agent):
+    """Forwards local publishes to the subscribers of another platform.
+
+    The bridge connects to the destination platform and periodically
+    lists the subscriptions held there. It subscribes locally to those
+    falling under the configured topics, so only messages somebody on
+    the destination wants cross the link. Messages wait in a buffer of
+    at most buffer_size messages, dropping the oldest when full, and
+    are published to the destination in batches of up to batch_size.
+    Messages are sent again after connection failures and counted as
+    dropped if the destination rejects them.
+
+    :param destination_vip: VIP address of the destination platform
+    :param destination_serverkey: Server key of the destination platform
+    :param topics: Topic prefixes eligible for forwarding
+    :param sync_interval: Seconds between subscription synchronizations
+    :param buffer_size: Maximum number of messages waiting to be sent
+    :param batch_size: Maximum number of messages sent in one request
+    """
+
+    def __init__(self, destination_vip, destination_serverkey, topics=('',),
+                 sync_interval=30, buffer_size=10000, batch_size=500,
+                 **kwargs):
+        super(PubSubBridge, self).__init__(**kwargs)
+        self.destination_vip = destination_vip
+        self.destination_serverkey = destination_serverkey
+        self.topics = list(topics)
+        self.sync_interval = sync_interval
+        self.batch_size = batch_size
+        self._buffer = deque(maxlen=buffer_size)
+        self._ready = Event()
+        self._target = None
+        self._callbacks = {}
+        self._prefixes = []
+        self._forwarded = 0
+        self._dropped = 0
+        # Cleared when the destination predates publish_many.
+        self._publish_many = True
+
+    @Core.receiver('onstart')
+    def starting(self, sender, **kwargs):
+        self.core.periodic(self.sync_interval, self.synchronize)
+        self.core.spawn(self._send_loop)
+
+    @Core.receiver('onstop')
+    def stopping(self, sender, **kwargs):
+        self._disconnect()
+
+    @RPC.export
+    def get_stats(self):
+        """Return forwarding statistics.
+
+        :returns: Bridged prefixes and counts of buffered, forwarded and
+                  dropped messages
+        :rtype: dict
+        """
+        return {'prefixes': self._prefixes,
+                'buffered': len(self._buffer),
+                'forwarded': self._forwarded,
+                'dropped': self._dropped}
+
+    def synchronize(self):
+        """Mirror the destination's subscriptions with local ones."""
+        target = self._connect()
+        if target is None:
+            return
+        try:
+            listing = target.vip.pubsub.list(
+                'pubsub', subscribed=False).get(timeout=10)
+        except _CONNECTION_ERRORS as exc:
+            _log.warn("Failed listing subscriptions at %s: %r",
+                      self.destination_vip, exc)
+            self._disconnect()
+            return
+        except Exception:
+            _log.exception("Failed listing subscriptions at %s",
+                           self.destination_vip)
+            return
+        wanted = self._bridged_prefixes(
+            topic for bus, topic, _ in listing if bus == '')
+        for prefix in set(self._callbacks) - wanted:
+            self.vip.pubsub.unsubscribe(
+                'pubsub', prefix, self._callbacks.pop(prefix))
+        for prefix in wanted - set(self._callbacks):
+            self._callbacks[prefix] = callback = self._make_callback(prefix)
+            self.vip.pubsub.subscribe('pubsub', prefix, callback)
+        self._prefixes = sorted(wanted)
+
+    def _bridged_prefixes(self, subscriptions):
+        """Return the local prefixes covering subscriptions.
+
+        A subscription within an eligible topic is bridged as is, while
+        one wider than an eligible topic is narrowed to that topic.
+        Prefixes covered by a shorter prefix are left out.
+        """
+        wanted = set()
+        for prefix in subscriptions:
+            for topic in self.topics:
+                if prefix.startswith(topic):
+                    wanted.add(prefix)
+                elif topic.startswith(prefix) and not is_pattern(prefix):
+                    wanted.add(topic)
+        return {prefix for prefix in wanted
+                if not any(other != prefix and not is_pattern(other) and
+                           prefix.startswith(other) for other in wanted)}
+
+    def _make_callback(self, prefix):
+        def callback(peer, sender, bus, topic, headers, message):
+            # Overlapping prefixes each deliver the message, so only the
+            # first matching prefix forwards it.
+            first = next((other for other in self._prefixes
+                          if topic_matches(other, topic)), prefix)
+            if first == prefix and BRIDGED_FROM not in headers:
+                self._enqueue(sender, topic, headers, message)
+        return callback
+
+    def _enqueue(self, sender, topic, headers, message):
+        headers = dict(headers)
+        headers[BRIDGED_FROM] = sender
+        if len(self._buffer) == self._buffer.maxlen:
+            self._dropped += 1
+        self._buffer.append((topic, headers, message))
+        self._ready.set()
+
+    def _send_loop(self):
+        buffer = self._buffer
+        while True:
+            self._ready.wait()
+            self._ready.clear()
+            while buffer:
+                target = self._connect()
+                if target is None:
+                    gevent.sleep(self.sync_interval)
+                    continue
+                batch = [buffer.popleft()
+                         for _ in xrange(min(self.batch_size, len(buffer)))]
+                try:
+                    self._publish(target, batch)
+                except _CONNECTION_ERRORS as exc:
+                    _log.warn("Failed forwarding %d messages to %s: %r",
+                              len(batch), self.destination_vip, exc)
+                    self._disconnect()
+                    # Requeue the batch, dropping the newest messages
+                    # should the buffer have filled meanwhile.
+                    overflow = len(batch) + len(buffer) - buffer.maxlen
+                    if overflow > 0:
+                        self._dropped += overflow
+                    buffer.extendleft(reversed(batch))
+                    gevent.sleep(self.sync_interval)
+                except Exception:
+                    _log.exception("Dropped %d messages rejected by %s",
+                                   len(batch), self.destination_vip)
+                    self._dropped += len(batch)
+
+    def _publish(self, target, batch):
+        """Publish batch at the destination, removing sent messages."""
+        pubsub = target.vip.pubsub
+        if self._publish_many:
+            try:
+                pubsub.publish_many('pubsub', batch, bulk=True).get(timeout=10)
+            except MethodNotFound:
+                _log.info("%s does not support publish_many; publishing "
+                          "messages one at a time", self.destination_vip)
+                self._publish_many = False
+            else:
+                self._forwarded += len(batch)
+                del batch[:]
+                return
+        while batch:
+            topic, headers, message = batch[0]
+            pubsub.publish('pubsub', topic, headers, message,
+                           bulk=True).get(timeout=10)
+            del batch[0]
+            self._forwarded += 1
+
+    def _connect(self):
+        if self._target is None:
+            _log.debug("Connecting to %s", self.destination_vip)
+            try:
+                self._target = build_agent(
+                    address=self.destination_vip,
+                    serverkey=self.destination_serverkey,
+                    publickey=self.core.publickey,
+                    secretkey=self.core.secretkey,
+                    enable_store=False)
+                self._publish_many = True
+            except gevent.Timeout:
+                _log.warn("Timed out connecting to %s", self.destination_vip)
+        return self._target
+
+    def _disconnect(self):
+        if self._target is not None:
+            self._target.core.stop()
+            self._target = None
+
+
+def main(argv=sys.argv):
+    """Main method called by the platform."""
+    utils.vip_main(pubsub_bridge, version=__version__)
+
+
+if __name__ == '__main__':
+    # Entry point for script
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,133 @@
+import os
+import sys
+
+import gevent
+import pytest
+
+from volttrontesting.utils.utils import poll_gevent_sleep
+
+test_dir = os.path.dirname(os.path.realpath(__file__))
+sys.path.append(test_dir + '/..')
+from pubsubbridge.agent import BRIDGED_FROM, PubSubBridge
+
+
+@pytest.mark.bridge
+def test_bridged_prefixes_narrow_and_merge():
+    bridge = PubSubBridge('tcp://127.0.0.1:1', None,
+                          topics=['devices/campus/', 'analysis'],
+                          address='inproc://vip')
+    assert bridge._bridged_prefixes(
+        ['devices/campus/building1/', 'devices/campus/building1/all',
+         'devices/other/', 'analysis/x', '']) == {
+        'devices/campus/', 'analysis'}
+    assert bridge._bridged_prefixes(
+        ['devices/campus/building1/', 'devices/campus/+/all',
+         'record']) == {'devices/campus/building1/', 'devices/campus/+/all'}
+
+
+class _Result(object):
+    def __init__(self, exc=None):
+        self.exc = exc
+
+    def get(self, timeout=None):
+        if self.exc is not None:
+            raise self.exc
+
+
+class _TargetPubSub(object):
+    """Stands in for the destination's pubsub subsystem."""
+
+    def __init__(self, many_error=None, error=None):
+        self.many_error = many_error
+        self.error = error
+        self.published = []
+
+    def publish_many(self, peer, messages, bulk=False):
+        if self.many_error is not None:
+            return _Result(self.many_error)
+        self.published.extend(messages)
+        return _Result()
+
+    def publish(self, peer, topic, headers=None, message=None, bus='',
+                bulk=False):
+        if self.error is not None:
+            return _Result(self.error)
+        self.published.append((topic, headers, message))
+        return _Result()
+
+
+def _run_send_loop(bridge, pubsub, count):
+    target = type('Target', (object,), {})()
+    target.vip = type('VIP', (object,), {})()
+    target.vip.pubsub = pubsub
+    bridge._connect = lambda: target
+    bridge._disconnect = lambda: None
+    loop = gevent.spawn(bridge._send_loop)
+    try:
+        for i in xrange(count):
+            bridge._enqueue('sender', 'devices/x', {}, i)
+            gevent.sleep(0.01)
+        return loop.dead
+    finally:
+        loop.kill()
+
+
+@pytest.mark.bridge
+def test_bridge_falls_back_to_single_publishes():
+    from volttron.platform.jsonrpc import MethodNotFound
+    bridge = PubSubBridge('tcp://127.0.0.1:1', None, address='inproc://vip')
+    pubsub = _TargetPubSub(many_error=MethodNotFound(-32601, 'no method'))
+    assert not _run_send_loop(bridge, pubsub, 3)
+    assert [m for _, _, m in pubsub.published] == [0, 1, 2]
+    assert bridge._forwarded == 3
+    assert not bridge._publish_many
+
+
+@pytest.mark.bridge
+def test_bridge_send_loop_survives_remote_errors():
+    from volttron.platform.jsonrpc import RemoteError
+    bridge = PubSubBridge('tcp://127.0.0.1:1', None, address='inproc://vip')
+    pubsub = _TargetPubSub(
+        many_error=RemoteError('boom', exc_type='ValueError', exc_args=[]))
+    assert not _run_send_loop(bridge, pubsub, 2)
+    assert bridge._dropped == 2
+    pubsub.many_error = None
+    assert not _run_send_loop(bridge, pubsub, 1)
+    assert bridge._forwarded == 1
+
+
+@pytest.mark.bridge
+def test_bridge_forwards_wanted_topics(volttron_instance1, volttron_instance2):
+    volttron_instance2.allow_all_connections()
+    bridge = volttron_instance1.build_agent(
+        agent_class=PubSubBridge,
+        destination_vip=volttron_instance2.vip_address,
+        destination_serverkey=volttron_instance2.serverkey,
+        topics=['devices'], sync_interval=1, enable_store=False)
+    subscriber = volttron_instance2.build_agent()
+    publisher = volttron_instance1.build_agent()
+    received = []
+
+    def callback(peer, sender, bus, topic, headers, message):
+        received.append((topic, headers[BRIDGED_FROM], message))
+
+    subscriber.vip.pubsub.subscribe(
+        'pubsub', 'devices/campus/', callback).get(timeout=5)
+    subscriber.vip.pubsub.subscribe(
+        'pubsub', 'analysis/', callback).get(timeout=5)
+    assert poll_gevent_sleep(10, lambda: bridge.get_stats()['prefixes'] ==
+                             ['devices/campus/'])
+    # The bridge needs a moment to subscribe on the source platform.
+    gevent.sleep(1)
+    for topic in ['devices/campus/building1/all', 'devices/other/all',
+                  'analysis/campus/building1']:
+        publisher.vip.pubsub.publish(
+            'pubsub', topic, message=1).get(timeout=5)
+    assert poll_gevent_sleep(10, lambda: received)
+    gevent.sleep(1)
+    assert received == [('devices/campus/building1/all',
+                         publisher.core.identity, 1)]
+    assert bridge.get_stats()['forwarded'] == 1
+    publisher.core.stop()
+    subscriber.core.stop()
+    bridge.core.stop()
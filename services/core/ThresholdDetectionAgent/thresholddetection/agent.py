@@ -164,7 +164,8 @@ class ThresholdDetectionAgent(Agent):
                 elif threshold_min is not None and data < threshold_min:
                     self._alert(topic, threshold_min, data, point=point)
 
-            self.vip.pubsub.subscribe('pubsub', topic, callback)
+            self.vip.pubsub.subscribe('pubsub', topic, callback,
+                                      points=[point])
 
     def _create_standard_subscription(self, topic, values):
         """
@@ -1167,6 +1167,14 @@ class BaseQueryHistorianAgent(Agent):
     their data stores.
     """
 
+    # Number of records fetched from the data store at a time, and sent in
+    # each chunk, when query results are streamed over a channel.
+    stream_chunk_size = 1000
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('enable_channel', True)
+        super(BaseQueryHistorianAgent, self).__init__(**kwargs)
+
     @RPC.export
     def get_version(self):
         """RPC call to get the version of the historian
@@ -1273,7 +1281,8 @@ class BaseQueryHistorianAgent(Agent):
 
     @RPC.export
     def query(self, topic=None, start=None, end=None, agg_type=None,
-              agg_period=None, skip=0, count=None, order="FIRST_TO_LAST"):
+              agg_period=None, skip=0, count=None, order="FIRST_TO_LAST",
+              stream=None):
         """RPC call to query an Historian for time series data.
 
         :param topic: Topic or topics to query for.
@@ -1285,6 +1294,8 @@ class BaseQueryHistorianAgent(Agent):
         :param count: Limit results to this value.
         :param order: How to order the results, either "FIRST_TO_LAST" or
                       "LAST_TO_FIRST"
+        :param stream: Name of a channel on which to stream the values of a
+                       single topic query instead of returning them.
         :type topic: str or list
         :type start: str
         :type end: str
@@ -1295,6 +1306,7 @@ class BaseQueryHistorianAgent(Agent):
         :type skip: int
         :type count: int
         :type order: str
+        :type stream: str
 
         :return: Results of the query
         :rtype: dict
@@ -1321,10 +1333,27 @@ class BaseQueryHistorianAgent(Agent):
         specify one hour ago.
         "now -1d -1h -20m" would specify 25 hours and 20 minutes ago.
 
+        Large results may be streamed rather than returned by opening a
+        channel to the historian and passing its name as stream. The
+        historian then pages through the results stream_chunk_size records
+        at a time, so neither side holds the whole result in memory. The
+        returned dictionary has no "values" and the records are read from
+        the channel instead:
+
+        .. code-block:: python
+
+            values = agent.vip.channel.receive_stream('platform.historian')
+            result = agent.vip.rpc.call('platform.historian', 'query',
+                                        topic, stream=values.name).get()
+            for timestamp, value in values:
+                ...
+
         """
 
         if topic is None:
             raise TypeError('"Topic" required')
+        if stream is not None and not isinstance(topic, basestring):
+            raise TypeError('Only single topic queries may be streamed')
 
         if agg_type:
             if not agg_period:
@@ -1359,6 +1388,10 @@ class BaseQueryHistorianAgent(Agent):
         if start:
             _log.debug("start={}".format(start))
 
+        if stream is not None:
+            return self._stream_query(stream, topic, start, end, agg_type,
+                                      agg_period, skip, count, order)
+
         results = self.query_historian(topic, start, end, agg_type,
                                        agg_period, skip, count, order)
         metadata = results.get("metadata", None)
@@ -1368,6 +1401,36 @@ class BaseQueryHistorianAgent(Agent):
 
         return results
 
+    def _stream_query(self, stream, topic, start, end, agg_type, agg_period,
+                      skip, count, order):
+        peer = bytes(self.vip.rpc.context.vip_message.peer)
+        size = self.stream_chunk_size
+        if count is not None:
+            size = min(size, count)
+        # The first page is fetched here to return its metadata.
+        results = self.query_historian(topic, start, end, agg_type,
+                                       agg_period, skip, size, order)
+
+        def pages(results, skip, count):
+            while True:
+                values = results.get("values") or []
+                for value in values:
+                    yield value
+                if len(values) < size:
+                    return
+                skip += size
+                if count is not None:
+                    count -= size
+                    if count <= 0:
+                        return
+                results = self.query_historian(
+                    topic, start, end, agg_type, agg_period, skip,
+                    size if count is None else min(size, count), order)
+
+        self.core.spawn(self.vip.channel.send_stream, peer, stream,
+                        pages(results, skip, count), chunk_size=size)
+        return {"metadata": results.get("metadata") or {}}
+
     @abstractmethod
     def query_historian(self, topic, start=None, end=None, agg_type=None,
                         agg_period=None, skip=0, count=None, order=None):
@@ -1625,4 +1688,4 @@ def p_error(p):
 
 
 # Build the parser
-time_parser = yacc.yacc(write_tables=0)
+time_parser = yacc.yacc(write_tables=0, debug=0)
@@ -61,15 +61,18 @@
 
 import contextlib
 import errno
+import itertools
 import logging
 import os
 import shutil
 import signal
 import sys
+import time
 import uuid
 
 import gevent
 import gevent.event
+import gevent.pool
 from gevent.fileobject import FileObject
 from gevent import subprocess
 from gevent.subprocess import PIPE
@@ -214,6 +217,9 @@ class AIPplatform(object):
     def __init__(self, env, **kwargs):
         self.env = env
         self.agents = {}
+        # Seconds taken by the last start of each agent: until it was
+        # launched or, when autostart waits for it, until it connected.
+        self.start_durations = {}
 
     def setup(self):
         '''Creates paths for used directories for the instance.'''
@@ -254,7 +260,14 @@ class AIPplatform(object):
     install_dir = property(lambda me: os.path.join(me.config_dir, 'agents'))
     run_dir = property(lambda me: os.path.join(me.config_dir, 'run'))
 
-    def autostart(self):
+    def autostart(self, concurrency=1, ready_timeout=None):
+        '''Start enabled agents in tiers of equal priority.
+
+        Agents in a tier are started concurrently, at most concurrency at
+        a time. If ready_timeout is set, each tier waits up to that many
+        seconds for its agents to connect to the router before the next
+        tier is started.
+        '''
         agents, errors = [], []
         for agent_uuid, agent_name in self.list_agents().iteritems():
             try:
@@ -265,13 +278,58 @@ class AIPplatform(object):
             if priority is not None:
                 agents.append((priority, agent_uuid))
         agents.sort(reverse=True)
-        for _, agent_uuid in agents:
-            try:
-                self.start_agent(agent_uuid)
-            except Exception as exc:
-                errors.append((agent_uuid, str(exc)))
+        pool = gevent.pool.Pool(concurrency)
+        for _, tier in itertools.groupby(agents, lambda agent: agent[0]):
+            started = []
+            for agent_uuid, error in pool.imap_unordered(
+                    self._autostart_agent, [agent[1] for agent in tier]):
+                if error is None:
+                    started.append(agent_uuid)
+                else:
+                    errors.append((agent_uuid, error))
+            if ready_timeout and started:
+                self._wait_ready(started, ready_timeout)
         return errors
 
+    def _autostart_agent(self, agent_uuid):
+        try:
+            self.start_agent(agent_uuid)
+        except Exception as exc:
+            return agent_uuid, str(exc)
+        return agent_uuid, None
+
+    def _wait_ready(self, agent_uuids, timeout):
+        '''Wait until the agents are connected to the router.'''
+        waiting = {self.agent_identity(agent_uuid): agent_uuid
+                   for agent_uuid in agent_uuids}
+        deadline = time.time() + timeout
+        event = gevent.event.Event()
+        agent = self._ready_agent()
+        task = gevent.spawn(agent.core.run, event)
+        try:
+            event.wait(timeout)
+            while waiting and time.time() < deadline:
+                peers = agent.vip.peerlist().get(timeout=timeout)
+                now = time.time()
+                for identity in waiting.viewkeys() & set(peers):
+                    agent_uuid = waiting.pop(identity)
+                    self.start_durations[agent_uuid] = (
+                        now - self.agents[agent_uuid].start_time)
+                if waiting:
+                    gevent.sleep(0.2)
+        except gevent.Timeout:
+            pass
+        finally:
+            agent.core.stop()
+            task.kill()
+        for identity in waiting:
+            _log.warning('agent %s did not connect within %s seconds',
+                         identity, timeout)
+
+    def _ready_agent(self):
+        '''Return an agent, not yet running, to list connected peers.'''
+        return Agent(identity='aip', address='inproc://vip')
+
     def land_agent(self, agent_wheel):
         if auth is None:
             raise NotImplementedError()
@@ -608,6 +666,7 @@ class AIPplatform(object):
         return {}
 
     def start_agent(self, agent_uuid):
+        start_time = time.time()
         name = self.agent_name(agent_uuid)
         agent_path = os.path.join(self.install_dir, agent_uuid, name)
 
@@ -654,6 +713,10 @@ class AIPplatform(object):
         environ['AGENT_PUB_ADDR'] = self.publish_address
         environ['AGENT_UUID'] = agent_uuid
         environ['_LAUNCHED_BY_PLATFORM'] = '1'
+        ipc_address = getattr(self.env, 'vip_ipc_address', None)
+        if ipc_address:
+            # Skip CURVE; the agent is identified by its PID instead.
+            environ['VOLTTRON_VIP_ADDR'] = ipc_address
 
         #For backwards compatibility create the identity file if it does not exist.
         identity_file = os.path.join(self.install_dir, agent_uuid, "IDENTITY")
@@ -680,6 +743,7 @@ class AIPplatform(object):
             execreqs = self._read_execreqs(pkg.distinfo)
             execenv = self._reserve_resources(resmon, execreqs)
         execenv.name = name or agent_path
+        execenv.start_time = start_time
         _log.info('starting agent %s', agent_path)
 
         data_dir = self._get_data_dir(agent_path)
@@ -688,6 +752,7 @@ class AIPplatform(object):
         self.agents[agent_uuid] = execenv
         proc = execenv.process
         _log.info('agent %s has PID %s', agent_path, proc.pid)
+        self.start_durations[agent_uuid] = time.time() - start_time
         gevent.spawn(log_stream, 'agents.stderr', name, proc.pid, argv[0],
                      log_entries('agents.log', name, proc.pid, logging.ERROR,
                                  proc.stderr))
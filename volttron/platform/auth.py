@@ -232,13 +232,30 @@ class AuthService(Agent):
                 pid = int(parts[2])
                 agent_uuid = self.aip.agent_uuid_from_pid(pid)
                 if agent_uuid:
-                    return dump_user(domain, address, 'AGENT', agent_uuid)
+                    return (self._agent_user_id(domain, address, agent_uuid)
+                            or dump_user(domain, address, 'AGENT',
+                                         agent_uuid))
             uid = int(parts[0])
             if uid == os.getuid():
                 return dump_user(domain, address, mechanism, *credentials[:1])
         if self.allow_any:
             return dump_user(domain, address, mechanism, *credentials[:1])
 
+    def _agent_user_id(self, domain, address, agent_uuid):
+        """Return the user ID authorized for an agent's CURVE key
+
+        Agents authenticated by process credentials keep the user ID,
+        and with it the capabilities, they have when using CURVE.
+        """
+        try:
+            publickey = self.aip.get_agent_keystore(agent_uuid).public
+        except Exception:
+            _log.exception('unable to read keystore of agent %s', agent_uuid)
+            return None
+        for entry in self.auth_entries:
+            if entry.match(domain, address, 'CURVE', [publickey]):
+                return entry.user_id
+
     @RPC.export
     def get_user_to_capabilities(self):
         """RPC method
@@ -85,9 +85,10 @@ from .agent.known_identities import CONTROL_CONNECTION, CONFIGURATION_STORE
 from .vip.agent import Agent as BaseAgent, Core, RPC
 from . import aip as aipmod
 from . import config
-from .jsonrpc import RemoteError
+from .jsonrpc import MethodNotFound, RemoteError
 from .auth import AuthEntry, AuthFile, AuthException
 from .keystore import KeyStore, KnownHostsStore
+from .messaging import topics
 
 try:
     import volttron.restricted
@@ -110,10 +111,12 @@ CHUNK_SIZE = 4096
 class ControlService(BaseAgent):
     def __init__(self, aip, *args, **kwargs):
         tracker = kwargs.pop('tracker', None)
+        stats_interval = kwargs.pop('stats_interval', 0)
         kwargs["enable_store"] = False
         super(ControlService, self).__init__(*args, **kwargs)
         self._aip = aip
         self._tracker = tracker
+        self._stats_interval = stats_interval
 
     @Core.receiver('onsetup')
     def _setup(self, sender, **kwargs):
@@ -122,7 +125,19 @@ class ControlService(BaseAgent):
         self.vip.rpc.export(lambda: self._tracker.enabled, 'stats.enabled')
         self.vip.rpc.export(self._tracker.enable, 'stats.enable')
         self.vip.rpc.export(self._tracker.disable, 'stats.disable')
-        self.vip.rpc.export(lambda: self._tracker.stats, 'stats.get')
+        self.vip.rpc.export(self._tracker.get_stats, 'stats.get')
+
+    @Core.receiver('onstart')
+    def _start_stats(self, sender, **kwargs):
+        if self._tracker and self._stats_interval > 0:
+            self._tracker.enable()
+            self.core.periodic(self._stats_interval, self._publish_stats,
+                               wait=self._stats_interval)
+
+    def _publish_stats(self):
+        if self._tracker.enabled:
+            self.vip.pubsub.publish('pubsub', topics.PLATFORM_STATS,
+                                    message=self._tracker.get_stats())
 
     @RPC.export
     def serverkey(self):
@@ -170,6 +185,10 @@ class ControlService(BaseAgent):
     def status_agents(self):
         return self._aip.status_agents()
 
+    @RPC.export
+    def start_durations(self):
+        return self._aip.start_durations
+
     @RPC.export
     def start_agent(self, uuid):
         if not isinstance(uuid, basestring):
@@ -674,6 +693,11 @@ def status_agents(opts):
             agents[uuid] = agent = Agent(name, None, uuid)
         status[uuid] = stat
     agents = agents.values()
+    try:
+        durations = opts.connection.call('start_durations')
+    except MethodNotFound:
+        # Platforms predating start durations show no duration.
+        durations = {}
 
     def get_status(agent):
         try:
@@ -684,7 +708,10 @@ def status_agents(opts):
         if stat is not None:
             return str(stat)
         if pid:
-            return 'running [{}]'.format(pid)
+            duration = durations.get(agent.uuid)
+            if duration is None:
+                return 'running [{}]'.format(pid)
+            return 'running [{}] started in {:.1f}s'.format(pid, duration)
         return ''
 
     _show_filtered_agents(opts, 'STATUS', get_status, agents)
@@ -840,11 +867,55 @@ def remove_known_host(opts):
             store.filename))
 
 
+def _percentile(histogram, fraction):
+    '''Return the bucket bound below which fraction of counts fall.'''
+    buckets = sorted((int(bound), count)
+                     for bound, count in histogram.iteritems())
+    target = fraction * sum(count for _, count in buckets)
+    total = 0
+    for bound, count in buckets:
+        total += count
+        if total >= target:
+            return bound
+    return 0
+
+
+def _write_stats_top(stats):
+    rates = sorted((int(window), rate)
+                   for window, rate in stats.get('rates', {}).iteritems())
+    _stdout.write('messages/s: {}\n'.format('  '.join(
+        '{}s {:.1f}'.format(window, rate) for window, rate in rates)))
+    for name, value in sorted(stats.get('socket', {}).iteritems()):
+        _stdout.write('{}: {}\n'.format(name, value))
+    incoming, outgoing = stats['incoming'], stats['outgoing']
+    peers = set(incoming['peer']) | set(outgoing['peer'])
+    rows = sorted(
+        ((peer, incoming['peer'].get(peer, 0), outgoing['peer'].get(peer, 0),
+          incoming['bytes'].get(peer, 0), outgoing['bytes'].get(peer, 0),
+          stats['blocked'].get(peer, 0), stats['unreachable'].get(peer, 0))
+         for peer in peers),
+        key=lambda row: row[3] + row[4], reverse=True)
+    fmt = '{:<36} {:>9} {:>9} {:>12} {:>12} {:>8} {:>12}\n'
+    _stdout.write(fmt.format('PEER', 'MSGS IN', 'MSGS OUT', 'BYTES IN',
+                             'BYTES OUT', 'BLOCKED', 'UNREACHABLE'))
+    for row in rows:
+        _stdout.write(fmt.format(*row))
+    fmt = '{:<20} {:>9} {:>10} {:>10}\n'
+    _stdout.write(fmt.format('SUBSYSTEM', 'ROUTED', 'P50 US', 'P99 US'))
+    for subsystem, histogram in sorted(stats['routing'].iteritems()):
+        _stdout.write(fmt.format(
+            subsystem, sum(histogram.itervalues()),
+            '<=%d' % _percentile(histogram, 0.5),
+            '<=%d' % _percentile(histogram, 0.99)))
+
+
 def do_stats(opts):
     call = opts.connection.call
     if opts.op == 'status':
         _stdout.write(
             '%sabled\n' % ('en' if call('stats.enabled') else 'dis'))
+    elif opts.op == 'top':
+        _write_stats_top(call('stats.get'))
     elif opts.op in ['dump', 'pprint']:
         stats = call('stats.get')
         if opts.op == 'pprint':
@@ -858,6 +929,65 @@ def do_stats(opts):
             '%sabled\n' % ('en' if call('stats.enabled') else 'dis'))
 
 
+def do_rpc_stats(opts):
+    stats = opts.connection.server.vip.rpc.call(
+        opts.peer, 'rpc.stats', reset=opts.reset).get(timeout=30)
+    fmt = '{:<36} {:>9} {:>7} {:>10} {:>10} {:>12} {:>12}\n'
+    _stdout.write(fmt.format('METHOD', 'CALLS', 'ERRORS', 'P50 US',
+                             'P99 US', 'BYTES IN', 'BYTES OUT'))
+    for name, stat in sorted(stats.iteritems(),
+                             key=lambda item: item[1]['calls'], reverse=True):
+        _stdout.write(fmt.format(
+            name, stat['calls'], stat['errors'],
+            '<=%d' % _percentile(stat['latency'], 0.5),
+            '<=%d' % _percentile(stat['latency'], 0.99),
+            stat['request_bytes'], stat['response_bytes']))
+
+
+def do_hub_blocks(opts):
+    health = opts.connection.server.vip.rpc
+    if opts.disable:
+        health.call(opts.peer, 'health.monitor_hub_blocks',
+                    None).get(timeout=30)
+    elif opts.threshold is not None:
+        health.call(opts.peer, 'health.monitor_hub_blocks',
+                    opts.threshold).get(timeout=30)
+    blocks = health.call(opts.peer, 'health.get_hub_blocks').get(timeout=30)
+    threshold = blocks['threshold_ms']
+    _stdout.write('threshold: {}\n'.format(
+        'disabled' if threshold is None else '%s ms' % threshold))
+    _stdout.write('blocks: {count}\nlongest: {max_duration_ms} ms\n'.format(
+        **blocks))
+    last = blocks['last']
+    if last:
+        _stdout.write('last: {duration_ms} ms at {utc_time}\n{stack}'.format(
+            **last))
+
+
+def do_profile(opts):
+    rpc = opts.connection.server.vip.rpc
+    rpc.call(opts.peer, 'profile.start',
+             opts.interval / 1000.0).get(timeout=30)
+    gevent.sleep(opts.seconds)
+    profile = rpc.call(opts.peer, 'profile.stop').get(timeout=60)
+    _stdout.write('{samples} samples in {duration:.1f} s\n'.format(**profile))
+    start, stop = profile['snapshots']['start'], profile['snapshots']['stop']
+    fmt = '{:<40} {:>12} {:>12}\n'
+    _stdout.write(fmt.format('', 'START', 'STOP'))
+    for key in ('rss_kb', 'max_rss_kb', 'total_objects'):
+        _stdout.write(fmt.format(key, start[key], stop[key]))
+    for name, count in sorted(stop['objects'].iteritems(),
+                              key=lambda item: item[1], reverse=True):
+        _stdout.write(fmt.format(name, start['objects'].get(name, ''), count))
+    lines = ['{} {}\n'.format(stack, count) for stack, count in
+             sorted(profile['stacks'].iteritems())]
+    if opts.output:
+        with open(opts.output, 'w') as file:
+            file.writelines(lines)
+    else:
+        _stdout.writelines(lines)
+
+
 def show_serverkey(opts):
     """
     write serverkey to standard out.
@@ -1795,10 +1925,38 @@ def main(argv=sys.argv):
     stats = add_parser('stats',
                        help='manage router message statistics tracking')
     op = stats.add_argument(
-        'op', choices=['status', 'enable', 'disable', 'dump', 'pprint'],
+        'op', choices=['status', 'enable', 'disable', 'dump', 'pprint',
+                       'top'],
         nargs='?')
     stats.set_defaults(func=do_stats, op='status')
 
+    rpc_stats = add_parser('rpc-stats',
+                           help='show time spent in RPC methods of an agent')
+    rpc_stats.add_argument('peer', help='VIP identity of the agent')
+    rpc_stats.add_argument('--reset', action='store_true',
+                           help='clear the statistics after showing them')
+    rpc_stats.set_defaults(func=do_rpc_stats, reset=False)
+
+    hub_blocks = add_parser('hub-blocks',
+                            help='detect code blocking the hub of an agent')
+    hub_blocks.add_argument('peer', help='VIP identity of the agent')
+    hub_blocks.add_argument('--threshold', metavar='MS', type=float,
+                            help='report blocks longer than MS milliseconds')
+    hub_blocks.add_argument('--disable', action='store_true',
+                            help='stop monitoring the agent')
+    hub_blocks.set_defaults(func=do_hub_blocks, threshold=None, disable=False)
+
+    profile = add_parser('profile',
+                         help='sample the stacks and memory of an agent')
+    profile.add_argument('peer', help='VIP identity of the agent')
+    profile.add_argument('--seconds', type=float,
+                         help='time to profile for (default: %(default)s)')
+    profile.add_argument('--interval', metavar='MS', type=float,
+                         help='time between samples (default: %(default)s)')
+    profile.add_argument('-o', '--output', metavar='FILE',
+                         help='write collapsed stacks to FILE')
+    profile.set_defaults(func=do_profile, seconds=10, interval=5, output=None)
+
     if HAVE_RESTRICTED:
         cgroup = add_parser('create-cgroups',
                             help='setup VOLTTRON control group for restricted execution')
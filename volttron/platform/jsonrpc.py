@@ -82,6 +82,8 @@ DISCOVERY_ERROR = -32003
 UNABLE_TO_UNREGISTER_INSTANCE = -32004
 UNAVAILABLE_PLATFORM = -32005
 UNAVAILABLE_AGENT = -32006
+SERVER_BUSY = -32007
+DEADLINE_EXCEEDED = -32008
 
 
 def json_validate_request(jsonrequest):
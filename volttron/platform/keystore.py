@@ -199,6 +199,9 @@ class KnownHostsStore(BaseJSONStore):
     @staticmethod
     def _parse_addr(addr):
         url = urlparse.urlparse(addr)
+        if url.scheme == 'ipc':
+            # Abstract socket names parse as a netloc of '@'.
+            return url.netloc + url.path
         if url.netloc:
             return url.netloc
         return url.path
@@ -59,6 +59,7 @@ from __future__ import print_function, absolute_import
 
 import argparse
 import errno
+import functools
 import logging
 from logging import handlers
 import logging.config
@@ -95,7 +96,10 @@ from .web import MasterWebService
 from .store import ConfigStoreService
 from .agent import utils
 from .agent.known_identities import MASTER_WEB, CONFIGURATION_STORE, AUTH
-from .vip.agent.subsystems.pubsub import ProtectedPubSubTopics
+from .vip.agent.subsystems.health import HUB_MONITOR_CAPABILITY
+from .vip.agent.subsystems.profile import PROFILE_CAPABILITY
+from .vip.agent.subsystems.pubsub import (ProtectedPubSubTopics,
+                                          LastValueCache, OVERFLOW_POLICIES)
 from .keystore import KeyStore, KnownHostsStore
 from ..utils.persistance import load_create_store
 
@@ -261,10 +265,12 @@ class Router(BaseRouter):
                  context=None, secretkey=None, publickey=None,
                  default_user_id=None, monitor=False, tracker=None,
                  volttron_central_address=None, instance_name=None,
-                 bind_web_address=None, volttron_central_serverkey=None):
+                 bind_web_address=None, volttron_central_serverkey=None,
+                 ipc_address=None):
         super(Router, self).__init__(
             context=context, default_user_id=default_user_id)
         self.local_address = Address(local_address)
+        self.ipc_address = ipc_address and Address(ipc_address)
         self.addresses = addresses = [Address(addr) for addr in set(addresses)]
         self._secretkey = secretkey
         self._publickey = publickey
@@ -291,6 +297,9 @@ class Router(BaseRouter):
         sock.identity = identity = str(uuid.uuid4())
         if self._monitor:
             Monitor(sock.get_monitor_socket()).start()
+        if self._tracker:
+            self._tracker.socket_options = {
+                'sndhwm': sock.sndhwm, 'rcvhwm': sock.rcvhwm}
         sock.bind('inproc://vip')
         _log.debug('In-process VIP router bound to inproc://vip')
         sock.zap_domain = 'vip'
@@ -305,6 +314,20 @@ class Router(BaseRouter):
 
         addr.bind(sock)
         _log.debug('Local VIP router bound to %s' % addr)
+        addr = self.ipc_address
+        if addr:
+            # Connections are authenticated by ZAP using the UNIX peer
+            # credentials of the connecting process instead of CURVE.
+            if not addr.base.startswith('ipc:'):
+                raise ValueError(
+                    'peer credential address must be ipc: %s' % addr.base)
+            if not addr.identity:
+                addr.identity = identity
+            if not addr.domain:
+                addr.domain = 'vip'
+            addr.server = 'NULL'
+            addr.bind(sock)
+            _log.debug('Local IPC VIP router bound to %s' % addr)
         for address in self.addresses:
             if not address.identity:
                 address.identity = identity
@@ -380,9 +403,16 @@ class Router(BaseRouter):
 
 
 class PubSubService(Agent):
-    def __init__(self, protected_topics_file, *args, **kwargs):
+    def __init__(self, protected_topics_file, cache_size=0,
+                 cache_prefixes=None, queue_size=0,
+                 overflow_policy='block', *args, **kwargs):
         super(PubSubService, self).__init__(*args, **kwargs)
         self._protected_topics_file = os.path.abspath(protected_topics_file)
+        if cache_size > 0:
+            self.vip.pubsub.last_values = LastValueCache(
+                cache_size, cache_prefixes)
+        self.vip.pubsub.queue_size = queue_size
+        self.vip.pubsub.overflow_policy = overflow_policy
 
     @Core.receiver('onstart')
     def setup_agent(self, sender, **kwargs):
@@ -417,6 +447,54 @@ class PubSubService(Agent):
                           self._protected_topics_file)
 
 
+def spawn_service_thread(factory, running_event):
+    '''Run the agent returned by factory in its own thread and hub.
+
+    The agent is created in the new thread so that its gevent objects
+    belong to that thread's hub. Returns a greenlet, in the calling
+    thread, which exits when the agent stops and stops the agent if
+    killed. running_event is set once the agent is running.
+    '''
+    # Async watchers are the only thread-safe way to wake another hub.
+    loop = gevent.get_hub().loop
+    started, stopped = loop.async(), loop.async()
+    started.start(running_event.set)
+    finished = gevent.event.Event()
+    stopped.start(finished.set)
+    agents = []
+
+    def target():
+        try:
+            agent = factory()
+            agents.append(agent)
+            event = gevent.event.Event()
+            event.rawlink(lambda _: started.send())
+            gevent.spawn(agent.core.run, event).get()
+        except Exception:
+            _log.exception('Unhandled exception in service thread')
+        finally:
+            stopped.send()
+
+    def wait():
+        thread = threading.Thread(target=target)
+        thread.daemon = True
+        thread.start()
+        try:
+            finished.wait()
+        finally:
+            if not finished.is_set() and running_event.is_set():
+                # Stop from within the agent's hub. Core.stop() from
+                # here would wait on a reply the exiting thread may
+                # never send.
+                core = agents[0].core
+                core.send(core.stop)
+                finished.wait()
+            started.stop()
+            stopped.stop()
+
+    return gevent.spawn(wait)
+
+
 def start_volttron_process(opts):
     '''Start the main volttron process.
 
@@ -457,6 +535,8 @@ def start_volttron_process(opts):
     opts.subscribe_address = config.expandall(opts.subscribe_address)
     opts.vip_address = [config.expandall(addr) for addr in opts.vip_address]
     opts.vip_local_address = config.expandall(opts.vip_local_address)
+    if opts.vip_ipc_address:
+        opts.vip_ipc_address = config.expandall(opts.vip_ipc_address)
     if opts.instance_name is None:
         if len(opts.vip_address) > 0:
             opts.instance_name = opts.vip_address[0]
@@ -522,9 +602,11 @@ def start_volttron_process(opts):
     publickey = decode_key(keystore.public)
     if publickey:
         _log.info('public key: %s', encode_key(publickey))
-        # Authorize the platform key:
+        # Authorize the platform key, which volttron-ctl also uses:
         entry = AuthEntry(credentials=encode_key(publickey),
                     user_id='platform',
+                    capabilities=[HUB_MONITOR_CAPABILITY,
+                                  PROFILE_CAPABILITY],
                     comments='Automatically added by platform on start')
         AuthFile().add(entry, overwrite=True)
         # Add platform key to known-hosts file:
@@ -549,7 +631,8 @@ def start_volttron_process(opts):
                    volttron_central_address=opts.volttron_central_address,
                    volttron_central_serverkey=opts.volttron_central_serverkey,
                    instance_name=opts.instance_name,
-                   bind_web_address=opts.bind_web_address).run()
+                   bind_web_address=opts.bind_web_address,
+                   ipc_address=opts.vip_ipc_address).run()
 
         except Exception:
             _log.exception('Unhandled exception in router loop')
@@ -612,13 +695,20 @@ def start_volttron_process(opts):
 
         # Launch additional services and wait for them to start before
         # auto-starting agents
+        pubsub = functools.partial(
+            PubSubService, protected_topics_file,
+            cache_size=opts.pubsub_cache_size,
+            cache_prefixes=opts.pubsub_cache_prefix,
+            queue_size=opts.pubsub_queue_size,
+            overflow_policy=opts.pubsub_overflow,
+            address=address, identity='pubsub', heartbeat_autostart=True,
+            enable_store=False)
         services = [
             ControlService(opts.aip, address=address, identity='control',
-                           tracker=tracker, heartbeat_autostart=True,
+                           tracker=tracker,
+                           stats_interval=opts.stats_publish_interval,
+                           heartbeat_autostart=True,
                            enable_store=False, enable_channel=True),
-            PubSubService(protected_topics_file, address=address,
-                          identity='pubsub', heartbeat_autostart=True,
-                          enable_store=False),
             CompatPubSub(address=address, identity='pubsub.compat',
                          publish_address=opts.publish_address,
                          subscribe_address=opts.subscribe_address),
@@ -629,9 +719,17 @@ def start_volttron_process(opts):
                 volttron_central_address=opts.volttron_central_address,
                 aip=opts.aip, enable_store=False)
         ]
+        if not opts.pubsub_thread:
+            services.insert(1, pubsub())
         events = [gevent.event.Event() for service in services]
         tasks = [gevent.spawn(service.core.run, event)
                  for service, event in zip(services, events)]
+        if opts.pubsub_thread:
+            # Keep encoding and fan-out of publish storms from delaying
+            # the RPCs served by the other services on this hub.
+            event = gevent.event.Event()
+            tasks.append(spawn_service_thread(pubsub, event))
+            events.append(event)
         tasks.append(config_store_task)
         tasks.append(auth_task)
         gevent.wait(events)
@@ -639,7 +737,8 @@ def start_volttron_process(opts):
 
         # Auto-start agents now that all services are up
         if opts.autostart:
-            for name, error in opts.aip.autostart():
+            for name, error in opts.aip.autostart(
+                    opts.autostart_concurrency, opts.autostart_ready_timeout):
                 _log.error('error starting {!r}: {}\n'.format(name, error))
         # Wait for any service to stop, signaling exit
         try:
@@ -691,6 +790,10 @@ def main(argv=sys.argv):
     parser.add_argument(
         '--monitor', action='store_true',
         help='monitor and log connections (implies -v)')
+    parser.add_argument(
+        '--stats-publish-interval', metavar='SECONDS', type=float,
+        help='enable router statistics and publish them to platform/stats '
+             'every SECONDS (0 disables publishing)')
     parser.add_argument(
         '-q', '--quiet', action='add_const', const=10, dest='verboseness',
         help='decrease logger verboseness; may be used multiple times')
@@ -716,6 +819,14 @@ def main(argv=sys.argv):
     agents.add_argument(
         '--no-autostart', action='store_false', dest='autostart',
         help=argparse.SUPPRESS)
+    agents.add_argument(
+        '--autostart-concurrency', metavar='N', type=int,
+        help='start at most N agents of equal priority at once '
+             '(default 4; 1 starts agents one at a time)')
+    agents.add_argument(
+        '--autostart-ready-timeout', metavar='SECONDS', type=float,
+        help='wait up to SECONDS for agents of each priority to connect '
+             'before starting agents of the next priority')
     agents.add_argument(
         '--publish-address', metavar='ZMQADDR',
         help='ZeroMQ URL used for pre-3.x agent publishing (deprecated)')
@@ -728,6 +839,11 @@ def main(argv=sys.argv):
     agents.add_argument(
         '--vip-local-address', metavar='ZMQADDR',
         help='ZeroMQ URL to bind for local agent VIP connections')
+    agents.add_argument(
+        '--vip-ipc-address', metavar='ZMQADDR',
+        help='ZeroMQ ipc URL to bind for agents started by the platform, '
+             'which authenticate with their process credentials rather '
+             'than CURVE')
     agents.add_argument(
         '--bind-web-address', metavar='BINDWEBADDR', default=None,
         help='Bind a web server to the specified ip:port passed')
@@ -742,6 +858,27 @@ def main(argv=sys.argv):
         help='The name of the instance that will be reported to '
              'VOLTTRON central.')
 
+    pubsub = parser.add_argument_group('pubsub options')
+    pubsub.add_argument(
+        '--pubsub-cache-size', metavar='COUNT', type=int,
+        help='maximum number of topics kept in the last-value cache '
+             '(0 disables the cache)')
+    pubsub.add_argument(
+        '--pubsub-cache-prefix', metavar='PREFIX', action='append',
+        help='cache only topics beginning with PREFIX (may be repeated)')
+    pubsub.add_argument(
+        '--pubsub-queue-size', metavar='COUNT', type=int,
+        help='maximum number of pushes queued for each flow-controlled '
+             'subscriber (default and 0 disable flow control)')
+    pubsub.add_argument(
+        '--pubsub-overflow', choices=OVERFLOW_POLICIES,
+        help='action taken when a subscriber queue is full; block '
+             '(the default) holds publishers back, while drop-oldest and '
+             'drop-newest discard pushes to slow subscribers')
+    pubsub.add_argument(
+        '--pubsub-thread', action='store_true', inverse='--no-pubsub-thread',
+        help='run the pubsub service in its own thread and event loop')
+
     # XXX: re-implement control options
     #on
     #control.add_argument(
@@ -805,10 +942,17 @@ def main(argv=sys.argv):
         verboseness=logging.WARNING,
         volttron_home=volttron_home,
         autostart=True,
+        # Agent start up is mostly spent waiting on the new process to
+        # import and connect, so a few at a time overlap that waiting
+        # without a burst of processes competing for the CPU on small
+        # devices.
+        autostart_concurrency=4,
+        autostart_ready_timeout=None,
         publish_address=ipc + 'publish',
         subscribe_address=ipc + 'subscribe',
         vip_address=[],
         vip_local_address=ipc + 'vip.socket',
+        vip_ipc_address=None,
         # This is used to start the web server from the web module.
         bind_web_address=None,
         # Used to contact volttron central when registering volttron central
@@ -816,6 +960,12 @@ def main(argv=sys.argv):
         volttron_central_address=None,
         volttron_central_serverkey=None,
         instace_name=None,
+        pubsub_cache_size=0,
+        pubsub_cache_prefix=[],
+        pubsub_queue_size=0,
+        pubsub_overflow='block',
+        pubsub_thread=False,
+        stats_publish_interval=0,
         # allow_root=False,
         # allow_users=None,
         # allow_groups=None,
@@ -77,8 +77,8 @@ class Agent(object):
                      enable_channel):
             self.peerlist = PeerList(core)
             self.ping = Ping(core)
-            self.rpc = RPC(core, owner)
-            self.hello = Hello(core)
+            self.hello = Hello(core, self.peerlist)
+            self.rpc = RPC(core, owner, self.hello)
             self.pubsub = PubSub(core, self.rpc, self.peerlist, owner)
             if enable_channel:
                 self.channel = Channel(core)
@@ -90,6 +90,7 @@ class Agent(object):
             if enable_web:
                 self.web = WebSubSystem(owner, core, self.rpc)
             self.auth = Auth(owner, core, self.rpc)
+            self.profile = Profile(core, self.rpc)
 
     def __init__(self, identity=None, address=None, context=None,
                  publickey=None, secretkey=None, serverkey=None,
@@ -97,7 +98,7 @@ class Agent(object):
                  volttron_home=os.path.abspath(platform.get_home()),
                  agent_uuid=None, enable_store=True,
                  enable_web=False, enable_channel=False,
-                 reconnect_interval=None, version='0.1'):
+                 reconnect_interval=None, version='0.1', spawn_limits=None):
 
         self._version = version
 
@@ -113,6 +114,8 @@ class Agent(object):
                          volttron_home=volttron_home, agent_uuid=agent_uuid,
                          reconnect_interval=reconnect_interval,
                          version=version)
+        if spawn_limits is not None:
+            self.core.spawn_limits = spawn_limits
 
         self.vip = Agent.Subsystems(self, self.core, heartbeat_autostart,
                                     heartbeat_period, enable_store, enable_web,
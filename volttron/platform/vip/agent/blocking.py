@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#}}}
+
+
+'''Detect code which blocks the gevent hub.
+
+A greenlet which calls a blocking library (a synchronous socket client,
+sqlite3, etc.) stops every other greenlet in the process until it returns.
+HubBlockMonitor watches greenlet switches from a native thread and, when
+the same greenlet has run longer than a threshold, captures its stack.
+Listeners are called from the hub once the greenlet finally yields.
+'''
+
+from __future__ import absolute_import
+
+import sys
+import time
+import traceback
+import weakref
+
+import gevent
+from gevent import monkey
+import greenlet
+
+
+__all__ = ['HubBlockMonitor', 'monitor']
+
+_start_new_thread, _get_ident = monkey.get_original(
+    'thread', ['start_new_thread', 'get_ident'])
+_sleep = monkey.get_original('time', 'sleep')
+
+
+class HubBlockMonitor(object):
+    '''Report greenlets which run without yielding to the hub.
+
+    Listeners are added with a threshold in seconds and are called with
+    the duration of each longer block and the formatted stack captured
+    while it was blocking. The monitor only runs while it has listeners.
+    '''
+
+    def __init__(self, hub=None):
+        self.hub = hub or gevent.get_hub()
+        self.listeners = {}
+        self.threshold = None
+        self._ident = _get_ident()
+        self._switches = 0
+        self._switched_at = time.time()
+        self._active = None
+        self._reported = None
+        self._pending = []
+        self._previous_trace = None
+        # The same object must be installed and compared against.
+        self._tracer = self._trace
+        self._installed = False
+        self._generation = 0
+        self._notify = self.hub.loop.async()
+
+    def add(self, listener, threshold):
+        '''Call listener for blocks longer than threshold seconds.'''
+        self.listeners[listener] = threshold
+        self._update()
+
+    def remove(self, listener):
+        self.listeners.pop(listener, None)
+        self._update()
+
+    def _update(self):
+        running = self.threshold is not None
+        self.threshold = min(self.listeners.values()) if self.listeners else None
+        if self.threshold is not None and not running:
+            self._switched_at = time.time()
+            if not self._installed:
+                self._previous_trace = greenlet.settrace(self._tracer)
+                self._installed = True
+            self._notify.start(self._deliver)
+            _start_new_thread(self._watch, (self._generation,))
+        elif self.threshold is None and running:
+            # The watching thread exits when it sees the generation change.
+            self._generation += 1
+            if greenlet.gettrace() is self._tracer:
+                greenlet.settrace(self._previous_trace)
+                self._previous_trace = None
+                self._installed = False
+            # Otherwise a tracer installed since, such as a profiler or
+            # debugger, calls this one, which keeps passing events on.
+            self._notify.stop()
+            self._pending = []
+
+    def _trace(self, event, args):
+        if self.threshold is not None and event in ('switch', 'throw'):
+            self._switches += 1
+            self._switched_at = time.time()
+            self._active = args[1]
+        if self._previous_trace is not None:
+            self._previous_trace(event, args)
+
+    def _watch(self, generation):
+        '''Check for blocks from a native thread until disabled.'''
+        while generation == self._generation:
+            threshold = self.threshold
+            if threshold is None:
+                break
+            _sleep(max(threshold / 2.0, 0.005))
+            switches = self._switches
+            since = self._switched_at
+            active = self._active
+            if (active is None or active is self.hub or
+                    switches == self._reported or
+                    time.time() - since < threshold):
+                continue
+            self._reported = switches
+            frame = sys._current_frames().get(self._ident)
+            stack = ''.join(traceback.format_stack(frame)) if frame else ''
+            self._pending.append((since, stack))
+            self._notify.send()
+
+    def _deliver(self):
+        # Runs in the hub, after the blocking greenlet has yielded.
+        pending, self._pending = self._pending, []
+        now = time.time()
+        for since, stack in pending:
+            duration = now - since
+            for listener, threshold in self.listeners.items():
+                if duration >= threshold:
+                    listener(duration, stack)
+
+
+_monitors = weakref.WeakKeyDictionary()
+
+
+def monitor():
+    '''Return the HubBlockMonitor of the current thread's hub.'''
+    hub = gevent.get_hub()
+    try:
+        return _monitors[hub]
+    except KeyError:
+        result = _monitors[hub] = HubBlockMonitor(hub)
+        return result
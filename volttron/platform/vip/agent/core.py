@@ -72,6 +72,7 @@ import uuid
 import weakref
 
 import gevent.event
+import gevent.queue
 from zmq import green as zmq
 from zmq.green import ZMQError, EAGAIN, ENOTSOCK, EADDRINUSE
 from zmq.utils import jsonapi as json
@@ -80,8 +81,10 @@ from zmq.utils.monitor import recv_monitor_message
 from .decorators import annotate, annotations, dualmethod
 from .dispatch import Signal
 from .errors import VIPError
+from .pools import PoolFull, SpawnPool
 from .. import green as vip
 from .. import router
+from ..socket import DecompressionError, Message, is_bulk
 from .... import platform
 from volttron.platform.keystore import KeyStore, KnownHostsStore
 from volttron.platform.agent import utils
@@ -139,6 +142,10 @@ class Periodic(object):  # pylint: disable=invalid-name
         return gevent.Greenlet(self._loop, method)
 
 
+class _EventKilled(BaseException):
+    '''Raised in a running scheduled event when its agent stops.'''
+
+
 class ScheduledEvent(object):
     '''Class returned from Core.schedule.'''
 
@@ -148,14 +155,41 @@ class ScheduledEvent(object):
         self.kwargs = kwargs or {}
         self.canceled = False
         self.finished = False
+        self.wheel = None
+        self.greenlet = None
 
     def cancel(self):
         '''Mark the timer as canceled to avoid a callback.'''
         self.canceled = True
+        if self.wheel is not None:
+            self.wheel.cancel(self)
+
+    def kill(self):
+        '''Cancel the event and stop its callback if it is running.
+
+        The callback may be running in a greenlet shared with other
+        events, such as a timer wheel worker, so only the callback is
+        interrupted and not the greenlet.
+        '''
+        self.cancel()
+        if self.greenlet is not None:
+            # Checked again from the hub, as gevent does for kill(), in
+            # case the callback returns first.
+            gevent.get_hub().loop.run_callback(self._interrupt)
+
+    def _interrupt(self):
+        if self.greenlet is not None and not self.finished:
+            self.greenlet.throw(_EventKilled)
 
     def __call__(self):
         if not self.canceled:
-            self.function(*self.args, **self.kwargs)
+            self.greenlet = gevent.getcurrent()
+            try:
+                self.function(*self.args, **self.kwargs)
+            except _EventKilled:
+                pass
+            finally:
+                self.greenlet = None
         self.finished = True
 
 
@@ -174,6 +208,14 @@ def findsignal(obj, owner, name):
 class BasicCore(object):
     delay_onstart_signal = False
     delay_running_event_set = False
+    # Set to a TimerWheel, which may be shared by many agents in the same
+    # process, to schedule events on it instead of a heap per agent.
+    timer_wheel = None
+    # Most greenlets each kind of work may run at once, such as
+    # {'rpc': 100}; more work is queued. Kinds not listed are unbounded.
+    spawn_limits = {}
+    # Most work queued for each limited kind; more work is rejected.
+    spawn_queue_limit = 10000
 
     def __init__(self, owner):
         self.greenlet = None
@@ -183,6 +225,8 @@ class BasicCore(object):
         self._stop_event = None
         self._schedule_event = None
         self._schedule = []
+        self._wheel_events = weakref.WeakSet()
+        self._pools = {}
         self.onsetup = Signal()
         self.onstart = Signal()
         self.onstop = Signal()
@@ -245,21 +289,27 @@ class BasicCore(object):
         def kill_leftover_greenlets():
             for glt in self.spawned_greenlets:
                 glt.kill()
+            for pool in self._pools.itervalues():
+                pool.kill()
 
         self.greenlet.link(lambda _: kill_leftover_greenlets())
 
         def handle_async():
             '''Execute pending calls.'''
             calls = self._async_calls
+            pool = self.pool('async')
             while calls:
                 func, args, kwargs = calls.pop()
-                greenlet = gevent.spawn(func, *args, **kwargs)
-                self.spawned_greenlets.add(greenlet)
+                try:
+                    pool.spawn(func, *args, **kwargs)
+                except PoolFull as exc:
+                    _log.error('dropped async call to %r: %s', func, exc)
 
         def schedule_loop():
             heap = self._schedule
             event = self._schedule_event
-            cur = gevent.getcurrent()
+            pool = self.pool('schedule')
+            gevent.getcurrent().link(lambda glt: pool.kill())
             now = time.time()
             while True:
                 if heap:
@@ -272,11 +322,17 @@ class BasicCore(object):
                 now = time.time()
                 while heap and now >= heap[0][0]:
                     _, callback = heapq.heappop(heap)
-                    greenlet = gevent.spawn(callback)
-                    cur.link(lambda glt: greenlet.kill())
+                    try:
+                        pool.spawn(callback)
+                    except PoolFull as exc:
+                        _log.error('dropped scheduled call to %r: %s',
+                                   callback, exc)
 
         self._stop_event = stop = gevent.event.Event()
         self._schedule_event = gevent.event.Event()
+        if self.timer_wheel is not None:
+            while self._schedule:
+                self._add_to_wheel(*heapq.heappop(self._schedule))
         self._async = gevent.get_hub().loop.async()
         self._async.start(handle_async)
         current.link(lambda glt: self._async.stop())
@@ -288,9 +344,13 @@ class BasicCore(object):
         loop = looper.next()
         if loop:
             self.spawned_greenlets.add(loop)
-        scheduler = gevent.spawn(schedule_loop)
-        if loop:
-            loop.link(lambda glt: scheduler.kill())
+        if self.timer_wheel is None:
+            scheduler = gevent.spawn(schedule_loop)
+            if loop:
+                loop.link(lambda glt: scheduler.kill())
+        else:
+            # The wheel runs the agent's events; no loop is needed.
+            scheduler = None
         if not self.delay_onstart_signal:
             self.onstart.sendby(self.link_receiver, self)
         if not self.delay_running_event_set:
@@ -302,7 +362,11 @@ class BasicCore(object):
             stop.wait()
         except (gevent.GreenletExit, KeyboardInterrupt):
             pass
-        scheduler.kill()
+        if scheduler is not None:
+            scheduler.kill()
+        # Like the scheduler's pool, stop events the wheel has started.
+        for event in list(self._wheel_events):
+            event.kill()
         looper.next()
         receivers = self.onstop.sendby(self.link_receiver, self)
         gevent.wait(receivers)
@@ -354,6 +418,21 @@ class BasicCore(object):
         self.spawned_greenlets.add(greenlet)
         return greenlet
 
+    def pool(self, name):
+        '''Return the SpawnPool for a kind of work, limited by spawn_limits.
+        '''
+        try:
+            return self._pools[name]
+        except KeyError:
+            size = self.spawn_limits.get(name)
+            pool = self._pools[name] = SpawnPool(
+                size, None if size is None else self.spawn_queue_limit)
+            return pool
+
+    def spawn_stats(self):
+        '''Return the statistics of each SpawnPool used so far.'''
+        return {name: pool.stats() for name, pool in self._pools.iteritems()}
+
     def spawn_later(self, seconds, func, *args, **kwargs):
         assert self.greenlet is not None
         greenlet = gevent.spawn_later(seconds, func, *args, **kwargs)
@@ -397,10 +476,18 @@ class BasicCore(object):
     def schedule(self, deadline, func, *args, **kwargs):
         deadline = utils.get_utc_seconds_from_epoch(deadline)
         event = ScheduledEvent(func, args, kwargs)
-        heapq.heappush(self._schedule, (deadline, event))
-        self._schedule_event.set()
+        if self.timer_wheel is not None:
+            self._add_to_wheel(deadline, event)
+        else:
+            heapq.heappush(self._schedule, (deadline, event))
+            self._schedule_event.set()
         return event
 
+    def _add_to_wheel(self, deadline, event):
+        event.wheel = self.timer_wheel
+        self.timer_wheel.add(deadline, event)
+        self._wheel_events.add(event)
+
     @schedule.classmethod
     def schedule(cls, deadline, *args, **kwargs):  # pylint: disable=no-self-argument
         if hasattr(deadline, 'timetuple'):
@@ -424,6 +511,12 @@ class Core(BasicCore):
     # to false to keep from blocking. AuthService does this.
     delay_running_event_set = True
 
+    # Received bulk messages (see vip.socket.BULK_PREFIX) are queued,
+    # up to this many, and dispatched one per turn of the event loop
+    # so that control messages received meanwhile are not held up.
+    # Bulk messages received while the queue is full are refused.
+    bulk_queue_size = 1000
+
     def __init__(self, owner, address=None, identity=None, context=None,
                  publickey=None, secretkey=None, serverkey=None,
                  volttron_home=os.path.abspath(platform.get_home()),
@@ -434,6 +527,8 @@ class Core(BasicCore):
 
         # These signals need to exist before calling super().__init__()
         self.onviperror = Signal()
+        # Number of bulk messages refused because the queue was full
+        self.bulk_dropped = 0
         self.onsockevent = Signal()
         self.onconnected = Signal()
         self.ondisconnected = Signal()
@@ -582,6 +677,7 @@ class Core(BasicCore):
         state = type('HelloState', (), {'count': 0, 'ident': None})
 
         hello_response_event = gevent.event.Event()
+        compress = vip.Address(self.address).compress
 
         def connection_failed_check():
             # If we don't have a verified connection after 10.0 seconds
@@ -603,8 +699,14 @@ class Core(BasicCore):
             state.ident = ident = b'connect.hello.%d' % state.count
             state.count += 1
             self.spawn(connection_failed_check)
+            # Compression is renegotiated on every connection.
+            self.socket.compress_threshold = None
+            args = [b'hello']
+            if compress is not None:
+                # Ask the router to compress traffic on this connection
+                args.extend([b'zlib', b'%d' % compress])
             self.spawn(self.socket.send_vip,
-                       b'', b'hello', [b'hello'], msg_id=ident)
+                       b'', b'hello', args, msg_id=ident)
 
         def hello_response(sender, version='',
                            router='', identity=''):
@@ -686,8 +788,52 @@ class Core(BasicCore):
         if self.address.startswith('inproc:'):
             hello()
 
+        def dispatch(message):
+            subsystem = bytes(message.subsystem)
+            try:
+                handle = self.subsystems[subsystem]
+            except KeyError:
+                _log.error('peer %r requested unknown subsystem %r',
+                           bytes(message.peer), subsystem)
+                message.user = b''
+                message.args = list(router._INVALID_SUBSYSTEM)
+                message.args.append(message.subsystem)
+                message.subsystem = b'error'
+                self.socket.send_vip_object(message, copy=False)
+            else:
+                handle(message)
+
+        def bulk_loop(bulk):
+            for message in bulk:
+                dispatch(message)
+                gevent.sleep(0)
+
+        def refuse_bulk(message):
+            # Waiting for room would hold up control messages, so the
+            # message is dropped as if the router had failed to send
+            # it: the sender and any local call waiting on it see
+            # EAGAIN.
+            if not self.bulk_dropped % self.bulk_queue_size:
+                _log.warning('bulk queue full, refusing messages '
+                             '(%d refused so far)', self.bulk_dropped)
+            self.bulk_dropped += 1
+            subsystem = bytes(message.subsystem)
+            if subsystem == b'error':
+                return
+            errnum, errmsg = [bytes(frame) for frame in
+                              router._ROUTE_ERRORS[EAGAIN]]
+            self.socket.send_vip(message.peer, b'error',
+                                 [errnum, errmsg, self.identity, subsystem],
+                                 message.id)
+            self.handle_error(Message(
+                peer=message.peer, subsystem=b'error', id=message.id,
+                user=b'', args=[errnum, errmsg, message.peer, subsystem]))
+
         def vip_loop():
             sock = self.socket
+            bulk = gevent.queue.Queue(self.bulk_queue_size)
+            worker = gevent.spawn(bulk_loop, bulk)
+            gevent.getcurrent().link(lambda glt: worker.kill())
             while True:
                 try:
                     message = sock.recv_vip_object(copy=False)
@@ -700,32 +846,36 @@ class Core(BasicCore):
                         break
                     else:
                         raise
+                except DecompressionError as exc:
+                    peer, _, msg_id, subsystem = exc.frames[:4]
+                    _log.warning('dropped message from %r with bad compressed'
+                                 ' arguments: %s', bytes(peer), exc.args[1])
+                    sock.send_vip(peer, b'error',
+                                  [str(exc.errnum), exc.args[1], b'',
+                                   subsystem], msg_id)
+                    continue
 
-                subsystem = bytes(message.subsystem)
                 # Handle hellos sent by CONNECTED event
-                if (subsystem == b'hello' and
+                if (bytes(message.subsystem) == b'hello' and
                             bytes(message.id) == state.ident and
                             len(message.args) > 3 and
                             bytes(message.args[0]) == b'welcome'):
                     version, server, identity = [
                         bytes(x) for x in message.args[1:4]]
+                    if b'zlib' in [bytes(x) for x in message.args[4:]]:
+                        sock.compress_threshold = compress
                     self.__connected = True
                     self.onconnected.send(self, version=version,
                                           router=server, identity=identity)
                     continue
 
-                try:
-                    handle = self.subsystems[subsystem]
-                except KeyError:
-                    _log.error('peer %r requested unknown subsystem %r',
-                               bytes(message.peer), subsystem)
-                    message.user = b''
-                    message.args = list(router._INVALID_SUBSYSTEM)
-                    message.args.append(message.subsystem)
-                    message.subsystem = b'error'
-                    sock.send_vip_object(message, copy=False)
+                if is_bulk(message.id):
+                    try:
+                        bulk.put_nowait(message)
+                    except gevent.queue.Full:
+                        refuse_bulk(message)
                 else:
-                    handle(message)
+                    dispatch(message)
 
         yield gevent.spawn(vip_loop)
         # pre-stop
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#}}}
+
+
+'''Worker pools for exported RPC methods that would block the hub.'''
+
+from __future__ import absolute_import
+
+import imp
+import importlib
+import os
+import cPickle as pickle
+import struct
+import sys
+import time
+
+from gevent.lock import Semaphore
+from gevent.subprocess import Popen, PIPE
+from gevent.threadpool import ThreadPool
+
+
+__all__ = ['ThreadExecutor', 'ProcessExecutor', 'ClassAttribute']
+
+
+def _timed(submitted, func, args, kwargs):
+    # Runs in the worker, so the wait includes time spent queued there.
+    started = time.time()
+    try:
+        return started - submitted, True, func(*args, **kwargs)
+    except Exception as exc:   # pylint: disable=broad-except
+        return started - submitted, False, exc
+
+
+class ClassAttribute(object):
+    '''Picklable reference to a function stored on a class.
+
+    Functions defined in a class body, such as static methods, cannot be
+    pickled by Python 2 and so cannot be sent to a process pool directly.
+    '''
+
+    def __init__(self, cls, name):
+        self.module = cls.__module__
+        self.cls = cls.__name__
+        self.name = name
+
+    def __call__(self, *args, **kwargs):
+        cls = getattr(importlib.import_module(self.module), self.cls)
+        return getattr(cls, self.name)(*args, **kwargs)
+
+
+class _Executor(object):
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.submitted = 0
+        self.completed = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def apply(self, func, args=(), kwargs=None):
+        '''Run func in the pool and return its result.
+
+        Only the calling greenlet waits on the result; the hub keeps
+        running.
+        '''
+        self.submitted += 1
+        try:
+            wait, success, value = self._apply(
+                _timed, (time.time(), func, args, kwargs or {}))
+        finally:
+            self.completed += 1
+        self.wait_time += wait
+        self.max_wait_time = max(self.max_wait_time, wait)
+        if not success:
+            raise value
+        return value
+
+    def stats(self):
+        '''Return the number of calls and the time they waited for a worker.
+        '''
+        return {'max_workers': self.max_workers,
+                'submitted': self.submitted,
+                'pending': self.submitted - self.completed,
+                'wait_time': self.wait_time,
+                'max_wait_time': self.max_wait_time,
+                'mean_wait_time': self.wait_time / (self.completed or 1)}
+
+
+class ThreadExecutor(_Executor):
+    '''Run calls in a pool of threads.
+
+    Use for calls that block in I/O or in C code that releases the GIL.
+    The calls must not use the agent's subsystems, which are not thread
+    safe.
+    '''
+
+    def __init__(self, max_workers):
+        super(ThreadExecutor, self).__init__(max_workers)
+        self.pool = ThreadPool(max_workers)
+
+    def _apply(self, func, args):
+        return self.pool.apply(func, args)
+
+    def shutdown(self):
+        self.pool.kill()
+
+
+def _send(stream, data):
+    stream.write(struct.pack('!I', len(data)) + data)
+    stream.flush()
+
+
+def _receive(stream):
+    header = stream.read(4)
+    if len(header) < 4:
+        raise EOFError()
+    size, = struct.unpack('!I', header)
+    data = stream.read(size)
+    if len(data) < size:
+        raise EOFError()
+    return data
+
+
+class ProcessExecutor(_Executor):
+    '''Run calls in a pool of processes.
+
+    Use for CPU bound calls. Functions, arguments and results are
+    pickled, so the function must be defined at module level or
+    referenced through a ClassAttribute.
+
+    Workers are new interpreters rather than forks of the agent, which
+    would inherit its ZeroMQ context and gevent hub; neither survives a
+    fork. They are started on first use and reused until shutdown.
+    '''
+
+    def __init__(self, max_workers):
+        super(ProcessExecutor, self).__init__(max_workers)
+        self.slots = Semaphore(max_workers)
+        self.idle = []
+        self.workers = set()
+
+    def _start(self):
+        worker = Popen([sys.executable, '-m', __name__],
+                       stdin=PIPE, stdout=PIPE, close_fds=True)
+        self.workers.add(worker)
+        # Let the worker import what the agent can, including functions
+        # defined in the agent's main module.
+        main = getattr(sys.modules['__main__'], '__file__', None)
+        _send(worker.stdin, pickle.dumps((sys.path, main), 2))
+        return worker
+
+    def _stop(self, worker):
+        self.workers.discard(worker)
+        try:
+            worker.kill()
+        except OSError:
+            pass
+        worker.wait()
+
+    def _apply(self, func, args):
+        request = pickle.dumps((func, args), 2)
+        with self.slots:
+            worker = self.idle.pop() if self.idle else self._start()
+            try:
+                _send(worker.stdin, request)
+                response = _receive(worker.stdout)
+            except EOFError:
+                self._stop(worker)
+                raise RuntimeError(
+                    'executor worker {} exited'.format(worker.pid))
+            except BaseException:
+                # The worker may be part way through the call; its
+                # response can no longer be told from the next one's.
+                self._stop(worker)
+                raise
+            self.idle.append(worker)
+        return pickle.loads(response)
+
+    def shutdown(self):
+        for worker in list(self.workers):
+            self._stop(worker)
+        del self.idle[:]
+
+
+def _serve(infile, outfile):
+    '''Run calls sent by a ProcessExecutor until its pipe is closed.'''
+    path, main = pickle.loads(_receive(infile))
+    sys.path[:] = path
+    # Holding this module keeps its globals from being cleared when it
+    # is replaced as __main__.
+    worker_main = sys.modules['__main__']
+    if main and main.endswith('.py') and os.path.exists(main):
+        sys.modules['__main__'] = imp.load_source('__parents_main__', main)
+    while True:
+        try:
+            request = _receive(infile)
+        except EOFError:
+            return
+        try:
+            func, args = pickle.loads(request)
+            result = func(*args)
+        except Exception as exc:   # pylint: disable=broad-except
+            result = 0.0, False, exc
+        try:
+            response = pickle.dumps(result, 2)
+        except Exception as exc:   # pylint: disable=broad-except
+            response = pickle.dumps((result[0], False, RuntimeError(
+                'unpicklable result: {!r}'.format(result[2]))), 2)
+        _send(outfile, response)
+    del worker_main
+
+
+if __name__ == '__main__':
+    # Keep output from the called functions out of the response pipe.
+    _out = os.fdopen(os.dup(1), 'wb')
+    os.dup2(2, 1)
+    _serve(sys.stdin, _out)
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#}}}
+
+
+'''Bounded greenlet pools which queue work instead of blocking.'''
+
+from __future__ import absolute_import
+
+import gevent
+import gevent.pool
+import gevent.queue
+
+
+__all__ = ['SpawnPool', 'PoolFull']
+
+
+class PoolFull(Exception):
+    '''Raised by SpawnPool.spawn() when its queue is full.'''
+    pass
+
+
+class SpawnPool(object):
+    '''Run functions in at most size greenlets at once.
+
+    Unlike gevent.pool.Pool.spawn(), spawn() never blocks: when the pool
+    is full the call is queued and started by a feeder greenlet as
+    greenlets finish. Queued calls cost far less memory than greenlets,
+    so a burst of work shows up as a growing queue. Once queue_size
+    calls are queued, further calls are rejected with PoolFull. A size
+    or queue_size of None places no limit.
+    '''
+
+    def __init__(self, size=None, queue_size=None):
+        self.size = size
+        self.queue_size = queue_size
+        self.pool = gevent.pool.Pool(size)
+        self.queue = gevent.queue.Queue()
+        self.feeder = None
+        self.max_active = 0
+        self.max_queued = 0
+        self.rejected = 0
+
+    def spawn(self, func, *args, **kwargs):
+        '''Start func in the pool, returning its greenlet, or queue it.'''
+        queued = self.queue.qsize()
+        if self.pool.free_count() > 0 and not queued:
+            greenlet = self.pool.spawn(func, *args, **kwargs)
+            self.max_active = max(self.max_active, len(self.pool))
+            return greenlet
+        if self.queue_size is not None and queued >= self.queue_size:
+            self.rejected += 1
+            raise PoolFull('{} calls already queued'.format(queued))
+        self.queue.put((func, args, kwargs))
+        self.max_queued = max(self.max_queued, self.queue.qsize())
+        if self.feeder is None:
+            self.feeder = gevent.spawn(self._feed)
+
+    def _feed(self):
+        pool, queue = self.pool, self.queue
+        while True:
+            pool.wait_available()
+            func, args, kwargs = queue.get()
+            pool.spawn(func, *args, **kwargs)
+            self.max_active = max(self.max_active, len(pool))
+
+    def kill(self):
+        '''Kill running greenlets and drop queued calls.'''
+        if self.feeder is not None:
+            self.feeder.kill()
+            self.feeder = None
+        while self.queue.qsize():
+            self.queue.get()
+        self.pool.kill()
+
+    def stats(self):
+        '''Return the active and queued counts and their high-water marks.
+        '''
+        return {'size': self.size,
+                'queue_size': self.queue_size,
+                'active': len(self.pool),
+                'queued': self.queue.qsize(),
+                'max_active': self.max_active,
+                'max_queued': self.max_queued,
+                'rejected': self.rejected}
@@ -67,6 +67,7 @@ from .heartbeat import Heartbeat
 from .health import Health
 from .configstore import ConfigStore
 from .auth import Auth
+from .profile import Profile
 
 __all__ = ['PeerList', 'Ping', 'RPC', 'Hello', 'PubSub', 'Channel',
-           'Heartbeat', 'Health', 'ConfigStore', 'Auth']
+           'Heartbeat', 'Health', 'ConfigStore', 'Auth', 'Profile']
@@ -58,6 +58,7 @@
 from __future__ import absolute_import
 
 import functools
+import itertools
 import logging
 import random
 import string
@@ -66,11 +67,135 @@ import weakref
 import gevent
 from zmq import green as zmq
 from zmq import ZMQError
+from zmq.utils import jsonapi
 
 from .base import SubsystemBase
 
 
-__all__ = ['Channel']
+__all__ = ['Channel', 'Stream', 'StreamError']
+
+
+# Default number of items carried by each data frame of a stream.
+STREAM_CHUNK_SIZE = 1000
+# Default number of unacknowledged chunks a sender may have outstanding.
+STREAM_WINDOW = 8
+# Default number of seconds to wait on the remote end of a stream.
+STREAM_TIMEOUT = 30
+
+
+class StreamError(Exception):
+    """Raised when a stream is aborted or the remote end stops responding."""
+
+
+def _recv(sock, timeout):
+    if not sock.poll(timeout * 1000):
+        raise StreamError('timed out waiting on stream %r' % (sock.name,))
+    return sock.recv_multipart()
+
+
+def _close(sock):
+    # Closing a channel forgets its route immediately, so let the channel
+    # greenlet forward any frames still queued on the socket first.
+    if not sock.closed:
+        gevent.idle()
+        sock.close(linger=0)
+
+
+def send_stream(sock, items, chunk_size=STREAM_CHUNK_SIZE,
+                window=STREAM_WINDOW, timeout=STREAM_TIMEOUT):
+    """Send items from an iterable over a channel socket in chunks.
+
+    Items are serialized to JSON in chunks of chunk_size items. No more
+    than window chunks are sent before the receiver acknowledges them,
+    so items are pulled from the iterable only as fast as the receiver
+    consumes them. Returns the number of items sent, which is less than
+    the total if the receiver closed the stream early.
+    """
+    sent = outstanding = 0
+    items = iter(items)
+    while True:
+        try:
+            chunk = list(itertools.islice(items, chunk_size))
+        except Exception as exc:
+            sock.send_multipart([b'error', bytes(exc)])
+            raise
+        if not chunk:
+            break
+        # Collect acknowledgements, blocking only while the window is full.
+        while outstanding >= window or sock.poll(0):
+            message = _recv(sock, timeout)
+            if message[0] == b'close':
+                return sent
+            if message[0] == b'ack':
+                outstanding -= int(message[1])
+        sock.send_multipart([b'data', bytes(window), jsonapi.dumps(chunk)])
+        sent += len(chunk)
+        outstanding += 1
+        if len(chunk) < chunk_size:
+            break
+    sock.send_multipart([b'end'])
+    return sent
+
+
+class Stream(object):
+    """Iterate over items sent to a channel socket by send_stream().
+
+    Received chunks are acknowledged once half of the window announced by
+    the sender has been consumed to keep the sender busy without buffering the whole
+    transfer. The socket is closed when iteration completes or the
+    stream is closed; closing early tells the sender to stop.
+    """
+
+    def __init__(self, sock, timeout=STREAM_TIMEOUT):
+        self.socket = sock
+        self.name = sock.name
+        self.timeout = timeout
+        self._items = self._receive()
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        return next(self._items)
+    __next__ = next
+
+    def _receive(self):
+        sock = self.socket
+        unacked = 0
+        try:
+            while True:
+                message = _recv(sock, self.timeout)
+                kind = message[0]
+                if kind == b'end':
+                    break
+                if kind == b'error':
+                    _close(self.socket)
+                    raise StreamError(message[1] if len(message) > 1
+                                      else 'stream aborted by sender')
+                if kind != b'data':
+                    continue
+                unacked += 1
+                if unacked >= max(int(message[1]) // 2, 1):
+                    sock.send_multipart([b'ack', bytes(unacked)])
+                    unacked = 0
+                for item in jsonapi.loads(message[2]):
+                    yield item
+            _close(self.socket)
+        finally:
+            self._abort()
+
+    def _abort(self):
+        if not self.socket.closed:
+            try:
+                self.socket.send_multipart([b'close'], flags=zmq.NOBLOCK)
+            except ZMQError:
+                pass
+            _close(self.socket)
+
+    def close(self):
+        """Stop receiving, telling the sender to stop if it is not done."""
+        self._items.close()
+        self._abort()
 
 
 class Channel(SubsystemBase):
@@ -169,6 +294,26 @@ class Channel(SubsystemBase):
         return sock
     __call__ = create
 
+    def send_stream(self, peer, name, items, chunk_size=STREAM_CHUNK_SIZE,
+                    window=STREAM_WINDOW, timeout=STREAM_TIMEOUT):
+        """Stream items to a peer waiting on the named channel.
+
+        Blocks until the stream is complete, so it is usually spawned.
+        """
+        sock = self.create(peer, name)
+        try:
+            return send_stream(sock, items, chunk_size, window, timeout)
+        finally:
+            _close(sock)
+
+    def receive_stream(self, peer, name=None, timeout=STREAM_TIMEOUT):
+        """Return a Stream of items sent by peer on a new channel.
+
+        The name of the stream must be given to the peer so it can call
+        send_stream() on the same channel.
+        """
+        return Stream(self.create(peer, name), timeout)
+
     def _destroy(self, sockref):
         try:
             ident, peer, name = self._channels.pop(sockref)
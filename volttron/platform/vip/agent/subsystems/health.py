@@ -60,6 +60,8 @@ from volttron.platform.agent import utils
 from volttron.platform.messaging import topics
 from volttron.platform.messaging.health import *
 from .base import SubsystemBase
+from .rpc import RPC
+from .. import blocking
 
 """
 The health subsystem allows an agent to store it's health in a non-intrusive
@@ -71,6 +73,8 @@ __version__ = '1.1'
 
 _log = logging.getLogger(__name__)
 
+HUB_MONITOR_CAPABILITY = 'monitor_hub'
+
 
 class Health(SubsystemBase):
     def __init__(self, owner, core, rpc):
@@ -80,12 +84,27 @@ class Health(SubsystemBase):
         self._statusobj = Status.build(
             STATUS_GOOD, status_changed_callback=self._status_changed)
         self._status_callbacks = set()
+        self._hub_blocks = {'threshold_ms': None, 'count': 0,
+                            'max_duration_ms': 0, 'last': None}
         def onsetup(sender, **kwargs):
             rpc.export(self.set_status, 'health.set_status')
             rpc.export(self.get_status, 'health.get_status')
             rpc.export(self.send_alert, 'health.send_alert')
+            rpc.export(self.get_spawn_stats, 'health.get_spawn_stats')
+            rpc.export(self.monitor_hub_blocks, 'health.monitor_hub_blocks')
+            rpc.export(self.get_hub_blocks, 'health.get_hub_blocks')
+
+        def onstart(sender, **kwargs):
+            threshold = os.environ.get('VOLTTRON_HUB_BLOCK_MS')
+            if threshold:
+                self.monitor_hub_blocks(float(threshold))
+
+        def onstop(sender, **kwargs):
+            self.monitor_hub_blocks(None)
 
         core.onsetup.connect(onsetup, self)
+        core.onstart.connect(onstart, self)
+        core.onstop.connect(onstop, self)
 
     def send_alert(self, alert_key, statusobj):
         """
@@ -182,4 +201,70 @@ class Health(SubsystemBase):
             }
 
         """
-        return self._statusobj.as_json()
\ No newline at end of file
+        return self._statusobj.as_json()
+
+    def get_spawn_stats(self):
+        """RPC method
+
+        Returns the greenlet pool statistics of the agent by kind of work,
+        such as rpc, async and schedule.
+
+            {
+                "rpc": {"size": 100, "queue_size": 10000, "active": 3,
+                        "queued": 0, "max_active": 100, "max_queued": 12,
+                        "rejected": 0}
+            }
+
+        """
+        return self._core().spawn_stats()
+
+    @RPC.allow(HUB_MONITOR_CAPABILITY)
+    def monitor_hub_blocks(self, threshold_ms):
+        """RPC method
+
+        Reports greenlets which block the gevent hub for longer than
+        threshold_ms milliseconds, or stops reporting if it is None.
+        Callers need the monitor_hub capability. Monitoring may also be
+        enabled at start by setting the VOLTTRON_HUB_BLOCK_MS environment
+        variable.
+
+        Each block is counted, logged with the stack of the blocking code
+        and sent as a 'hub_blocked' alert.
+        """
+        monitor = blocking.monitor()
+        if threshold_ms is None:
+            monitor.remove(self._hub_blocked)
+        else:
+            monitor.add(self._hub_blocked, threshold_ms / 1000.0)
+        self._hub_blocks['threshold_ms'] = threshold_ms
+
+    def get_hub_blocks(self):
+        """RPC method
+
+        Returns the number of hub blocks seen and the longest one, with
+        the duration, stack and time of the last one.
+
+            {
+                "threshold_ms": 100,
+                "count": 1,
+                "max_duration_ms": 2503,
+                "last": {"duration_ms": 2503, "stack": "...",
+                         "utc_time": "2016-03-31T15:40:32.685138+0000"}
+            }
+
+        """
+        return self._hub_blocks
+
+    def _hub_blocked(self, duration, stack):
+        # Called from the hub, so anything which may switch is spawned.
+        duration_ms = int(duration * 1000)
+        blocks = self._hub_blocks
+        blocks['count'] += 1
+        blocks['max_duration_ms'] = max(blocks['max_duration_ms'], duration_ms)
+        blocks['last'] = last = {
+            'duration_ms': duration_ms, 'stack': stack,
+            'utc_time': utils.format_timestamp(utils.get_aware_utc_now())}
+        _log.warning('gevent hub blocked for %d ms at:\n%s',
+                     duration_ms, stack)
+        self._core().spawn(self.send_alert, 'hub_blocked',
+                           Status.build(STATUS_BAD, context=last))
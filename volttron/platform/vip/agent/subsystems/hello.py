@@ -63,6 +63,7 @@ import weakref
 from .base import SubsystemBase
 from ..errors import VIPError
 from ..results import ResultsDictionary
+from ... import codec
 
 
 __all__ = ['Hello']
@@ -78,12 +79,18 @@ class Hello(SubsystemBase):
     executing agent does not know.  This subsystem allows the agent to be
     able to determine it's identity from a peer.  By default that peer is
     the connected router, however this could be another agent.
+
+    Hello messages also carry the payload codecs each side can decode,
+    which are remembered per peer and used to pick the RPC codec.
     """
 
-    def __init__(self, core):
+    def __init__(self, core, peerlist_subsys=None):
         self.core = weakref.ref(core)
         self._results = ResultsDictionary()
+        self._peer_codecs = {}
         core.register('hello', self._handle_hello, self._handle_error)
+        if peerlist_subsys is not None:
+            peerlist_subsys.ondrop.connect(self._peer_drop)
 
     def hello(self, peer=b''):
         """ Receives a welcome message from the peer (default to '' router)
@@ -103,11 +110,30 @@ class Hello(SubsystemBase):
         _log.info('Requesting hello from peer ({})'.format(peer))
         socket = self.core().socket
         result = next(self._results)
-        socket.send_vip(peer, b'hello', [b'hello'], msg_id=result.ident)
+        args = [b'hello']
+        args.extend(codec.available())
+        socket.send_vip(peer, b'hello', args, msg_id=result.ident)
         return result
 
     __call__ = hello
 
+    def codec(self, peer):
+        """ Return the codec to use when sending payloads to peer.
+
+        The first request for a peer starts a hello exchange in the
+        background and JSON is used until the peer's codecs are known.
+        """
+        try:
+            names = self._peer_codecs[peer]
+        except KeyError:
+            self._peer_codecs[peer] = ()
+            self.hello(peer)
+            return codec.JSON
+        return codec.negotiate(names)
+
+    def _peer_drop(self, sender, peer, **kwargs):
+        self._peer_codecs.pop(peer, None)
+
     def _handle_hello(self, message):
         _log.info('Handling hello message {}'.format(message))
         try:
@@ -117,19 +143,28 @@ class Hello(SubsystemBase):
             return
         if op == b'hello':
             socket = self.core().socket
+            peer = bytes(message.peer)
+            self._peer_codecs[peer] = [bytes(arg) for arg in message.args[1:]]
             message.user = b''
             message.args = [b'welcome', b'1.0', socket.identity, message.peer]
+            message.args.extend(codec.available())
             socket.send_vip_object(message, copy=False)
         elif op == b'welcome':
+            peer = bytes(message.peer)
+            self._peer_codecs[peer] = [bytes(arg) for arg in message.args[4:]]
             try:
                 result = self._results.pop(bytes(message.id))
             except KeyError:
                 return
-            result.set([bytes(arg) for arg in message.args[1:]])
+            result.set([bytes(arg) for arg in message.args[1:4]])
         else:
             _log.error('unknown hello subsystem operation')
 
     def _handle_error(self, sender, message, error, **kwargs):
+        # Allow negotiation to be retried once the peer is reachable.
+        peer = bytes(getattr(error, 'peer', None) or b'')
+        if self._peer_codecs.get(peer) == ():
+            del self._peer_codecs[peer]
         try:
             result = self._results.pop(bytes(message.id))
         except KeyError:
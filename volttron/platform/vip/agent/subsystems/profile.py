@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#}}}
+
+"""The profile subsystem samples the stacks of a running agent on demand.
+A native thread records the stack of whichever greenlet is running every
+interval, so profiling needs no restart and costs little while it runs.
+Samples taken while the hub waits for events end in gevent.hub.run.
+Callers need the profile_agent capability.
+"""
+
+from __future__ import absolute_import
+
+from collections import Counter
+import gc
+import os
+import resource
+import sys
+import time
+
+from gevent import monkey
+
+from .base import SubsystemBase
+from .rpc import RPC
+
+__docformat__ = 'reStructuredText'
+__version__ = '1.0'
+
+_start_new_thread, _get_ident = monkey.get_original(
+    'thread', ['start_new_thread', 'get_ident'])
+_sleep = monkey.get_original('time', 'sleep')
+
+PROFILE_CAPABILITY = 'profile_agent'
+
+# Each sample walks the stacks of every thread holding the GIL, so
+# shorter intervals would stall the agent.
+MIN_INTERVAL = 0.001
+MAX_INTERVAL = 60
+
+
+def _rss_kb():
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+    except (IOError, IndexError, ValueError):
+        return None
+    return pages * resource.getpagesize() // 1024
+
+
+def snapshot(limit=20):
+    '''Return memory use and the most common types of live objects.'''
+    objects = Counter(type(obj).__name__ for obj in gc.get_objects())
+    return {'rss_kb': _rss_kb(),
+            'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            'total_objects': sum(objects.itervalues()),
+            'objects': dict(objects.most_common(limit))}
+
+
+class Profile(SubsystemBase):
+    def __init__(self, core, rpc):
+        self.interval = None
+        self.stacks = {}
+        self.samples = 0
+        self.started = None
+        self.start_snapshot = None
+        self._ident = None
+        self._generation = 0
+
+        def onsetup(sender, **kwargs):
+            rpc.export(self.start, 'profile.start')
+            rpc.export(self.stop, 'profile.stop')
+
+        def onstop(sender, **kwargs):
+            self._generation += 1
+            self.interval = None
+
+        core.onsetup.connect(onsetup, self)
+        core.onstop.connect(onstop, self)
+
+    @RPC.allow(PROFILE_CAPABILITY)
+    def start(self, interval=0.005):
+        """RPC method
+
+        Start sampling the agent's stacks every interval seconds,
+        discarding the samples of any profile already running. Raises
+        ValueError unless interval is between MIN_INTERVAL and
+        MAX_INTERVAL.
+        """
+        if not MIN_INTERVAL <= interval <= MAX_INTERVAL:
+            raise ValueError('interval must be between {} and {} '
+                             'seconds'.format(MIN_INTERVAL, MAX_INTERVAL))
+        self._generation += 1
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.started = time.time()
+        self.start_snapshot = snapshot()
+        self._ident = _get_ident()
+        _start_new_thread(self._sample, (self._generation,))
+
+    @RPC.allow(PROFILE_CAPABILITY)
+    def stop(self):
+        """RPC method
+
+        Stop sampling and return the profile. Stacks are collapsed into
+        semicolon separated frames, outermost first, as used by flame
+        graph tools, and mapped to the number of samples:
+
+            {
+                "interval": 0.005,
+                "duration": 10.01,
+                "samples": 1998,
+                "stacks": {"gevent.greenlet.run;mymodule.handler": 12},
+                "snapshots": {"start": {...}, "stop": {...}}
+            }
+
+        Each snapshot holds rss_kb, max_rss_kb, total_objects and the
+        counts of the most common object types.
+        """
+        if self.interval is None:
+            raise RuntimeError('profiler is not running')
+        self._generation += 1
+        result = {'interval': self.interval,
+                  'duration': time.time() - self.started,
+                  'samples': self.samples,
+                  'stacks': dict(self.stacks),
+                  'snapshots': {'start': self.start_snapshot,
+                                'stop': snapshot()}}
+        self.interval = None
+        self.stacks = {}
+        self.start_snapshot = None
+        return result
+
+    def _sample(self, generation):
+        # Runs in a native thread until the generation changes.
+        ident = self._ident
+        stacks = self.stacks
+        interval = self.interval
+        while True:
+            _sleep(interval)
+            if generation != self._generation:
+                break
+            frame = sys._current_frames().get(ident)
+            names = []
+            while frame is not None:
+                names.append('%s.%s' % (frame.f_globals.get('__name__', '?'),
+                                        frame.f_code.co_name))
+                frame = frame.f_back
+            key = ';'.join(reversed(names))
+            stacks[key] = stacks.get(key, 0) + 1
+            self.samples += 1
@@ -58,19 +58,23 @@
 from __future__ import absolute_import
 
 from base64 import b64encode, b64decode
+from collections import deque, OrderedDict
 import inspect
+from itertools import groupby
 import logging
+from operator import itemgetter
 import random
 import re
+import time
 import weakref
 
+from gevent.event import Event
 from zmq import green as zmq
-from zmq import SNDMORE
-from zmq.utils import jsonapi
 
 from .base import SubsystemBase
 from ..decorators import annotate, annotations, dualmethod, spawn
 from ..errors import Unreachable
+from ...socket import BULK_PREFIX, is_bulk
 from .... import jsonrpc
 from volttron.platform.agent import utils
 
@@ -78,6 +82,11 @@ __all__ = ['PubSub']
 min_compatible_version = '3.0'
 max_compatible_version = ''
 
+OVERFLOW_POLICIES = ('block', 'drop-oldest', 'drop-newest')
+
+# Marks the message ids of queued pushes, followed by their number.
+_PUSH_ID = b'push.'
+
 #utils.setup_logging()
 _log = logging.getLogger(__name__)
 
@@ -99,8 +108,24 @@ class PubSub(SubsystemBase):
         self.peerlist = weakref.ref(peerlist_subsys)
         self._owner = owner
         self._peer_subscriptions = {}
+        # Options of subscriptions keyed by (bus, prefix, peer).
+        self._subscription_options = {}
         self._my_subscriptions = {}
+        self._my_subscription_options = {}
         self.protected_topics = ProtectedPubSubTopics()
+        self.last_values = None
+        # Bus owner side: pushes are queued for subscribers that have
+        # requested flow control, if queue_size is non-zero.
+        self.queue_size = 0
+        self.overflow_policy = 'block'
+        # Seconds a stalled subscriber's credit is held for an ack
+        # before the pushes it covers are presumed lost.
+        self.credit_timeout = 60
+        self._queues = {}
+        # Subscriber side: number of unacknowledged pushes allowed.
+        self.flow_window = 1000
+        self._flow_peers = set()
+        self._unacked = {}
 
         def setup(sender, **kwargs):
             # pylint: disable=unused-argument
@@ -109,7 +134,12 @@ class PubSub(SubsystemBase):
             rpc_subsys.export(self._peer_unsubscribe, 'pubsub.unsubscribe')
             rpc_subsys.export(self._peer_list, 'pubsub.list')
             rpc_subsys.export(self._peer_publish, 'pubsub.publish')
+            rpc_subsys.export(self._peer_publish_many, 'pubsub.publish_many')
             rpc_subsys.export(self._peer_push, 'pubsub.push')
+            rpc_subsys.export(self._peer_last_value, 'pubsub.last_value')
+            rpc_subsys.export(self._peer_flow, 'pubsub.flow')
+            rpc_subsys.export(self._peer_ack, 'pubsub.ack')
+            rpc_subsys.export(self._peer_queue_stats, 'pubsub.queue_stats')
             core.onconnected.connect(self._connected)
             core.onviperror.connect(self._viperror)
             peerlist_subsys.onadd.connect(self._peer_add)
@@ -124,7 +154,7 @@ class PubSub(SubsystemBase):
         core.onsetup.connect(setup, self)
 
     def add_bus(self, name):
-        self._peer_subscriptions.setdefault(name, {})
+        self._peer_subscriptions.setdefault(name, SubscriptionTrie())
 
     def remove_bus(self, name):
         del self._peer_subscriptions[name]
@@ -134,9 +164,18 @@ class PubSub(SubsystemBase):
     def _connected(self, sender, **kwargs):
         self.synchronize(None)
 
-    def _viperror(self, sender, error, **kwargs):
+    def _viperror(self, sender, error, message=None, **kwargs):
         if isinstance(error, Unreachable):
             self._peer_drop(self, error.peer)
+        elif message is not None and error.subsystem == b'RPC':
+            # The router dropped pushes, perhaps at the high water mark,
+            # so the subscriber will never ack them.
+            queue = self._queues.get(error.peer)
+            count = _push_count(message.id)
+            if queue is not None and count:
+                _log.warning('%d pushes to %s were dropped: %s',
+                             count, error.peer, error)
+                queue.undeliver(count)
 
     def _peer_add(self, sender, peer, **kwargs):
         # Delay sync by some random amount to prevent reply storm.
@@ -145,6 +184,11 @@ class PubSub(SubsystemBase):
 
     def _peer_drop(self, sender, peer, **kwargs):
         self._sync(peer, {})
+        queue = self._queues.pop(peer, None)
+        if queue is not None:
+            queue.close()
+        self._flow_peers.discard(peer)
+        self._unacked.pop(peer, None)
 
     def _sync(self, peer, items):
         items = {(bus, prefix) for bus, topics in items.iteritems()
@@ -157,6 +201,7 @@ class PubSub(SubsystemBase):
                     items.remove(item)
                 except KeyError:
                     subscribers.discard(peer)
+                    self._subscription_options.pop((bus, prefix, peer), None)
                     if not subscribers:
                         remove.append(item)
                 else:
@@ -180,18 +225,25 @@ class PubSub(SubsystemBase):
             subscriptions[prefix] = subscribers = set()
         subscribers.add(peer)
 
-    def _peer_subscribe(self, prefix, bus=''):
+    def _peer_subscribe(self, prefix, bus='', conflate=False, points=None):
         peer = bytes(self.rpc().context.vip_message.peer)
+        options = _make_options(conflate, points)
         for prefix in prefix if isinstance(prefix, list) else [prefix]:
             self._add_peer_subscription(peer, bus, prefix)
+            if options:
+                self._subscription_options[(bus, prefix, peer)] = options
+            else:
+                self._subscription_options.pop((bus, prefix, peer), None)
 
     def _peer_unsubscribe(self, prefix, bus=''):
         peer = bytes(self.rpc().context.vip_message.peer)
         subscriptions = self._peer_subscriptions[bus]
+        options = self._subscription_options
         if prefix is None:
             remove = []
             for topic, subscribers in subscriptions.iteritems():
                 subscribers.discard(peer)
+                options.pop((bus, topic, peer), None)
                 if not subscribers:
                     remove.append(topic)
             for topic in remove:
@@ -200,6 +252,7 @@ class PubSub(SubsystemBase):
             for prefix in prefix if isinstance(prefix, list) else [prefix]:
                 subscribers = subscriptions[prefix]
                 subscribers.discard(peer)
+                options.pop((bus, prefix, peer), None)
                 if not subscribers:
                     del subscriptions[prefix]
 
@@ -223,51 +276,215 @@ class PubSub(SubsystemBase):
         return results
 
     def _peer_publish(self, topic, headers, message=None, bus=''):
+        vip_message = self.rpc().context.vip_message
+        self._distribute(bytes(vip_message.peer), topic, headers, message,
+                         bus, is_bulk(vip_message.id))
+
+    def _peer_publish_many(self, messages, bus=''):
+        vip_message = self.rpc().context.vip_message
+        return self._distribute_many(bytes(vip_message.peer), messages, bus,
+                                     is_bulk(vip_message.id))
+
+    def _peer_last_value(self, prefix, bus=''):
+        if self.last_values is None:
+            return []
+        return self.last_values.get(prefix, bus)
+
+    def _peer_flow(self, window):
+        '''Enable credit-based flow control for the calling subscriber.
+
+        At most window pushes are sent to the subscriber before it
+        acknowledges them with pubsub.ack. Further pushes wait in a
+        bounded queue handled according to overflow_policy.
+        '''
+        if not self.queue_size:
+            return
         peer = bytes(self.rpc().context.vip_message.peer)
-        self._distribute(peer, topic, headers, message, bus)
+        try:
+            queue = self._queues[peer]
+        except KeyError:
+            self._queues[peer] = queue = SubscriberQueue(
+                self.queue_size, self.overflow_policy, window,
+                self.credit_timeout)
+            self.core().spawn(self._drain, peer, queue)
+        else:
+            queue.set_window(window)
+
+    def _peer_ack(self, count):
+        peer = bytes(self.rpc().context.vip_message.peer)
+        try:
+            queue = self._queues[peer]
+        except KeyError:
+            return
+        queue.ack(count)
+
+    def _peer_queue_stats(self):
+        return {peer: queue.stats()
+                for peer, queue in self._queues.iteritems()}
+
+    def _drain(self, subscriber, queue):
+        while not queue.closed:
+            for (peer_codec, msg_id), items in groupby(
+                    queue.get(), itemgetter(0)):
+                datas = [data for _, data in items]
+                # The count in the message id lets credit be returned
+                # should the router report the message dropped.
+                msg_id = b'%s%s%d' % (msg_id, _PUSH_ID, len(datas))
+                try:
+                    self._send_pushes(subscriber, peer_codec, datas, msg_id)
+                except zmq.ZMQError as exc:
+                    _log.warning('failed to send %d pushes to %s: %s',
+                                 len(datas), subscriber, exc)
+                    queue.undeliver(len(datas))
+
+    def _send_pushes(self, subscriber, peer_codec, datas, msg_id=b''):
+        if len(datas) == 1:
+            data = datas[0]
+        else:
+            data = peer_codec.join(datas)
+        # Send the whole message in one call, which holds the socket's
+        # send lock throughout, so drain greenlets cannot interleave.
+        self.core().socket.send_vip(subscriber, b'RPC', [zmq.Frame(data)],
+                                    msg_id=msg_id, copy=False)
+
+    def _match(self, subscriptions, bus, topic):
+        '''Return subscribers of topic mapped to their merged options.
+
+        Options are None for subscribers with a matching subscription
+        made without options, which then take precedence.
+        '''
+        all_options = self._subscription_options
+        if not all_options:
+            return dict.fromkeys(subscriptions.match(topic))
+        matches = {}
+        for prefix, subscribers in subscriptions.iter_matches(topic):
+            for subscriber in subscribers:
+                options = all_options.get((bus, prefix, subscriber))
+                try:
+                    merged = matches[subscriber]
+                except KeyError:
+                    matches[subscriber] = options
+                else:
+                    if merged is not None:
+                        matches[subscriber] = _merge_options(merged, options)
+        return matches
+
+    def _distribute(self, peer, topic, headers, message=None, bus='',
+                    bulk=False):
+        return self._distribute_many(peer, [(topic, headers, message)], bus,
+                                     bulk)
+
+    def _distribute_many(self, peer, messages, bus='', bulk=False):
+        '''Push a batch of (topic, headers, message) items to subscribers.
 
-    def _distribute(self, peer, topic, headers, message=None, bus=''):
-        self._check_if_protected_topic(topic)
+        Each subscriber receives a single frame containing a JSON-RPC
+        batch of the pubsub.push notifications it is subscribed to,
+        encoded with the codec negotiated with that subscriber.
+        Pushes travel in the bulk lane if bulk is True.
+        Returns the total number of pushes delivered.
+        '''
+        for topic, _, _ in messages:
+            self._check_if_protected_topic(topic)
         try:
             subscriptions = self._peer_subscriptions[bus]
         except KeyError:
-            subscriptions = dict()
-        subscribers = set()
-        for prefix, subscription in subscriptions.iteritems():
-            if subscription and topic.startswith(prefix):
-                subscribers |= subscription
-        if subscribers:
-            sender = encode_peer(peer)
-            json_msg = jsonapi.dumps(jsonrpc.json_method(
+            return 0
+        sender = encode_peer(peer)
+        rpc = self.rpc()
+        last_values = self.last_values
+        pushes = {}
+        count = 0
+        for topic, headers, message in messages:
+            if last_values is not None:
+                last_values.update(bus, topic, sender, headers, message)
+            matches = self._match(subscriptions, bus, topic)
+            if not matches:
+                continue
+            push = jsonrpc.json_method(
                 None, 'pubsub.push',
-                [sender, bus, topic, headers, message], None))
-            frames = [zmq.Frame(b''), zmq.Frame(b''),
-                      zmq.Frame(b'RPC'), zmq.Frame(json_msg)]
-            socket = self.core().socket
-            for subscriber in subscribers:
-                socket.send(subscriber, flags=SNDMORE)
-                socket.send_multipart(frames, copy=False)
-        return len(subscribers)
+                [sender, bus, topic, headers, message], None)
+            # Encode once per codec and projection rather than once
+            # per subscriber.
+            encoded = {}
+            for subscriber, options in matches.iteritems():
+                peer_codec = rpc.peer_codec(subscriber)
+                points = options and options['points']
+                try:
+                    data = encoded[(peer_codec, points)]
+                except KeyError:
+                    if points is None:
+                        data = peer_codec.dumps(push)
+                    else:
+                        data = peer_codec.dumps(jsonrpc.json_method(
+                            None, 'pubsub.push',
+                            [sender, bus, topic, headers,
+                             _project_points(topic, message, points)],
+                            None))
+                    encoded[(peer_codec, points)] = data
+                if options and options['conflate']:
+                    key = bus, topic
+                else:
+                    key = None
+                try:
+                    pushes[subscriber][1].append((key, data))
+                except KeyError:
+                    pushes[subscriber] = peer_codec, [(key, data)]
+            count += len(matches)
+        queues = self._queues
+        msg_id = BULK_PREFIX if bulk else b''
+        for subscriber, (peer_codec, items) in pushes.iteritems():
+            try:
+                queue = queues[subscriber]
+            except KeyError:
+                self._send_pushes(subscriber, peer_codec,
+                                  [data for _, data in items], msg_id)
+            else:
+                for key, data in items:
+                    queue.put(((peer_codec, msg_id), data), key)
+        return count
 
     def _peer_push(self, sender, bus, topic, headers, message):
-        '''Handle incoming subscription pushes from peers.'''
+        '''Handle incoming subscription pushes from peers.
+
+        Batched pushes arrive as a JSON-RPC batch and are unpacked by
+        the RPC dispatcher into one call per message.
+        '''
         peer = bytes(self.rpc().context.vip_message.peer)
         handled = 0
         try:
-            subscriptions = self._my_subscriptions[peer][bus]
-        except KeyError:
-            pass
-        else:
-            sender = decode_peer(sender)
-            for prefix, callbacks in subscriptions.iteritems():
-                if topic.startswith(prefix):
-                    handled += 1
-                    for callback in callbacks:
-                        callback(peer, sender, bus, topic, headers, message)
+            try:
+                subscriptions = self._my_subscriptions[peer][bus]
+            except KeyError:
+                pass
+            else:
+                sender = decode_peer(sender)
+                for prefix, callbacks in subscriptions.iteritems():
+                    if topic_matches(prefix, topic):
+                        handled += 1
+                        for callback in callbacks:
+                            callback(peer, sender, bus, topic, headers,
+                                     message)
+        finally:
+            if peer in self._flow_peers:
+                self._ack(peer)
         if not handled:
             # No callbacks for topic; synchronize with sender
             self.synchronize(peer)
 
+    def _ack(self, peer):
+        '''Return credit to peer once half the flow window is used.'''
+        count = self._unacked.get(peer, 0) + 1
+        if count >= max(self.flow_window // 2, 1):
+            self._unacked[peer] = 0
+            self.rpc().notify(peer, 'pubsub.ack', count)
+        else:
+            self._unacked[peer] = count
+
+    def _request_flow(self, peer):
+        if self.flow_window:
+            self._flow_peers.add(peer)
+            self.rpc().notify(peer, 'pubsub.flow', self.flow_window)
+
     def synchronize(self, peer):
         '''Unsubscribe from stale/forgotten/unsolicited subscriptions.'''
         if peer is None:
@@ -279,7 +496,16 @@ class PubSub(SubsystemBase):
             items = [(peer, {bus: subscriptions.keys()
                              for bus, subscriptions in buses.iteritems()})]
         for (peer, subscriptions) in items:
+            if any(subscriptions.itervalues()):
+                # Only peers holding subscriptions push to this agent.
+                self._request_flow(peer)
             self.rpc().notify(peer, 'pubsub.sync', subscriptions)
+            # Restore options, which are not part of the sync.
+            for (options_peer, bus, prefix), options in \
+                    self._my_subscription_options.iteritems():
+                if options_peer == peer:
+                    self.rpc().notify(peer, 'pubsub.subscribe', prefix,
+                                      bus=bus, **_options_kwargs(options))
 
     def list(self, peer, prefix='', bus='', subscribed=True, reverse=False):
         return self.rpc().call(peer, 'pubsub.list', prefix,
@@ -288,6 +514,10 @@ class PubSub(SubsystemBase):
     def add_subscription(self, peer, prefix, callback, bus=''):
         if not callable(callback):
             raise ValueError('callback %r is not callable' % (callback,))
+        topics = prefix if isinstance(prefix, list) else [prefix]
+        for topic in topics:
+            if is_pattern(topic):
+                compile_pattern(topic)
         try:
             buses = self._my_subscriptions[peer]
         except KeyError:
@@ -296,15 +526,17 @@ class PubSub(SubsystemBase):
             subscriptions = buses[bus]
         except KeyError:
             buses[bus] = subscriptions = {}
-        try:
-            callbacks = subscriptions[prefix]
-        except KeyError:
-            subscriptions[prefix] = callbacks = set()
-        callbacks.add(callback)
+        for topic in topics:
+            try:
+                callbacks = subscriptions[topic]
+            except KeyError:
+                subscriptions[topic] = callbacks = set()
+            callbacks.add(callback)
 
     @dualmethod
     @spawn
-    def subscribe(self, peer, prefix, callback, bus=''):
+    def subscribe(self, peer, prefix, callback, bus='', snapshot=False,
+                  conflate=False, points=None):
         '''Subscribe to topic and register callback.
 
         Subscribes to topics beginning with prefix. If callback is
@@ -314,9 +546,63 @@ class PubSub(SubsystemBase):
         publishing peer, topic is the full message topic, headers is a
         case-insensitive dictionary (mapping) of message headers, and
         message is a possibly empty list of message parts.
+
+        prefix may instead be a wildcard pattern matched against whole
+        topics by peer, such as devices/campus/+/ahu*/all or
+        devices/campus/#. See is_pattern() for the syntax.
+
+        If snapshot is True, callback is also called with the last
+        value cached by peer for each matching topic once the
+        subscription is in place. A message published while the
+        snapshot is being fetched may be delivered before its cached
+        predecessor.
+
+        If conflate is True and this agent falls behind, peer keeps
+        only the newest pending message for each matching topic rather
+        than every message. Matching subscriptions made without
+        conflate still receive every message.
+
+        If points is a list of point names, peer strips all other
+        points from the values and metadata of device all messages
+        before pushing them. Another subscription to the same prefix
+        widens the projection to the points of both, or to all points
+        if it was made without points.
         '''
+        topics = prefix if isinstance(prefix, list) else [prefix]
+        options = _make_options(conflate, points)
+        # Existing subscriptions to the same prefix must keep
+        # receiving everything they asked for.
+        subscribed = self._my_subscriptions.get(peer, {}).get(bus, {})
+        for topic in topics:
+            if topic in subscribed:
+                existing = self._my_subscription_options.get(
+                    (peer, bus, topic))
+                options = _merge_options(options, existing)
         self.add_subscription(peer, prefix, callback, bus)
-        return self.rpc().call(peer, 'pubsub.subscribe', prefix, bus=bus)
+        if peer not in self._flow_peers:
+            self._request_flow(peer)
+        for topic in topics:
+            if options:
+                self._my_subscription_options[(peer, bus, topic)] = options
+            else:
+                self._my_subscription_options.pop((peer, bus, topic), None)
+        result = self.rpc().call(peer, 'pubsub.subscribe', prefix, bus=bus,
+                                 **_options_kwargs(options))
+        if snapshot:
+            result.get()
+            # Overlapping prefixes may cache the same topic.
+            seen = set()
+            for prefix in topics:
+                for sender, topic, headers, message in self.last_value(
+                        peer, prefix, bus).get():
+                    if topic in seen:
+                        continue
+                    seen.add(topic)
+                    if points is not None:
+                        message = _project_points(topic, message, points)
+                    callback(peer, decode_peer(sender), bus, topic,
+                             headers, message)
+        return result
 
     @subscribe.classmethod
     def subscribe(cls, peer, prefix, bus=''):
@@ -374,15 +660,20 @@ class PubSub(SubsystemBase):
         topic prefix are removed, the topic is also unsubscribed.
         '''
         topics = self.drop_subscription(peer, prefix, callback, bus)
+        for topic in topics:
+            self._my_subscription_options.pop((peer, bus, topic), None)
         return self.rpc().call(peer, 'pubsub.unsubscribe', topics, bus=bus)
 
-    def publish(self, peer, topic, headers=None, message=None, bus=''):
+    def publish(self, peer, topic, headers=None, message=None, bus='',
+                bulk=False):
         '''Publish a message to a given topic via a peer.
 
         Publish headers and message to all subscribers of topic on bus
         at peer. If peer is None, use self. Adds volttron platform version
         compatibility information to header as variables
-        min_compatible_version and max_compatible version
+        min_compatible_version and max_compatible version. If bulk is
+        True, the message and its pushes travel in the bulk lane, behind
+        RPC and other control traffic.
         '''
         #_log.debug("In pusub.publsih. headers in pubsub publish {}".format(
         #    headers))
@@ -395,9 +686,40 @@ class PubSub(SubsystemBase):
 
         if peer is None:
             peer = 'pubsub'
-        return self.rpc().call(
-            peer, 'pubsub.publish', topic=topic, headers=headers,
-            message=message, bus=bus)
+        rpc = self.rpc()
+        call = rpc.bulk_call if bulk else rpc.call
+        return call(peer, 'pubsub.publish', topic=topic, headers=headers,
+                    message=message, bus=bus)
+
+    def last_value(self, peer, prefix, bus=''):
+        '''Return the last message cached by peer for each topic.
+
+        The result is set to a list of (sender, topic, headers, message)
+        for cached topics beginning with prefix. It is empty if peer
+        does not keep a last-value cache or caches none of the topics.
+        '''
+        return self.rpc().call(peer, 'pubsub.last_value', prefix, bus=bus)
+
+    def publish_many(self, peer, messages, bus='', bulk=False):
+        '''Publish a batch of messages to a given topic via a peer.
+
+        messages is an iterable of (topic, headers, message) tuples
+        which are sent to peer in a single request. If peer is None,
+        use self. The result is set, once all messages have been
+        distributed, to the total number of subscriber deliveries.
+        bulk is as for publish().
+        '''
+        batch = []
+        for topic, headers, message in messages:
+            headers = dict(headers) if headers else {}
+            headers['min_compatible_version'] = min_compatible_version
+            headers['max_compatible_version'] = max_compatible_version
+            batch.append((topic, headers, message))
+        if peer is None:
+            peer = 'pubsub'
+        rpc = self.rpc()
+        call = rpc.bulk_call if bulk else rpc.call
+        return call(peer, 'pubsub.publish_many', messages=batch, bus=bus)
 
     def _check_if_protected_topic(self, topic):
         required_caps = self.protected_topics.get(topic)
@@ -432,3 +754,468 @@ class ProtectedPubSubTopics(object):
             if regex.match(topic):
                 return capabilities
         return None
+
+
+def _make_options(conflate=False, points=None):
+    '''Return subscription options, or None if all are defaults.'''
+    if not conflate and points is None:
+        return None
+    return {'conflate': bool(conflate),
+            'points': None if points is None else frozenset(points)}
+
+
+def _options_kwargs(options):
+    '''Return the pubsub.subscribe keyword arguments for options.'''
+    kwargs = {}
+    if options is None:
+        return kwargs
+    if options['conflate']:
+        kwargs['conflate'] = True
+    if options['points'] is not None:
+        kwargs['points'] = sorted(options['points'])
+    return kwargs
+
+
+def _merge_options(options, other):
+    '''Merge the options of two subscriptions matching the same topic.
+
+    The result satisfies both subscriptions: messages are conflated
+    only if both allow it and carry the points either one projects.
+    '''
+    if options is None or other is None:
+        return None
+    points = options['points']
+    if points is not None and other['points'] is not None:
+        points = points | other['points']
+    else:
+        points = None
+    return _make_options(options['conflate'] and other['conflate'], points)
+
+
+def _project_points(topic, message, points):
+    '''Strip all but points from a device all message.
+
+    Device all messages are a list of a values dictionary followed by
+    a metadata dictionary, both keyed by point name. Other messages
+    are returned unchanged.
+    '''
+    if not topic.endswith('/all') or not isinstance(message, list):
+        return message
+    return [{name: value for name, value in part.iteritems()
+             if name in points} if isinstance(part, dict) else part
+            for part in message]
+
+
+def _push_count(msg_id):
+    '''Return the number of pushes sent in the message with msg_id.'''
+    _, sep, count = bytes(msg_id).rpartition(_PUSH_ID)
+    try:
+        return int(count) if sep else 0
+    except ValueError:
+        return 0
+
+
+class SubscriberQueue(object):
+    '''Bounded queue of pushes waiting for credit from a subscriber.
+
+    No more than window pushes are handed out by get() until the
+    subscriber returns credit with ack(), or undeliver() returns the
+    credit of pushes that were lost on the way. When the queue is full,
+    put() blocks the caller, drops the oldest queued push or drops the
+    new push, depending on overflow. Pushes put with a key replace a
+    pending push with the same key, keeping its place in the queue.
+
+    If credit_timeout is given and the subscriber has not acked for
+    that many seconds while all credit is used, the outstanding credit
+    expires so pushes are never held up for good.
+    '''
+
+    def __init__(self, maxlen, overflow, window, credit_timeout=None):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError('invalid overflow policy: {!r}'.format(overflow))
+        self.maxlen = maxlen
+        self.overflow = overflow
+        self.window = window
+        self.credit_timeout = credit_timeout
+        self.outstanding = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.undelivered = 0
+        self.expired = 0
+        self.closed = False
+        self._acked = time.time()
+        self._items = deque()
+        self._pending = {}
+        self._ready = Event()
+        self._space = Event()
+        self._space.set()
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item, key=None):
+        if key is not None:
+            entry = self._pending.get(key)
+            if entry is not None:
+                entry[1] = item
+                self.conflated += 1
+                return
+        items = self._items
+        if len(items) >= self.maxlen:
+            if self.overflow == 'drop-newest':
+                self.dropped += 1
+                return
+            elif self.overflow == 'drop-oldest':
+                self._forget(items.popleft())
+                self.dropped += 1
+            else:
+                while len(items) >= self.maxlen and not self.closed:
+                    self._space.clear()
+                    self._space.wait()
+                if self.closed:
+                    return
+        entry = [key, item]
+        items.append(entry)
+        if key is not None:
+            self._pending[key] = entry
+        self._wake()
+
+    def get(self):
+        '''Wait for credit and return the items that may be sent.'''
+        while not self._ready.wait(self.credit_timeout):
+            self._expire()
+        self._ready.clear()
+        items = self._items
+        count = max(min(self.window - self.outstanding, len(items)), 0)
+        batch = []
+        for _ in xrange(count):
+            entry = items.popleft()
+            self._forget(entry)
+            batch.append(entry[1])
+        if count and not self.outstanding:
+            self._acked = time.time()
+        self.outstanding += count
+        self._space.set()
+        return batch
+
+    def _forget(self, entry):
+        if entry[0] is not None:
+            del self._pending[entry[0]]
+
+    def ack(self, count):
+        self.outstanding = max(self.outstanding - count, 0)
+        self._acked = time.time()
+        self._wake()
+
+    def undeliver(self, count):
+        '''Return the credit of count pushes that were never delivered.'''
+        self.outstanding = max(self.outstanding - count, 0)
+        self.undelivered += count
+        self._wake()
+
+    def _expire(self):
+        if (self._items and self.outstanding >= self.window and
+                time.time() - self._acked >= self.credit_timeout):
+            _log.warning('no ack for %d pushes in %s seconds; presuming '
+                         'them lost', self.outstanding, self.credit_timeout)
+            self.expired += self.outstanding
+            self.outstanding = 0
+            self._wake()
+
+    def set_window(self, window):
+        self.window = window
+        self._wake()
+
+    def close(self):
+        self.closed = True
+        self._items.clear()
+        self._pending.clear()
+        self._ready.set()
+        self._space.set()
+
+    def stats(self):
+        return {'depth': len(self._items), 'dropped': self.dropped,
+                'conflated': self.conflated,
+                'undelivered': self.undelivered, 'expired': self.expired,
+                'outstanding': self.outstanding, 'window': self.window}
+
+    def _wake(self):
+        if self._items and self.outstanding < self.window:
+            self._ready.set()
+
+
+class LastValueCache(object):
+    '''Bounded cache of the last message published to each topic.
+
+    Only topics beginning with one of prefixes, or all topics if no
+    prefixes are given, are cached. When more than maxsize topics are
+    cached, the least recently published topic is evicted.
+    '''
+
+    def __init__(self, maxsize, prefixes=None):
+        self.maxsize = maxsize
+        self.prefixes = tuple(prefixes or ())
+        self._values = OrderedDict()
+
+    def __len__(self):
+        return len(self._values)
+
+    def update(self, bus, topic, sender, headers, message):
+        if self.prefixes and not topic.startswith(self.prefixes):
+            return
+        key = bus, topic
+        self._values.pop(key, None)
+        self._values[key] = sender, headers, message
+        if len(self._values) > self.maxsize:
+            self._values.popitem(last=False)
+
+    def get(self, prefix, bus=''):
+        return [(sender, topic, headers, message)
+                for (topic_bus, topic), (sender, headers, message)
+                in self._values.iteritems()
+                if topic_bus == bus and topic_matches(prefix, topic)]
+
+
+_wildcard_chars = re.compile(r'[+#*?[]')
+
+
+def _is_wildcard(segment):
+    return segment in ('+', '#') or any(c in segment for c in '*?[')
+
+
+def is_pattern(prefix):
+    '''Return True if prefix is a wildcard pattern rather than a prefix.
+
+    Patterns match whole topics segment by segment: + matches any one
+    segment, a trailing # matches any remaining segments (or none) and
+    segments containing *, ? or [...] match like fnmatch globs that
+    never cross a '/'.
+    '''
+    if not _wildcard_chars.search(prefix):
+        return False
+    return any(_is_wildcard(segment) for segment in prefix.split('/'))
+
+
+def _translate_glob(segment):
+    i, n = 0, len(segment)
+    result = []
+    while i < n:
+        c = segment[i]
+        i += 1
+        if c == '*':
+            result.append('[^/]*')
+        elif c == '?':
+            result.append('[^/]')
+        elif c == '[':
+            j = i
+            if j < n and segment[j] == '!':
+                j += 1
+            if j < n and segment[j] == ']':
+                j += 1
+            j = segment.find(']', j)
+            if j < 0:
+                result.append(r'\[')
+            else:
+                chars = segment[i:j].replace('\\', r'\\')
+                i = j + 1
+                if chars[0] == '!':
+                    chars = '^/' + chars[1:]
+                elif chars[0] == '^':
+                    chars = '\\' + chars
+                result.append('[%s]' % chars)
+        else:
+            result.append(re.escape(c))
+    return ''.join(result)
+
+
+_patterns = {}
+
+
+def compile_pattern(pattern):
+    '''Return a compiled regular expression for a wildcard pattern.
+
+    The expression matches topics with a leading '/' added. ValueError
+    is raised if # is used anywhere but the last segment.
+    '''
+    try:
+        return _patterns[pattern]
+    except KeyError:
+        pass
+    segments = pattern.split('/')
+    parts = []
+    for i, segment in enumerate(segments):
+        if segment == '#':
+            if i != len(segments) - 1:
+                raise ValueError(
+                    '# must be the last segment of pattern %r' % (pattern,))
+            parts.append('(?:/.*)?')
+        elif segment == '+':
+            parts.append('/[^/]*')
+        else:
+            parts.append('/' + _translate_glob(segment))
+    regex = re.compile(''.join(parts) + r'\Z', re.S)
+    if len(_patterns) >= 1000:
+        _patterns.clear()
+    _patterns[pattern] = regex
+    return regex
+
+
+def topic_matches(prefix, topic):
+    '''Return True if topic matches a subscription prefix or pattern.'''
+    if is_pattern(prefix):
+        return compile_pattern(prefix).match('/' + topic) is not None
+    return topic.startswith(prefix)
+
+
+class _TrieNode(object):
+    __slots__ = ('children', 'partials', 'patterns')
+
+    def __init__(self):
+        self.children = {}
+        self.partials = {}
+        self.patterns = {}
+
+
+class SubscriptionTrie(object):
+    '''Index of subscription prefixes keyed on topic segments.
+
+    Behaves like a dictionary mapping subscription prefixes to sets of
+    subscribers, but also maintains a trie of the prefixes split on
+    '/'. Complete segments of a prefix are trie nodes and the trailing
+    (possibly empty) partial segment is stored on the last node, so
+    matching a topic only visits the nodes along the topic's path and
+    costs O(len(topic)) rather than O(number of prefixes).
+
+    Wildcard patterns (see is_pattern()) are stored compiled on the
+    node reached by their leading literal segments and are only tried
+    against topics passing through that node.
+    '''
+
+    def __init__(self):
+        self._prefixes = {}
+        self._root = _TrieNode()
+
+    def __len__(self):
+        return len(self._prefixes)
+
+    def __iter__(self):
+        return iter(self._prefixes)
+
+    def __contains__(self, prefix):
+        return prefix in self._prefixes
+
+    def __getitem__(self, prefix):
+        return self._prefixes[prefix]
+
+    def __setitem__(self, prefix, subscribers):
+        segments, pattern = self._split(prefix)
+        self._prefixes[prefix] = subscribers
+        node = self._root
+        for segment in segments:
+            try:
+                node = node.children[segment]
+            except KeyError:
+                node.children[segment] = node = _TrieNode()
+        if pattern is None:
+            node.partials[prefix.rsplit('/', 1)[-1]] = subscribers
+        else:
+            node.patterns[prefix] = pattern, subscribers
+
+    @staticmethod
+    def _split(prefix):
+        '''Return the node path of prefix and its compiled pattern.'''
+        segments = prefix.split('/')
+        if not is_pattern(prefix):
+            return segments[:-1], None
+        pattern = compile_pattern(prefix)
+        for i, segment in enumerate(segments):
+            if _is_wildcard(segment):
+                return segments[:i], pattern
+
+    def __delitem__(self, prefix):
+        self.pop(prefix)
+
+    def pop(self, prefix, *default):
+        try:
+            subscribers = self._prefixes.pop(prefix)
+        except KeyError:
+            if default:
+                return default[0]
+            raise
+        segments, pattern = self._split(prefix)
+        path = [self._root]
+        for segment in segments:
+            path.append(path[-1].children[segment])
+        if pattern is None:
+            del path[-1].partials[prefix.rsplit('/', 1)[-1]]
+        else:
+            del path[-1].patterns[prefix]
+        # Prune nodes left without subscriptions or children.
+        for parent, node, segment in reversed(
+                zip(path, path[1:], segments)):
+            if node.children or node.partials or node.patterns:
+                break
+            del parent.children[segment]
+        return subscribers
+
+    def keys(self):
+        return self._prefixes.keys()
+
+    def iteritems(self):
+        return self._prefixes.iteritems()
+
+    def iter_matches(self, topic):
+        '''Yield (prefix, subscribers) for each prefix matching topic.'''
+        segments = topic.split('/')
+        slashed = '/' + topic
+        node = self._root
+        for i, segment in enumerate(segments):
+            partials = node.partials
+            if partials:
+                base = '/'.join(segments[:i]) + '/' if i else ''
+                for partial, subscription in partials.iteritems():
+                    if subscription and segment.startswith(partial):
+                        yield base + partial, subscription
+            for prefix, (pattern, subscription) in node.patterns.iteritems():
+                if subscription and pattern.match(slashed):
+                    yield prefix, subscription
+            try:
+                node = node.children[segment]
+            except KeyError:
+                break
+        else:
+            # Patterns ending in # also match their literal segments.
+            for prefix, (pattern, subscription) in node.patterns.iteritems():
+                if subscription and pattern.match(slashed):
+                    yield prefix, subscription
+
+    def match(self, topic):
+        '''Return the set of subscribers with a prefix matching topic.'''
+        subscribers = set()
+        segments = topic.split('/')
+        slashed = '/' + topic
+        node = self._root
+        for segment in segments:
+            for pattern, subscription in node.patterns.itervalues():
+                if pattern.match(slashed):
+                    subscribers |= subscription
+            partials = node.partials
+            if partials:
+                if len(partials) <= len(segment):
+                    for partial, subscription in partials.iteritems():
+                        if segment.startswith(partial):
+                            subscribers |= subscription
+                else:
+                    for i in xrange(len(segment) + 1):
+                        subscription = partials.get(segment[:i])
+                        if subscription:
+                            subscribers |= subscription
+            try:
+                node = node.children[segment]
+            except KeyError:
+                break
+        else:
+            for pattern, subscription in node.patterns.itervalues():
+                if pattern.match(slashed):
+                    subscribers |= subscription
+        return subscribers
@@ -57,20 +57,27 @@
 
 from __future__ import absolute_import
 
+import functools
 import inspect
 import logging
 import os
 import sys
+import time
 import traceback
 import weakref
 
+import gevent
 import gevent.local
 from gevent.event import AsyncResult
-from zmq.utils import jsonapi
 
 from .base import SubsystemBase
+from ... import codec
+from ...socket import BULK_PREFIX
 from ..errors import VIPError
+from ..executors import ClassAttribute, ProcessExecutor, ThreadExecutor
+from ..pools import PoolFull
 from ..results import counter, ResultsDictionary
+from ...tracking import bucket, increment
 from ..decorators import annotate, annotations, dualmethod, spawn
 from .... import jsonrpc
 
@@ -85,20 +92,89 @@ _ROOT_PACKAGE_PATH = os.path.dirname(
 _log = logging.getLogger(__name__)
 
 
+class _DeadlineExpired(BaseException):
+    '''Raised in a request handler when the caller's deadline passes.'''
+
+
+def _requests(obj):
+    '''Return the requests, which have a method, in a decoded message.'''
+    objs = obj if isinstance(obj, list) else [obj]
+    return [msg for msg in objs if isinstance(msg, dict) and 'method' in msg]
+
+
 class Dispatcher(jsonrpc.Dispatcher):
     def __init__(self, methods, local):
         super(Dispatcher, self).__init__()
         self.methods = methods
         self.local = local
         self._results = ResultsDictionary()
+        # Profile of each exported method that has been called. Latency
+        # is a histogram of power-of-two microsecond buckets.
+        self.stats = {}
 
     def serialize(self, json_obj):
-        return jsonapi.dumps(json_obj)
+        return self._codec().dumps(json_obj)
 
     def deserialize(self, json_string):
-        return jsonapi.loads(json_string)
+        decoded = getattr(self.local, 'decoded', None)
+        if decoded is not None:
+            return decoded
+        return self._codec().loads(json_string)
+
+    def decode(self, json_string):
+        '''Return the decoded message, or None if it cannot be decoded.'''
+        try:
+            return codec.detect(json_string).loads(json_string)
+        except ValueError:
+            return None
+
+    def _codec(self):
+        # Responses are encoded with the codec of the request.
+        return getattr(self.local, 'codec', codec.JSON)
+
+    def dispatch(self, json_string, context=None, decoded=None,
+                 received=None):
+        '''Dispatch a message, which may already have been decoded.
 
-    def batch_call(self, requests):
+        Deadlines of requests in the message count from received, the
+        time the message arrived, when given.
+        '''
+        local = self.local
+        local.codec = codec.detect(json_string)
+        local.decoded = decoded
+        local.received = received
+        local.served = served = []
+        try:
+            response = super(Dispatcher, self).dispatch(json_string, context)
+        finally:
+            del local.codec
+            del local.decoded
+            del local.received
+            del local.served
+        if served:
+            # Requests in a batch share the size of the batch equally.
+            count = len(served)
+            for stat in served:
+                stat['request_bytes'] += len(json_string) // count
+                stat['response_bytes'] += len(response or b'') // count
+        return response
+
+    def _dispatch_one(self, msg, batch, context):
+        try:
+            return super(Dispatcher, self)._dispatch_one(msg, batch, context)
+        except _DeadlineExpired:
+            # Only this request is abandoned; others in a batch continue.
+            ident = msg.get('id')
+            _log.debug('abandoned RPC request %r after its deadline', ident)
+            if ident is None:
+                return
+            return jsonrpc.json_error(
+                ident, jsonrpc.DEADLINE_EXCEEDED, 'deadline exceeded',
+                detail='method {!r} did not finish before the deadline '
+                       'of the call'.format(msg.get('method')))
+
+    def batch_call(self, requests, peer_codec=codec.JSON):
+        # pylint: disable=arguments-differ
         methods = []
         results = []
         for notify, method, args, kwargs in requests:
@@ -108,14 +184,24 @@ class Dispatcher(jsonrpc.Dispatcher):
                 result = next(self._results)
                 ident = result.ident
                 results.append(result)
-            methods.append((ident, method, args, kwargs))
-        return super(Dispatcher, self).batch_call(methods), results
+            methods.append(jsonrpc.json_method(ident, method, args, kwargs))
+        return peer_codec.dumps(methods), results
 
-    def call(self, method, args=None, kwargs=None):
+    def call(self, method, args=None, kwargs=None, peer_codec=codec.JSON,
+             timeout=None):
         # pylint: disable=arguments-differ
         result = next(self._results)
-        return super(Dispatcher, self).call(
-            result.ident, method, args, kwargs), result
+        request = jsonrpc.json_method(
+            result.ident, method, args or (), kwargs or {})
+        if timeout is not None:
+            # Sent as seconds remaining so the peers' clocks need not agree.
+            request['timeout'] = timeout
+        return peer_codec.dumps(request), result
+
+    def notify(self, method, args=None, kwargs=None, peer_codec=codec.JSON):
+        # pylint: disable=arguments-differ
+        return peer_codec.dumps(jsonrpc.json_method(
+            None, method, args or (), kwargs or {}))
 
     def result(self, response, ident, value, context=None):
         try:
@@ -161,13 +247,37 @@ class Dispatcher(jsonrpc.Dispatcher):
                 else:
                     return self._inspect(method)
             raise NotImplementedError(name)
+        try:
+            stat = self.stats[name]
+        except KeyError:
+            stat = self.stats[name] = {
+                'calls': 0, 'errors': 0, 'latency': {},
+                'request_bytes': 0, 'response_bytes': 0}
+        stat['calls'] += 1
         local = self.local
+        local.served.append(stat)
         local.vip_message = context
         local.request = request
         local.batch = batch
+        started = time.time()
+        timeout = request.get('timeout')
+        if timeout is None:
+            local.deadline = None
+        else:
+            # Time spent queued before dispatch counts against the
+            # deadline.
+            local.deadline = (local.received or started) + timeout
+            timeout = local.deadline - started
         try:
-            return method(*args, **kwargs)
+            if timeout is not None and timeout <= 0:
+                raise _DeadlineExpired()
+            with gevent.Timeout(timeout, _DeadlineExpired):
+                return method(*args, **kwargs)
+        except _DeadlineExpired:
+            stat['errors'] += 1
+            raise
         except Exception as exc:   # pylint: disable=broad-except
+            stat['errors'] += 1
             exc_tb = traceback.format_exc()
             print("RPC ERROR",exc_tb)
             _log.error('unhandled exception in JSON-RPC method %r: \n%s',
@@ -176,9 +286,11 @@ class Dispatcher(jsonrpc.Dispatcher):
                 exc.exc_info = {'exc_tb': exc_tb}
             raise
         finally:
+            increment(stat['latency'], bucket(time.time() - started))
             del local.vip_message
             del local.request
             del local.batch
+            del local.deadline
 
     def _inspect(self, method):
         params = inspect.getargspec(method)
@@ -205,28 +317,54 @@ class Dispatcher(jsonrpc.Dispatcher):
         return response
 
 
+def _forward(result, source):
+    if source.successful():
+        result.set(source.value)
+    else:
+        result.set_exception(source.exception)
+
+
 class RPC(SubsystemBase):
-    def __init__(self, core, owner):
+    # Seconds to hold calls to a peer so that calls made in the meantime
+    # are sent together in one JSON-RPC batch. None sends every call as
+    # soon as it is made.
+    coalesce_window = None
+    # Most calls sent in one batch before the window expires.
+    coalesce_limit = 100
+
+    def __init__(self, core, owner, hello_subsys=None):
         self.core = weakref.ref(core)
         self._owner = owner
+        self._hello = hello_subsys and weakref.ref(hello_subsys)
         self.context = None
         self._exports = {}
         self._dispatcher = None
         self._counter = counter()
         self._outstanding = weakref.WeakValueDictionary()
+        self._coalescing = {}
+        self._executors = {}
         core.register('RPC', self._handle_subsystem, self._handle_error)
         self._isconnected = True
 
         def export(member):   # pylint: disable=redefined-outer-name
+            options = annotations(member, dict, 'rpc.executor')
             for name in annotations(member, set, 'rpc.exports'):
-                self._exports[name] = member
+                self._exports[name] = self._execute_in(name, member, **options)
         inspect.getmembers(owner, export)
 
         def setup(sender, **kwargs):
             # pylint: disable=unused-argument
             self.context = gevent.local.local()
             self._dispatcher = Dispatcher(self._exports, self.context)
+            self._exports.setdefault('rpc.stats', self.stats)
         core.onsetup.connect(setup, self)
+
+        def stop(sender, **kwargs):
+            # pylint: disable=unused-argument
+            for executor in self._executors.itervalues():
+                executor.shutdown()
+            self._executors.clear()
+        core.onstop.connect(stop, self)
         core.ondisconnected.connect(self._disconnected)
         core.onconnected.connect(self._connected)
         self._iterate_exports()
@@ -262,11 +400,45 @@ class RPC(SubsystemBase):
             return method(*args, **kwargs)
         return checked_method
 
-    @spawn
     def _handle_subsystem(self, message):
+        decode = self._dispatcher.decode
+        decoded = [decode(bytes(msg)) for msg in message.args]
+        if not any(_requests(obj) for obj in decoded):
+            # Responses only resolve waiting results, so handle them at
+            # once; queuing them behind requests waiting on them would
+            # deadlock.
+            self._serve(message, decoded)
+            return
+        try:
+            self.core().pool('rpc').spawn(
+                self._serve, message, decoded, time.time())
+        except PoolFull as exc:
+            _log.warning('refused RPC request %r from %r: %s',
+                         bytes(message.id), bytes(message.peer), exc)
+            self._refuse(message, decoded)
+
+    def _serve(self, message, decoded, received=None):
         dispatch = self._dispatcher.dispatch
         responses = [response for response in (
-            dispatch(bytes(msg), message) for msg in message.args) if response]
+            dispatch(bytes(msg), message, obj, received)
+            for msg, obj in zip(message.args, decoded)) if response]
+        self._reply(message, responses)
+
+    def _refuse(self, message, decoded):
+        '''Reply to each request with an error as the agent is too busy.'''
+        responses = []
+        for msg, obj in zip(message.args, decoded):
+            errors = [jsonrpc.json_error(request['id'], jsonrpc.SERVER_BUSY,
+                                         'too many requests queued')
+                      for request in _requests(obj)
+                      if request.get('id') is not None]
+            if errors:
+                if not isinstance(obj, list):
+                    errors = errors[0]
+                responses.append(codec.detect(bytes(msg)).dumps(errors))
+        self._reply(message, responses)
+
+    def _reply(self, message, responses):
         if responses:
             message.user = ''
             message.args = responses
@@ -286,23 +458,104 @@ class RPC(SubsystemBase):
                 result.set_exception(error)
 
     @dualmethod
-    def export(self, method, name=None):
-        self._exports[name or method.__name__] = method
+    def export(self, method, name=None, executor=None, max_workers=None):
+        name = name or method.__name__
+        exported = self._execute_in(name, method, executor, max_workers)
+        caps = annotations(method, set, 'rpc.allow_capabilities')
+        if caps:
+            exported = self._add_auth_check(exported, caps)
+        self._exports[name] = exported
         return method
 
     @export.classmethod
-    def export(cls, name=None):   # pylint: disable=no-self-argument
-        if not isinstance(name, basestring):
+    def export(cls, name=None, executor=None, max_workers=None):   # pylint: disable=no-self-argument
+        '''Decorator to export a method for calling over RPC.
+
+        Exported methods run in the agent's greenlets unless executor is
+        'thread' or 'process', in which case calls run in a pool of
+        max_workers (default 1) threads or processes. Use a thread pool
+        for methods that block and a process pool for CPU bound methods.
+        Pooled methods must not use the agent's subsystems and process
+        pooled methods must be static methods or module level functions
+        taking picklable arguments:
+
+        .. code-block:: python
+
+            @staticmethod
+            @RPC.export(executor='process', max_workers=2)
+            def summarize(values):
+                ...
+
+        '''
+        if name is not None and not isinstance(name, basestring):
             method, name = name, name.__name__
             annotate(method, set, 'rpc.exports', name)
             return method
         def decorate(method):
-            annotate(method, set, 'rpc.exports', name)
+            annotate(method, set, 'rpc.exports', name or method.__name__)
+            if executor is not None:
+                annotate(method, dict, 'rpc.executor',
+                         {'executor': executor, 'max_workers': max_workers})
             return method
         return decorate
 
+    def _execute_in(self, name, method, executor=None, max_workers=None):
+        '''Wrap method to run in the executor pool it was exported with.'''
+        if executor is None:
+            return method
+        if executor == 'thread':
+            factory, func = ThreadExecutor, method
+        elif executor == 'process':
+            factory, func = ProcessExecutor, method
+            if getattr(method, 'im_self', None) is not None:
+                raise ValueError('{!r} must be a function or static method '
+                                 'to run in a process'.format(name))
+            owner_type = type(self._owner)
+            if getattr(owner_type, method.__name__, None) is method:
+                func = ClassAttribute(owner_type, method.__name__)
+        else:
+            raise ValueError('unknown executor {!r}'.format(executor))
+
+        @functools.wraps(method)
+        def execute(*args, **kwargs):
+            try:
+                pool = self._executors[name]
+            except KeyError:
+                pool = self._executors[name] = factory(max_workers or 1)
+            return pool.apply(func, args, kwargs)
+        return execute
+
+    def stats(self, reset=False):
+        '''Return the profile of each exported method that was called.
+
+        For each method this gives the number of calls and errors, a
+        histogram of latency in power-of-two microsecond buckets and the
+        bytes received in requests and sent in responses. Also exported
+        as rpc.stats.
+        '''
+        stats = {name: dict(stat, latency=dict(stat['latency']))
+                 for name, stat in self._dispatcher.stats.iteritems()}
+        if reset:
+            self._dispatcher.stats.clear()
+        return stats
+
+    def executor_stats(self):
+        '''Return pool statistics, including time calls spent waiting for a
+        worker, for each method exported with an executor that was called.
+        '''
+        return {name: executor.stats()
+                for name, executor in self._executors.iteritems()}
+
+    def peer_codec(self, peer):
+        '''Return the codec negotiated with peer for RPC payloads.'''
+        hello = self._hello and self._hello()
+        if hello is None:
+            return codec.JSON
+        return hello.codec(peer)
+
     def batch(self, peer, requests):
-        request, results = self._dispatcher.batch_call(requests)
+        request, results = self._dispatcher.batch_call(
+            requests, self.peer_codec(peer))
         if results:
             items = weakref.WeakSet(results)
             ident = '%s.%s' % (next(self._counter), id(items))
@@ -321,9 +574,45 @@ class RPC(SubsystemBase):
         return results or None
 
     def call(self, peer, method, *args, **kwargs):
-        request, result = self._dispatcher.call(method, args, kwargs)
-        ident = '%s.%s' % (next(self._counter), hash(result))
+        if self.coalesce_window is not None:
+            return self._coalesce(peer, method, args, kwargs)
+        return self._call(b'', peer, method, args, kwargs)
+
+    __call__ = call
+
+    def timed_call(self, timeout, peer, method, *args, **kwargs):
+        '''Like call() but give up on the call after timeout seconds.
+
+        The peer is told the deadline, which it may read from
+        rpc.context.deadline, and stops serving the call once it passes,
+        counting from when the request arrived.
+        After the deadline the result raises gevent.Timeout. Calls made
+        while serving a call with a deadline inherit the deadline.
+        '''
+        return self._call(b'', peer, method, args, kwargs, timeout)
+
+    def bulk_call(self, peer, method, *args, **kwargs):
+        '''Like call() but request and response travel in the bulk lane.
+
+        Bulk messages wait behind control messages in the router and in
+        the receiving agent. Use for high volume traffic, like device
+        scrapes, which should not delay control traffic.
+        '''
+        return self._call(BULK_PREFIX, peer, method, args, kwargs)
+
+    def _call(self, prefix, peer, method, args, kwargs, timeout=None):
+        if timeout is None:
+            deadline = getattr(self.context, 'deadline', None)
+            if deadline is not None:
+                timeout = max(deadline - time.time(), 0)
+        request, result = self._dispatcher.call(
+            method, args, kwargs, self.peer_codec(peer), timeout)
+        ident = '%s%s.%s' % (prefix, next(self._counter), hash(result))
         self._outstanding[ident] = result
+        if timeout is not None:
+            timer = gevent.get_hub().loop.timer(timeout)
+            timer.start(self._expire, ident, timeout)
+            result.rawlink(lambda res: timer.stop())
 
         if self._isconnected:
             try:
@@ -333,10 +622,50 @@ class RPC(SubsystemBase):
                     _log.debug("Socket send on non socket {}".format(self.core().identity))
         return result
 
-    __call__ = call
+    def _coalesce(self, peer, method, args, kwargs):
+        '''Queue a call to be sent to peer in the next batch.
+
+        Batched calls are executed one after another by the peer, so a
+        slow method delays the results of the calls batched after it.
+        Batches carry no deadline, so calls made while serving a call
+        with a deadline are sent alone to inherit it.
+        '''
+        if getattr(self.context, 'deadline', None) is not None:
+            return self._call(b'', peer, method, args, kwargs)
+        result = AsyncResult()
+        try:
+            pending = self._coalescing[peer]
+        except KeyError:
+            pending = self._coalescing[peer] = []
+            self.core().spawn_later(
+                self.coalesce_window, self._flush, peer, pending)
+        pending.append((method, args, kwargs, result))
+        if len(pending) >= self.coalesce_limit:
+            self._flush(peer, pending)
+        return result
+
+    def _flush(self, peer, pending):
+        if self._coalescing.get(peer) is pending:
+            del self._coalescing[peer]
+        if not pending:
+            return
+        requests = [(False, method, args, kwargs)
+                    for method, args, kwargs, _ in pending]
+        results = self.batch(peer, requests)
+        for (_, _, _, result), sent in zip(pending, results):
+            # The batch result is only weakly referenced elsewhere.
+            result._batch_result = sent   # pylint: disable=protected-access
+            sent.rawlink(functools.partial(_forward, result))
+        del pending[:]
+
+    def _expire(self, ident, timeout):
+        result = self._outstanding.pop(ident, None)
+        if isinstance(result, AsyncResult) and not result.ready():
+            result.set_exception(gevent.Timeout(timeout))
 
     def notify(self, peer, method, *args, **kwargs):
-        request = self._dispatcher.notify(method, args, kwargs)
+        request = self._dispatcher.notify(
+            method, args, kwargs, self.peer_codec(peer))
 
         if self._isconnected:
             try:
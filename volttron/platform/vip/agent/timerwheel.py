@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#}}}
+
+
+'''Hierarchical timer wheel for scheduling many callbacks cheaply.'''
+
+from __future__ import absolute_import
+
+from collections import deque
+import logging
+import time
+
+import gevent
+import gevent.event
+
+from ..tracking import bucket, increment
+
+
+__all__ = ['TimerWheel']
+
+_log = logging.getLogger(__name__)
+
+
+class TimerWheel(object):
+    '''Schedule callbacks in slots of tick seconds.
+
+    The wheel has levels of 2**bits slots each, every level covering
+    2**bits times the span of the level below it, so adding and
+    canceling a timer take constant time however many are pending.
+    Timers on higher levels are moved down a level each time the level
+    below wraps around. Everything due in the same tick is handed to at
+    most workers greenlets, which are reused until nothing is left to
+    run, instead of spawning a greenlet per callback.
+
+    Callbacks are ScheduledEvent objects, or any object which is called
+    with no arguments and has a boolean canceled attribute. One wheel
+    may be shared by many agents running in the same hub.
+    '''
+
+    def __init__(self, tick=0.01, bits=8, levels=4, workers=100):
+        self.tick = tick
+        self.workers = workers
+        self._bits = bits
+        self._mask = (1 << bits) - 1
+        self._wheels = [[set() for _ in xrange(1 << bits)]
+                        for _ in xrange(levels)]
+        self._current = int(time.time() / tick)
+        self._count = 0
+        self._wakeup = None
+        self._event = gevent.event.Event()
+        self._runner = None
+        self._ready = deque()
+        self._working = set()
+        self.stats = {'fired': 0, 'lag': {}, 'max_lag': 0.0}
+
+    def __len__(self):
+        return self._count
+
+    def add(self, deadline, callback):
+        '''Call callback at deadline, in seconds since the epoch.'''
+        tick = int(deadline / self.tick)
+        if not self._count:
+            # Skip the idle ticks rather than stepping through them.
+            self._current = max(self._current, int(time.time() / self.tick))
+        callback.deadline = deadline
+        callback.tick = tick
+        self._insert(callback, self._current + 1)
+        self._count += 1
+        if self._runner is None:
+            self._runner = gevent.spawn(self._run)
+        elif self._wakeup is None or tick < self._wakeup:
+            self._event.set()
+        return callback
+
+    def cancel(self, callback):
+        '''Remove a pending callback from the wheel.'''
+        slot = getattr(callback, 'slot', None)
+        if slot is not None and callback in slot:
+            slot.remove(callback)
+            callback.slot = None
+            self._count -= 1
+
+    def _insert(self, callback, earliest):
+        tick = max(callback.tick, earliest)
+        bits, current = self._bits, self._current
+        level = 0
+        while (tick ^ current) >> (bits * (level + 1)) and \
+                level < len(self._wheels) - 1:
+            level += 1
+        slot = self._wheels[level][(tick >> (bits * level)) & self._mask]
+        slot.add(callback)
+        callback.slot = slot
+
+    def _advance(self):
+        self._current = tick = self._current + 1
+        bits, mask = self._bits, self._mask
+        # Move timers down from each level whose lower level wrapped.
+        cascade = []
+        for level in xrange(1, len(self._wheels)):
+            if (tick >> (bits * (level - 1))) & mask:
+                break
+            cascade.append(level)
+        for level in reversed(cascade):
+            slot = self._wheels[level][(tick >> (bits * level)) & mask]
+            callbacks = list(slot)
+            slot.clear()
+            for callback in callbacks:
+                self._insert(callback, tick)
+        slot = self._wheels[0][tick & mask]
+        if slot:
+            callbacks = list(slot)
+            slot.clear()
+            self._count -= len(callbacks)
+            for callback in callbacks:
+                callback.slot = None
+            self._fire(callbacks)
+
+    def _next_tick(self):
+        '''Return the next tick which must be processed.'''
+        current, mask = self._current, self._mask
+        wheel = self._wheels[0]
+        wrap = (current | mask) + 1
+        for tick in xrange(current + 1, wrap):
+            if wheel[tick & mask]:
+                return tick
+        return wrap
+
+    def _run(self):
+        try:
+            while self._count:
+                now = int(time.time() / self.tick)
+                while self._current < now and self._count:
+                    self._advance()
+                if not self._count:
+                    break
+                self._wakeup = self._next_tick()
+                self._event.clear()
+                self._event.wait(max(self._wakeup * self.tick - time.time(),
+                                     0))
+                self._wakeup = None
+        finally:
+            self._runner = None
+
+    def _fire(self, callbacks):
+        self._ready.extend(callbacks)
+        while self._ready and len(self._working) < self.workers:
+            self._working.add(gevent.spawn(self._work))
+
+    def _work(self):
+        ready, stats = self._ready, self.stats
+        try:
+            while ready:
+                callback = ready.popleft()
+                if callback.canceled:
+                    continue
+                lag = max(time.time() - callback.deadline, 0)
+                stats['fired'] += 1
+                increment(stats['lag'], bucket(lag))
+                stats['max_lag'] = max(stats['max_lag'], lag)
+                try:
+                    callback()
+                except Exception:   # pylint: disable=broad-except
+                    _log.exception('scheduled callback %r failed', callback)
+        finally:
+            self._working.discard(gevent.getcurrent())
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#}}}
+
+'''Serialization codecs for VIP RPC payloads.
+
+RPC requests, responses and pubsub pushes are JSON-RPC 2.0 objects.
+JSON is always available and is the default. When the msgpack package
+is installed, a more compact MessagePack codec is also offered. Peers
+advertise the codecs they can decode in the hello exchange and senders
+pick the most preferred codec both sides support. Receivers detect the
+codec from the first byte of the payload, so no per-message tagging is
+required and legacy (JSON only) peers are unaffected.
+'''
+
+from __future__ import absolute_import
+
+import struct
+
+from zmq.utils import jsonapi
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+__all__ = ['JSONCodec', 'MsgPackCodec', 'JSON', 'register', 'available',
+           'get', 'negotiate', 'detect']
+
+
+class JSONCodec(object):
+    '''Text codec compatible with all VIP peers.'''
+
+    name = b'json'
+
+    def dumps(self, obj):
+        return jsonapi.dumps(obj)
+
+    def loads(self, data):
+        return jsonapi.loads(data)
+
+    def join(self, encoded):
+        '''Combine individually encoded objects into an encoded list.'''
+        return b'[' + b','.join(encoded) + b']'
+
+    def match(self, data):
+        return True
+
+
+def _text(value):
+    # The JSON codec decodes ASCII strings as str and others as unicode.
+    if type(value) is unicode:
+        try:
+            return value.encode('ascii')
+        except UnicodeEncodeError:
+            pass
+    return value
+
+
+_JSON_KEYS = (int, long, float, bool, type(None))
+
+
+def _key(key):
+    # JSON converts scalar keys to strings and refuses other keys.
+    if isinstance(key, basestring):
+        return _text(key)
+    if isinstance(key, _JSON_KEYS):
+        return jsonapi.dumps(key)
+    raise TypeError('keys must be strings: {!r}'.format(key))
+
+
+def _pairs(pairs):
+    return {_key(key): _text(value) for key, value in pairs}
+
+
+def _list(values):
+    return [_text(value) for value in values]
+
+
+class MsgPackCodec(object):
+    '''Binary codec using MessagePack.
+
+    Decoded values match those of the JSON codec so that peers see the
+    same objects whichever codec was negotiated: ASCII strings are
+    decoded as str and other strings as unicode, and map keys are
+    converted to strings as JSON does. Objects MessagePack cannot pack,
+    such as integers wider than 64 bits, are encoded as JSON instead,
+    which receivers recognize with detect().
+    '''
+
+    name = b'msgpack'
+
+    # Leading bytes of MessagePack maps and arrays, the only top-level
+    # types used for JSON-RPC objects. None of them are valid as the
+    # first byte of a JSON document.
+    _LEADING = frozenset(range(0x80, 0xa0) + range(0xdc, 0xe0))
+
+    def __init__(self):
+        self._unpack_kwargs = {'object_pairs_hook': _pairs,
+                               'list_hook': _list}
+        if msgpack.version >= (1, 0, 0):
+            self._unpack_kwargs.update(raw=False, strict_map_key=False)
+        elif msgpack.version >= (0, 5, 2):
+            self._unpack_kwargs['raw'] = False
+        else:
+            self._unpack_kwargs['encoding'] = 'utf-8'
+
+    def dumps(self, obj):
+        try:
+            return msgpack.packb(obj, use_bin_type=False)
+        except (TypeError, ValueError, OverflowError):
+            return JSON.dumps(obj)
+
+    def loads(self, data):
+        if not self.match(data):
+            return JSON.loads(data)
+        return _text(msgpack.unpackb(data, **self._unpack_kwargs))
+
+    def join(self, encoded):
+        '''Combine individually encoded objects into an encoded list.'''
+        if not all(self.match(data) for data in encoded):
+            # Some fell back to JSON, so the list must be JSON too.
+            return JSON.join([JSON.dumps(self.loads(data)) if
+                              self.match(data) else data for data in encoded])
+        count = len(encoded)
+        if count < 16:
+            header = struct.pack('B', 0x90 | count)
+        elif count < 0x10000:
+            header = struct.pack('>BH', 0xdc, count)
+        else:
+            header = struct.pack('>BI', 0xdd, count)
+        return header + b''.join(encoded)
+
+    def match(self, data):
+        return bool(data) and ord(data[0]) in self._LEADING
+
+
+JSON = JSONCodec()
+
+# Codecs in order of preference; JSON is the fallback and always last.
+_codecs = [JSON]
+
+
+def register(codec):
+    '''Register a codec, preferring it over those already registered.'''
+    _codecs.insert(0, codec)
+
+
+def available():
+    '''Return the names of locally supported codecs, most preferred first.'''
+    return [codec.name for codec in _codecs]
+
+
+def get(name):
+    for codec in _codecs:
+        if codec.name == name:
+            return codec
+    raise KeyError(name)
+
+
+def negotiate(names):
+    '''Return the most preferred local codec also listed in names.'''
+    for codec in _codecs:
+        if codec.name in names:
+            return codec
+    return JSON
+
+
+def detect(data):
+    '''Return the codec able to decode the given payload.'''
+    for codec in _codecs:
+        if codec.match(data):
+            return codec
+    return JSON
+
+
+if msgpack is not None:
+    register(MsgPackCodec())
@@ -58,10 +58,15 @@
 
 from __future__ import absolute_import
 
+from collections import deque
 import os
 import logging
 import zmq
 from zmq import Frame, NOBLOCK, ZMQError, EINVAL, EHOSTUNREACH
+from zmq.error import Again
+
+from .socket import (ZLIB_PROTO, DecompressionError, compress_frames,
+                     decompress_frames, is_bulk)
 
 
 __all__ = ['BaseRouter', 'OUTGOING', 'INCOMING', 'UNROUTABLE', 'ERROR']
@@ -94,15 +99,25 @@ class BaseRouter(object):
     setup authentication, etc, etc. The socket will be created by the
     start() method, which will then call the setup() method.  Once
     started, the socket may be polled for incoming messages and those
-    messages are handled/routed by calling the route() method.  During
+    messages are handled/routed by calling the route() method. The
+    run() loop routes control messages ahead of bulk messages (those
+    with a MSG_ID marked by socket.BULK_PREFIX), queueing up to
+    bulk_queue_size of the latter while control messages wait. During
     routing, the issue() method, which may be implemented, will be
     called to allow for debugging and logging. Custom subsystems may be
     implemented in the handle_subsystem() method. The socket will be
     closed when the stop() method is called.
+
+    Peers may request compression by adding b'zlib' and a size
+    threshold to their first hello to the router, which the welcome
+    then confirms. Arguments of messages routed to such peers are sent zlib
+    compressed when they total at least the threshold, and compressed
+    messages from them are decompressed for peers without compression.
     '''
 
     _context_class = zmq.Context
     _socket_class = zmq.Socket
+    bulk_queue_size = 1000
 
     def __init__(self, context=None, default_user_id=None):
         '''Initialize the object instance.
@@ -114,13 +129,34 @@ class BaseRouter(object):
         self.default_user_id = default_user_id
         self.socket = None
         self._peers = set()
+        self._compress = {}
 
     def run(self):
-        '''Main router loop.'''
+        '''Main router loop.
+
+        Waiting messages are read until none remain or the bulk queue
+        is full. Control messages are routed as they are read while
+        bulk messages are queued, one of which is routed before reading
+        again. Messages from one peer may therefore be reordered across
+        lanes, but never within a lane.
+        '''
         self.start()
+        bulk = deque()
+        size = self.bulk_queue_size
         try:
-            while self.poll():
-                self.route()
+            while bulk or self.poll():
+                recv = self.socket.recv_multipart
+                while len(bulk) < size:
+                    try:
+                        frames = recv(flags=NOBLOCK, copy=False)
+                    except Again:
+                        break
+                    if len(frames) > 5 and is_bulk(frames[4]):
+                        bulk.append(frames)
+                    else:
+                        self._route(frames)
+                if bulk:
+                    self._route(bulk.popleft())
         finally:
             self.stop()
 
@@ -207,6 +243,7 @@ class BaseRouter(object):
             return self.default_user_id
 
     def _distribute(self, *parts):
+        '''Send a message to all peers and return unreachable peers.'''
         drop = set()
         empty = Frame(b'')
         frames = [empty, empty, Frame(b'VIP1'), empty, empty]
@@ -214,21 +251,28 @@ class BaseRouter(object):
         for peer in self._peers:
             frames[0] = peer
             drop.update(self._send(frames))
-        for peer in drop:
-            self._drop_peer(peer)
+        return drop
 
     def _add_peer(self, peer):
         if peer in self._peers:
             return
-        self._distribute(b'peerlist', b'add', peer)
+        drop = self._distribute(b'peerlist', b'add', peer)
         self._peers.add(peer)
+        for unreachable in drop:
+            self._drop_peer(unreachable)
 
     def _drop_peer(self, peer):
-        try:
-            self._peers.remove(peer)
-        except KeyError:
-            return
-        self._distribute(b'peerlist', b'drop', peer)
+        # Announcing a drop may find other peers gone. Drop those in
+        # turn rather than recursing, which many peers would overflow.
+        drop = [peer]
+        while drop:
+            peer = drop.pop()
+            try:
+                self._peers.remove(peer)
+            except KeyError:
+                continue
+            self._compress.pop(peer, None)
+            drop.extend(self._distribute(b'peerlist', b'drop', peer))
 
     def route(self):
         '''Route one message and return.
@@ -239,11 +283,13 @@ class BaseRouter(object):
         handle_subsystem() for processing. Messages destined for other
         entities are routed appropriately.
         '''
+        self._route(self.socket.recv_multipart(copy=False))
+
+    def _route(self, frames):
         socket = self.socket
         issue = self.issue
         # Expecting incoming frames:
         #   [SENDER, RECIPIENT, PROTO, USER_ID, MSG_ID, SUBSYS, ...]
-        frames = socket.recv_multipart(copy=False)
         issue(INCOMING, frames)
         if len(frames) < 6:
             # Cannot route if there are insufficient frames, such as
@@ -255,10 +301,26 @@ class BaseRouter(object):
                 issue(UNROUTABLE, frames, 'too few frames')
             return
         sender, recipient, proto, auth_token, msg_id = frames[:5]
+        compress = self._compress
         if proto.bytes != b'VIP1':
-            # Peer is not talking a protocol we understand
-            issue(UNROUTABLE, frames, 'bad VIP signature')
-            return
+            if proto.bytes != ZLIB_PROTO or sender.bytes not in compress:
+                # Peer is not talking a protocol we understand
+                issue(UNROUTABLE, frames, 'bad VIP signature')
+                return
+            if recipient.bytes not in compress:
+                try:
+                    frames[6:] = decompress_frames(frames[6:])
+                except DecompressionError as exc:
+                    # Drop the message and tell the sender why
+                    errnum, errmsg = error = (str(exc.errnum).encode('ascii'),
+                                              os.strerror(exc.errnum))
+                    issue(ERROR, frames, error)
+                    frames = [sender, b'', b'VIP1', b'', msg_id,
+                              b'error', errnum, errmsg, recipient, frames[5]]
+                    for peer in self._send(frames):
+                        self._drop_peer(peer)
+                    return
+                proto = Frame(b'VIP1')
         user_id = self.lookup_user_id(sender, recipient, auth_token)
         if user_id is None:
             user_id = b''
@@ -269,8 +331,17 @@ class BaseRouter(object):
             # Handle requests directed at the router
             name = subsystem.bytes
             if name == b'hello':
+                request = [frame.bytes for frame in frames[7:]]
                 frames = [sender, recipient, proto, user_id, msg_id,
                           b'hello', b'welcome', b'1.0', socket.identity, sender]
+                # Core says hello on connecting, either bare or asking
+                # for compression. Other hellos list payload codecs.
+                if (len(request) == 2 and request[0] == b'zlib' and
+                        request[1].isdigit()):
+                    compress[sender.bytes] = int(request[1])
+                    frames.append(b'zlib')
+                elif not request:
+                    compress.pop(sender.bytes, None)
             elif name == b'ping':
                 frames[:7] = [
                     sender, recipient, proto, user_id, msg_id, b'ping', b'pong']
@@ -303,6 +374,11 @@ class BaseRouter(object):
                     frames = response
         else:
             # Route all other requests to the recipient
+            threshold = compress.get(recipient.bytes)
+            if (threshold is not None and proto.bytes == b'VIP1' and
+                    sum(len(frame) for frame in frames[6:]) >= threshold):
+                frames[6:] = compress_frames(frames[6:])
+                proto = ZLIB_PROTO
             frames[:4] = [recipient, sender, proto, user_id]
         for peer in self._send(frames):
             self._drop_peer(peer)
@@ -329,9 +405,11 @@ class BaseRouter(object):
             if exc.errno == EHOSTUNREACH:
                 drop.append(bytes(recipient))
             if exc.errno != EHOSTUNREACH or sender is not frames[0]:
-                # Only send errors if the sender and recipient differ
-                proto, user_id, msg_id, subsystem = frames[2:6]
-                frames = [sender, b'', proto, user_id, msg_id,
+                # Only send errors if the sender and recipient differ.
+                # The message may have been compressed for the recipient,
+                # but error arguments never are.
+                user_id, msg_id, subsystem = frames[3:6]
+                frames = [sender, b'', b'VIP1', user_id, msg_id,
                           b'error', errnum, errmsg, recipient, subsystem]
                 try:
                     socket.send_multipart(frames, flags=NOBLOCK, copy=False)
@@ -72,25 +72,70 @@ from __future__ import absolute_import
 import base64
 import binascii
 from contextlib import contextmanager
+from errno import EMSGSIZE, EPROTO
 import logging
+import os
 import re
 import sys
 import urllib
 import urlparse
 import uuid
+import zlib
 
 from zmq import (SNDMORE, RCVMORE, NOBLOCK, POLLOUT, DEALER, ROUTER,
-                 curve_keypair, ZMQError)
+                 Frame, curve_keypair, ZMQError)
 from zmq.error import Again
 from zmq.utils import z85
 
 
-__all__ = ['Address', 'ProtocolError', 'Message', 'nonblocking']
+__all__ = ['Address', 'ProtocolError', 'DecompressionError', 'Message',
+           'nonblocking']
 
 BASE64_ENCODED_CURVE_KEY_LEN = 43
 
+# Messages with a MSG_ID starting with BULK_PREFIX travel in the bulk
+# lane: routers and agents handle waiting control messages first.
+BULK_PREFIX = b'bulk.'
+
+# PROTO signature of messages with zlib compressed ARG frames, which
+# are only sent over connections that negotiated compression in hello.
+ZLIB_PROTO = b'VIP1z'
+ZLIB_LEVEL = 1
+# Largest total size of the decompressed arguments of a message.
+ZLIB_MAX_SIZE = 64 * 1024 * 1024
+
 _log = logging.getLogger(__name__)
 
+def is_bulk(msg_id):
+    '''Return True if msg_id marks a message for the bulk lane.'''
+    return bytes(msg_id).startswith(BULK_PREFIX)
+
+
+def compress_frames(frames):
+    '''Return a list of the zlib compressed contents of frames.'''
+    return [zlib.compress(bytes(frame), ZLIB_LEVEL) for frame in frames]
+
+
+def decompress_frames(frames, max_size=ZLIB_MAX_SIZE):
+    '''Return a list of the decompressed contents of frames.
+
+    DecompressionError is raised if a frame is not valid zlib data or if
+    the frames decompress to more than max_size bytes.
+    '''
+    result = []
+    for frame in frames:
+        decompressor = zlib.decompressobj()
+        try:
+            data = decompressor.decompress(bytes(frame), max_size + 1)
+        except zlib.error:
+            raise DecompressionError(EPROTO)
+        if len(data) > max_size:
+            raise DecompressionError(EMSGSIZE)
+        max_size -= len(data)
+        result.append(data)
+    return result
+
+
 @contextmanager
 def nonblocking(sock):
     local = sock._Socket__local
@@ -145,10 +190,12 @@ class Address(object):
         ipv6:      Boolean value indicating use of IPv6.
         username:  Username to use with PLAIN authentication.
         password:  Password to use with PLAIN authentication.
+        compress:  Minimum size in bytes of message arguments to send
+                   zlib compressed, if the router agrees in hello.
     '''
 
     _KEYS = ('domain', 'server', 'secretkey', 'publickey',
-             'serverkey', 'ipv6', 'username', 'password')
+             'serverkey', 'ipv6', 'username', 'password', 'compress')
     _MASK_KEYS = ('secretkey', 'password')
 
     def __init__(self, address, **defaults):
@@ -188,6 +235,8 @@ class Address(object):
                 elif name == 'ipv6':
                     value = bool(re.sub(
                         r'\s*(0|false|no|off)\s*', r'', value, flags=re.I))
+                elif name == 'compress':
+                    value = int(value)
                 setattr(self, name, value)
 
     @property
@@ -279,6 +328,18 @@ class ProtocolError(Exception):
     pass
 
 
+class DecompressionError(ProtocolError):
+    '''Error raised for compressed arguments which cannot be decompressed.
+
+    When raised by recv_vip(), frames holds the other frames of the
+    message, which has been discarded.
+    '''
+    def __init__(self, errnum, frames=None):
+        super(DecompressionError, self).__init__(errnum, os.strerror(errnum))
+        self.errnum = errnum
+        self.frames = frames
+
+
 class Message(object):
     '''Message object returned form Socket.recv_vip_object().'''
     def __init__(self, **kwargs):
@@ -302,8 +363,19 @@ class _Socket(object):
     A state machine is implemented by the send() and recv() methods to
     ensure the proper number, type, and ordering of frames. Protocol
     violations will raise ProtocolError exceptions.
+
+    Once compress_threshold is set, which Core does when the router
+    accepts compression, arguments totalling at least that many bytes
+    are sent compressed and compressed messages are accepted.
+    recv_vip() and the methods built on it decompress arguments,
+    raising DecompressionError for invalid data or for arguments larger
+    than max_decompressed_size.
     '''
 
+    compress_threshold = None
+    max_decompressed_size = ZLIB_MAX_SIZE
+    _recv_compressed = False
+
     def __new__(cls, context=None, socket_type=DEALER, shadow=None):
         '''Create and return a new Socket object.
 
@@ -396,7 +468,8 @@ class _Socket(object):
             elif state < 5:
                 if state == 1:
                     # Automatically send PROTO frame
-                    super(_Socket, self).send(b'VIP1', flags=flags|SNDMORE)
+                    proto = getattr(self._Socket__local, 'proto', b'VIP1')
+                    super(_Socket, self).send(proto, flags=flags|SNDMORE)
                     state += 1
                 self._send_state = state + 1
             try:
@@ -434,8 +507,18 @@ class _Socket(object):
             if user is None:
                 user = b''
             more = SNDMORE if args else 0
-            self.send_multipart([peer, user, msg_id, subsystem],
-                                flags=flags|more, copy=copy, track=track)
+            threshold = self.compress_threshold
+            local = self._Socket__local
+            if (threshold is not None and args and not flags & SNDMORE and
+                    not isinstance(args, basestring) and
+                    sum(len(arg) for arg in args) >= threshold):
+                args = compress_frames(args)
+                local.proto = ZLIB_PROTO
+            try:
+                self.send_multipart([peer, user, msg_id, subsystem],
+                                    flags=flags|more, copy=copy, track=track)
+            finally:
+                local.proto = b'VIP1'
             if args:
                 send = (self.send if isinstance(args, basestring)
                         else self.send_multipart)
@@ -478,7 +561,9 @@ class _Socket(object):
             proto = super(_Socket, self).recv(flags=flags)
             state += 1
             self._recv_state = state
-            if proto != b'VIP1':
+            if proto == ZLIB_PROTO and self.compress_threshold is not None:
+                self._recv_compressed = True
+            elif proto != b'VIP1':
                 raise ProtocolError('invalid protocol: {!r}{}'.format(
                     proto[:30], '...' if len(proto) > 30 else ''))
         result = super(_Socket, self).recv(flags=flags, copy=copy, track=track)
@@ -519,7 +604,17 @@ class _Socket(object):
         message = self.recv_multipart(flags=flags, copy=copy, track=track)
         idx = 4 - state
         result = message[:idx]
-        result.append(message[idx:])
+        args = message[idx:]
+        if self._recv_compressed:
+            self._recv_compressed = False
+            try:
+                args = decompress_frames(args, self.max_decompressed_size)
+            except DecompressionError as exc:
+                exc.frames = result
+                raise
+            if not copy:
+                args = [Frame(arg) for arg in args]
+        result.append(args)
         return result
 
     def recv_vip_dict(self, flags=0, copy=True, track=False):
@@ -61,13 +61,21 @@
 
 from __future__ import absolute_import, print_function
 
+from collections import deque
+import time
+
 import gevent
+from zmq import EAGAIN, EHOSTUNREACH
 
 from .router import UNROUTABLE, ERROR, INCOMING
 
 __all__ = ['Tracker']
 
 
+# Lengths, in seconds, of the windows message rates are reported over.
+RATE_WINDOWS = (1, 10, 60)
+
+
 def pick(frames, index):
     '''Return the frame at index, converted to bytes, or None.'''
     try:
@@ -76,12 +84,29 @@ def pick(frames, index):
         return None
 
 
-def increment(prop, key):
-    '''Increment or set to 1 the value in prop[key].'''
+def increment(prop, key, value=1):
+    '''Increment or set to value the value in prop[key].'''
     try:
-        prop[key] += 1
+        prop[key] += value
     except KeyError:
-        prop[key] = 1
+        prop[key] = value
+
+
+def bucket(seconds):
+    '''Return the power of two microseconds bounding a duration.'''
+    return 1 << int(seconds * 1e6).bit_length()
+
+
+def snapshot(stats):
+    '''Copy nested dictionaries one level at a time.
+
+    Each dict() call copies atomically, so the router thread may keep
+    updating the statistics while they are copied.
+    '''
+    if isinstance(stats, dict):
+        return {key: snapshot(value)
+                for key, value in dict(stats).iteritems()}
+    return stats
 
 
 class Tracker(object):
@@ -90,6 +115,9 @@ class Tracker(object):
     def __init__(self):
         self._reset()
         self.enabled = False
+        # Router socket options, such as high-water marks, set by the
+        # router when it creates its socket.
+        self.socket_options = {}
 
     def reset(self):
         '''Reset all counters to default values and set start time.'''
@@ -101,28 +129,86 @@ class Tracker(object):
         self.stats = {
             'error': {'error': {}, 'peer': {}, 'user': {}, 'subsystem': {}},
             'unroutable': {'error': {}, 'peer': {}},
-            'incoming': {'peer': {}, 'user': {}, 'subsystem': {}},
-            'outgoing': {'peer': {}, 'user': {}, 'subsystem': {}},
+            'unreachable': {},
+            'blocked': {},
+            'incoming': {'peer': {}, 'user': {}, 'subsystem': {},
+                         'bytes': {}},
+            'outgoing': {'peer': {}, 'user': {}, 'subsystem': {},
+                         'bytes': {}},
+            'routing': {},
         }
+        self._routing = None
+        self._seconds = deque(maxlen=max(RATE_WINDOWS))
 
     def hit(self, topic, frames, extra):
         '''Increment counters for given topic and frames.'''
         if self.enabled:
+            peer = pick(frames, 0)
             if topic == UNROUTABLE:
                 stat = self.stats['unroutable']
                 increment(stat['error'], extra)
             else:
                 user = pick(frames, 3)
                 subsystem = pick(frames, 5)
+                now = time.time()
+                if topic == INCOMING:
+                    self._routing = now, subsystem
+                    self._count(now)
+                elif self._routing:
+                    # The first outgoing message or error for the last
+                    # incoming message ends its routing.
+                    started, subsystem = self._routing
+                    self._routing = None
+                    try:
+                        histogram = self.stats['routing'][subsystem]
+                    except KeyError:
+                        self.stats['routing'][subsystem] = histogram = {}
+                    increment(histogram, bucket(now - started))
                 if topic == ERROR:
                     stat = self.stats['error']
-                    increment(stat['error'], bytes(extra[0]))
+                    errnum = bytes(extra[0])
+                    increment(stat['error'], errnum)
+                    if int(errnum) == EAGAIN:
+                        increment(self.stats['blocked'], peer)
+                    elif int(errnum) == EHOSTUNREACH:
+                        increment(self.stats['unreachable'], peer)
                 else:
                     stat = self.stats[
                         'incoming' if topic == INCOMING else 'outgoing']
+                    increment(stat['bytes'], peer,
+                              sum(len(frame) for frame in frames))
                 increment(stat['user'], user)
                 increment(stat['subsystem'], subsystem)
-            increment(stat['peer'], pick(frames, 0))
+            increment(stat['peer'], peer)
+
+    def _count(self, now):
+        '''Count an incoming message in the current second.'''
+        second = int(now)
+        seconds = self._seconds
+        if seconds and seconds[-1][0] == second:
+            seconds[-1][1] += 1
+        else:
+            seconds.append([second, 1])
+
+    def get_stats(self):
+        '''Return a copy of the statistics with current message rates.
+
+        Rates are the mean incoming messages per second over each of the
+        last RATE_WINDOWS whole seconds while tracking is enabled.
+        routing maps subsystems to histograms of the time taken to route
+        their messages, keyed by upper bound in microseconds.
+        '''
+        stats = snapshot(self.stats)
+        stats['socket'] = snapshot(self.socket_options)
+        if self.enabled:
+            current = int(time.time())
+            seconds = list(self._seconds)
+            stats['rates'] = {
+                window: sum(count for second, count in seconds
+                            if current - window <= second < current) /
+                        float(window)
+                for window in RATE_WINDOWS}
+        return stats
 
     def enable(self):
         '''Enable tracking.'''
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from volttrontesting.benchmarks.throughput import (
+    REGISTRY_FILES, compare, run_benchmarks, summarize)
+
+
+@pytest.mark.benchmark
+def test_run_benchmarks_reports_every_measurement():
+    report = run_benchmarks(router_messages=200, subscriber_counts=(1, 3),
+                            latency_messages=5, rpc_calls=10,
+                            subscribers=2, messages=10)
+    # The report must survive the round trip through a JSON file.
+    report = json.loads(json.dumps(report))
+    assert report['router']['messages'] == 200
+    assert report['router']['messages_per_second'] > 0
+    assert [entry['subscribers'] for entry in report['publish_latency']] \
+        == [1, 3]
+    assert [entry['count'] for entry in report['publish_latency']] == [5, 15]
+    assert report['rpc']['count'] == 10
+    assert sorted(report['pubsub_throughput']) == sorted(REGISTRY_FILES)
+    points = [report['pubsub_throughput'][name]['points']
+              for name in REGISTRY_FILES]
+    assert points == [6, 18, 48]
+    for name in REGISTRY_FILES:
+        compression = report['compression'][name]
+        assert compression['compressed_bytes'] < compression['raw_bytes']
+
+
+@pytest.mark.benchmark
+def test_summarize():
+    assert summarize([]) == {'count': 0}
+    result = summarize([i / 1000.0 for i in range(100, 0, -1)])
+    assert result['count'] == 100
+    assert result['p50_ms'] == 51
+    assert result['p99_ms'] == 100
+    assert result['max_ms'] == 100
+
+
+@pytest.mark.benchmark
+def test_compare_matches_numbers_in_both_reports():
+    baseline = {'version': '4.0', 'rpc': {'p50_ms': 2.0, 'count': 10},
+                'publish_latency': [{'p50_ms': 1.0}, {'p50_ms': 5.0}],
+                'router': {'messages_per_second': 100}}
+    report = {'version': '4.1', 'rpc': {'p50_ms': 1.5, 'count': 10},
+              'publish_latency': [{'p50_ms': 1.2}]}
+    assert list(compare(baseline, report)) == [
+        ('publish_latency.0.p50_ms', 1.0, 1.2),
+        ('rpc.count', 10, 10),
+        ('rpc.p50_ms', 2.0, 1.5)]
@@ -0,0 +1,670 @@
+# -*- coding: utf-8 -*- {{{
+# vim: set fenc=utf-8 ft=python sw=4 ts=4 sts=4 et:
+
+# Copyright (c) 2016, Battelle Memorial Institute
+# All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions
+# are met:
+#
+# 1. Redistributions of source code must retain the above copyright
+#    notice, this list of conditions and the following disclaimer.
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in
+#    the documentation and/or other materials provided with the
+#    distribution.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS
+# "AS IS" AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT
+# LIMITED TO, THE IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR
+# A PARTICULAR PURPOSE ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT
+# OWNER OR CONTRIBUTORS BE LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL,
+# SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT
+# LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES; LOSS OF USE,
+# DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND ON ANY
+# THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+#
+# The views and conclusions contained in the software and documentation
+# are those of the authors and should not be interpreted as representing
+# official policies, either expressed or implied, of the FreeBSD
+# Project.
+#
+# This material was prepared as an account of work sponsored by an
+# agency of the United States Government.  Neither the United States
+# Government nor the United States Department of Energy, nor Battelle,
+# nor any of their employees, nor any jurisdiction or organization that
+# has cooperated in the development of these materials, makes any
+# warranty, express or implied, or assumes any legal liability or
+# responsibility for the accuracy, completeness, or usefulness or any
+# information, apparatus, product, software, or process disclosed, or
+# represents that its use would not infringe privately owned rights.
+#
+# Reference herein to any specific commercial product, process, or
+# service by trade name, trademark, manufacturer, or otherwise does not
+# necessarily constitute or imply its endorsement, recommendation, or
+# favoring by the United States Government or any agency thereof, or
+# Battelle Memorial Institute. The views and opinions of authors
+# expressed herein do not necessarily state or reflect those of the
+# United States Government or any agency thereof.
+#
+# PACIFIC NORTHWEST NATIONAL LABORATORY
+# operated by BATTELLE for the UNITED STATES DEPARTMENT OF ENERGY
+# under Contract DE-AC05-76RL01830
+#}}}
+
+'''Reproducible VIP router and pubsub throughput benchmarks.
+
+Starts a router and pubsub service in this process, attaches synthetic
+agents to them over inproc://vip and measures raw router throughput,
+publish-to-callback latency for increasing numbers of subscribers, RPC
+round-trip latency and pubsub throughput for the driver payloads of the
+scalability-testing registry files, along with the bandwidth saved and
+CPU time spent compressing those payloads for remote connections.
+Results are written as JSON so runs of different releases can be
+compared:
+
+    python -m volttrontesting.benchmarks.throughput --output 4.1.json
+    python -m volttrontesting.benchmarks.throughput --baseline 4.1.json
+'''
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import gevent
+import gevent.event
+import zmq
+import zmq.green
+
+from volttron.platform import __version__, jsonrpc
+from volttron.platform.main import PubSubService, Router
+from volttron.platform.vip import codec, green as vip
+from volttron.platform.vip.agent import Agent, RPC
+from volttron.platform.vip.socket import compress_frames, decompress_frames
+from volttron.platform.vip.tracking import Tracker
+
+
+REGISTRY_DIR = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), os.pardir, os.pardir,
+    'scripts', 'scalability-testing'))
+REGISTRY_FILES = ['fake6.csv', 'fake18.csv', 'fake48.csv']
+
+
+class EchoAgent(Agent):
+    @RPC.export
+    def echo(self, value):
+        return value
+
+
+class BenchmarkPlatform(object):
+    '''A router and pubsub service running in this process.
+
+    Agents are connected to the router over inproc://vip, as the
+    platform services are, so measurements are not skewed by CURVE
+    encryption. Other processes may connect to ipc_address, which is
+    unauthenticated as there is no ZAP handler.
+    '''
+
+    address = 'inproc://vip'
+
+    def __init__(self):
+        self.volttron_home = None
+        self.ipc_address = None
+        self.publickey, self.secretkey = zmq.curve_keypair()
+        self.tracker = Tracker()
+        self.synthetic = []
+        self._thread = None
+        self._tasks = []
+
+    def start(self):
+        # Each synthetic agent uses a socket and its file descriptors.
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        limit = 8192 if hard == resource.RLIM_INFINITY else min(hard, 8192)
+        if soft != resource.RLIM_INFINITY and soft < limit:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+        # Only takes effect if no socket was created yet.
+        zmq.Context.instance().set(zmq.MAX_SOCKETS, limit)
+        self.volttron_home = tempfile.mkdtemp(prefix='vbench')
+        self.ipc_address = 'ipc://' + os.path.join(
+            self.volttron_home, 'vip-ipc.socket')
+        router = Router(
+            'ipc://' + os.path.join(self.volttron_home, 'vip.socket'),
+            secretkey=self.secretkey, publickey=self.publickey,
+            default_user_id=b'vip.service', tracker=self.tracker,
+            ipc_address=self.ipc_address)
+
+        def run():
+            try:
+                router.run()
+            except KeyboardInterrupt:
+                # Raised by the router after handling the quit message.
+                pass
+
+        self._thread = threading.Thread(target=run)
+        self._thread.daemon = True
+        self._thread.start()
+        protected_topics_file = os.path.join(
+            self.volttron_home, 'protected_topics.json')
+        self.start_agent(PubSubService, protected_topics_file,
+                         identity='pubsub')
+
+    def start_agent(self, agent_class=Agent, *args, **kwargs):
+        '''Create, start and return an agent attached to the router.'''
+        return self.start_agents([(agent_class, args, kwargs)])[0]
+
+    def start_agents(self, specs, timeout=60):
+        '''Start agents for a list of (class, args, kwargs) in parallel.'''
+        agents, events = [], []
+        for agent_class, args, kwargs in specs:
+            agent = agent_class(
+                *args, address=self.address, publickey=self.publickey,
+                secretkey=self.secretkey, volttron_home=self.volttron_home,
+                enable_store=False, **kwargs)
+            event = gevent.event.Event()
+            self._tasks.append(gevent.spawn(agent.core.run, event))
+            agents.append(agent)
+            events.append(event)
+        if len(gevent.wait(events, timeout=timeout)) != len(events):
+            raise RuntimeError('timed out starting agents')
+        return agents
+
+    def settle(self, quiet=0.5, timeout=600):
+        '''Wait until the router routed nothing for quiet seconds.
+
+        Joining peers set off peerlist updates and subscription
+        synchronization, which must finish before measuring. Agents
+        delay the synchronization by up to a second.
+        '''
+        gevent.sleep(1)
+        self.tracker.enable()
+        try:
+            incoming = self.tracker.stats['incoming']['peer']
+            deadline = time.time() + timeout
+            count = None
+            while time.time() < deadline:
+                last, count = count, sum(incoming.values())
+                if count == last:
+                    break
+                gevent.sleep(quiet)
+        finally:
+            self.tracker.disable()
+
+    def stop(self):
+        for subscriber in self.synthetic:
+            subscriber.close()
+        del self.synthetic[:]
+        for task in self._tasks:
+            task.kill(block=False)
+        gevent.wait(self._tasks, timeout=30)
+        del self._tasks[:]
+        if self._thread is not None:
+            # The router only accepts quit from the control service.
+            sock = zmq.Context.instance().socket(zmq.DEALER)
+            sock.identity = b'control'
+            sock.connect(self.address)
+            sock.send_multipart([b'', b'VIP1', b'', b'', b'quit'])
+            self._thread.join(60)
+            sock.close(linger=0)
+            self._thread = None
+        if self.volttron_home:
+            shutil.rmtree(self.volttron_home, ignore_errors=True)
+            self.volttron_home = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+def summarize(samples):
+    '''Return the count, mean and percentiles, in ms, of samples in s.'''
+    samples = sorted(samples)
+    if not samples:
+        return {'count': 0}
+
+    def pick(fraction):
+        index = min(int(fraction * len(samples)), len(samples) - 1)
+        return round(samples[index] * 1e3, 3)
+
+    return {'count': len(samples),
+            'mean_ms': round(sum(samples) / len(samples) * 1e3, 3),
+            'p50_ms': pick(0.5), 'p90_ms': pick(0.9),
+            'p99_ms': pick(0.99), 'max_ms': round(samples[-1] * 1e3, 3)}
+
+
+def route_messages(address, number, size, window, results):
+    context = zmq.Context()
+    source = context.socket(zmq.DEALER)
+    sink = context.socket(zmq.DEALER)
+    source.identity, sink.identity = b'bench.source', b'bench.sink'
+    for sock in source, sink:
+        sock.connect(address)
+        # Ping the router so it knows of the peer before routing.
+        sock.send_multipart([b'', b'VIP1', b'', b'', b'ping'])
+        while sock.recv_multipart()[4] != b'ping':
+            pass
+    payload = os.urandom(size)
+    message = [sink.identity, b'VIP1', b'', b'', b'bench', payload]
+    start = time.time()
+    sent = 0
+    while sent < number:
+        count = min(window, number - sent)
+        for _ in xrange(count):
+            source.send_multipart(message, copy=False)
+        received = 0
+        while received < count:
+            # Skip peerlist notifications about other peers.
+            if sink.recv_multipart()[4] == b'bench':
+                received += 1
+        sent += count
+    results.put(time.time() - start)
+    source.close(linger=0)
+    sink.close(linger=0)
+    context.term()
+
+
+def router_throughput(bench, number=100000, size=64, window=1000):
+    '''Route number messages of size bytes between two raw sockets.
+
+    The sockets live in a child process, as agents do, and bypass the
+    agent framework so that only the router loop is measured. At most
+    window messages are outstanding at a time.
+    '''
+    results = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=route_messages,
+        args=(bench.ipc_address, number, size, window, results))
+    process.start()
+    # Wait in a native thread so the hub keeps serving agents.
+    elapsed = gevent.get_hub().threadpool.apply(results.get)
+    process.join()
+    return {'messages': number, 'size': size, 'seconds': round(elapsed, 3),
+            'messages_per_second': round(number / elapsed, 1)}
+
+
+class Deliveries(object):
+    '''Count pubsub deliveries and optionally record their latency.'''
+
+    def __init__(self):
+        self.expected = 0
+        self.count = 0
+        self.latencies = []
+        self.done = gevent.event.Event()
+
+    def expect(self, expected):
+        self.expected = expected
+        self.count = 0
+        self.done.clear()
+
+    def __call__(self, peer, sender, bus, topic, headers, message):
+        sent = headers.get('bench.sent')
+        if sent is not None:
+            self.latencies.append(time.time() - sent)
+        self.count += 1
+        if self.count >= self.expected:
+            self.done.set()
+
+
+class SyntheticSubscriber(object):
+    '''A bare VIP peer which subscribes to topics and counts pushes.
+
+    Agents synchronize subscriptions with every peer that joins, so
+    starting a thousand of them costs a million messages. This peer
+    only answers hellos and handles pubsub.push notifications and
+    subscribe results, decoding them as an agent would.
+    '''
+
+    def __init__(self, identity):
+        self.identity = identity
+        self.callback = None
+        self.socket = None
+        self._results = {}
+        self._counter = itertools.count()
+        self._task = None
+
+    def connect(self, address):
+        self.socket = vip.Socket(zmq.green.Context.instance())
+        self.socket.identity = self.identity
+        self.socket.connect(address)
+        self._task = gevent.spawn(self._run)
+
+    def ping(self):
+        '''Ping the router and return an AsyncResult.
+
+        The router adds the peer on its first message. The result is
+        set once every message queued for the peer before the pong was
+        handled.
+        '''
+        ident = str(next(self._counter))
+        self._results[ident] = result = gevent.event.AsyncResult()
+        self.socket.send_vip(b'', b'ping', msg_id=ident)
+        return result
+
+    def close(self):
+        if self._task is not None:
+            self._task.kill()
+            self.socket.close(linger=0)
+            self._task = None
+
+    def subscribe(self, prefix, callback):
+        '''Subscribe to prefix and return an AsyncResult.'''
+        self.callback = callback
+        ident = str(next(self._counter))
+        self._results[ident] = result = gevent.event.AsyncResult()
+        request = jsonrpc.json_method(
+            ident, 'pubsub.subscribe', [prefix], {'bus': ''})
+        self.socket.send_vip(b'pubsub', b'RPC',
+                             [codec.JSON.dumps(request)], msg_id=ident)
+        return result
+
+    def _run(self):
+        while True:
+            message = self.socket.recv_vip_object()
+            subsystem = bytes(message.subsystem)
+            if subsystem == b'hello' and bytes(message.args[0]) == b'hello':
+                message.user = b''
+                message.args = [b'welcome', b'1.0', self.identity,
+                                message.peer, codec.JSON.name]
+                self.socket.send_vip_object(message)
+            elif subsystem == b'RPC':
+                self._handle_rpc(bytes(message.peer), bytes(message.args[0]))
+            elif subsystem == b'ping':
+                result = self._results.pop(bytes(message.id), None)
+                if result is not None:
+                    result.set()
+
+    def _handle_rpc(self, peer, payload):
+        items = codec.detect(payload).loads(payload)
+        if isinstance(items, dict):
+            items = [items]
+        for item in items:
+            method = item.get('method')
+            if method == 'pubsub.push':
+                sender, bus, topic, headers, message = item['params']
+                self.callback(peer, sender, bus, topic, headers, message)
+            elif method is None:
+                result = self._results.pop(item.get('id'), None)
+                if result is None:
+                    continue
+                if 'error' in item:
+                    result.set_exception(
+                        RuntimeError(item['error'].get('message')))
+                else:
+                    result.set(item.get('result'))
+
+
+def subscribe_all(subscribers, prefix, callback, timeout=60):
+    results = []
+    for subscriber in subscribers:
+        if isinstance(subscriber, SyntheticSubscriber):
+            results.append(subscriber.subscribe(prefix, callback))
+        else:
+            results.append(subscriber.vip.pubsub.subscribe(
+                'pubsub', prefix, callback))
+    for result in results:
+        result.get(timeout=timeout)
+
+
+def add_subscribers(bench, subscribers, count):
+    '''Grow the list of subscriber agents to count.'''
+    specs = [(Agent, (), {'identity': 'bench.subscriber.{}'.format(i)})
+             for i in range(len(subscribers), count)]
+    subscribers.extend(bench.start_agents(specs))
+    bench.settle()
+
+
+def add_synthetic_subscribers(bench, subscribers, count):
+    '''Grow the list of synthetic subscribers to count.'''
+    added = []
+    for i in range(len(subscribers), count):
+        subscriber = SyntheticSubscriber('bench.synthetic.{}'.format(i))
+        subscriber.connect(bench.address)
+        bench.synthetic.append(subscriber)
+        added.append(subscriber)
+    # The first pings add the peers, which the router announces to all
+    # others. The second drain those announcements.
+    for _ in range(2):
+        gevent.wait([subscriber.ping() for subscriber in added])
+    subscribers.extend(added)
+    bench.settle()
+
+
+def publish_latency(bench, publisher, subscribers, count, number=100,
+                    timeout=60):
+    '''Publish number messages, one at a time, to count subscribers.
+
+    Each message is published once the previous one reached every
+    subscriber. Subscribers are synthetic. Returns percentiles of the
+    time from the call to publish to the subscriber callback.
+    '''
+    add_synthetic_subscribers(bench, subscribers, count)
+    deliveries = Deliveries()
+    topic = 'bench/latency/{}'.format(count)
+    subscribe_all(subscribers[:count], topic, deliveries)
+    for i in range(number):
+        deliveries.expect(count)
+        publisher.vip.pubsub.publish(
+            'pubsub', topic, headers={'bench.sent': time.time()},
+            message=i)
+        if not deliveries.done.wait(timeout):
+            raise RuntimeError('timed out waiting for deliveries')
+    result = summarize(deliveries.latencies)
+    result['subscribers'] = count
+    return result
+
+
+def rpc_latency(bench, client, number=2000, timeout=30):
+    '''Call an echo method number times, one call at a time.'''
+    bench.start_agent(EchoAgent, identity='bench.echo')
+    samples = []
+    start = time.time()
+    for i in range(number):
+        begin = time.time()
+        client.vip.rpc.call('bench.echo', 'echo', i).get(timeout=timeout)
+        samples.append(time.time() - begin)
+    elapsed = time.time() - start
+    result = summarize(samples)
+    result['calls_per_second'] = round(number / elapsed, 1)
+    return result
+
+
+def scrape_message(registry_file):
+    '''Return the all message a driver publishes for registry_file.'''
+    with open(registry_file) as f:
+        points = [row['Volttron Point Name'] for row in csv.DictReader(f)]
+    values = {point: random.uniform(0, 100) for point in points}
+    meta = {point: {'units': 'F', 'type': 'float', 'tz': 'US/Pacific'}
+            for point in points}
+    return [values, meta]
+
+
+def compression_tradeoff(registry_file, number=1000):
+    '''Measure zlib compression of the push of a driver scrape.
+
+    Reports the size of the push frame a subscriber receives with and
+    without compression and the time taken to compress and decompress
+    it, in microseconds.
+    '''
+    message = scrape_message(registry_file)
+    name = os.path.splitext(os.path.basename(registry_file))[0]
+    frames = [codec.JSON.dumps(jsonrpc.json_method(
+        None, 'pubsub.push',
+        ['bench.publisher', '', 'devices/bench/{}/all'.format(name), {},
+         message], None))]
+    start = time.time()
+    for _ in xrange(number):
+        compressed = compress_frames(frames)
+    compress_time = time.time() - start
+    start = time.time()
+    for _ in xrange(number):
+        decompress_frames(compressed)
+    decompress_time = time.time() - start
+    raw, size = len(frames[0]), len(compressed[0])
+    return {'points': len(message[0]),
+            'raw_bytes': raw,
+            'compressed_bytes': size,
+            'ratio': round(float(raw) / size, 2),
+            'compress_us': round(compress_time * 1e6 / number, 1),
+            'decompress_us': round(decompress_time * 1e6 / number, 1)}
+
+
+def pubsub_throughput(bench, publisher, subscribers, registry_file,
+                      count=10, number=2000, window=100, timeout=120):
+    '''Publish number driver messages to count subscribers.
+
+    At most window publishes are outstanding at a time. The clock
+    stops once every subscriber received every message.
+    '''
+    add_subscribers(bench, subscribers, count)
+    message = scrape_message(registry_file)
+    name = os.path.splitext(os.path.basename(registry_file))[0]
+    topic = 'devices/bench/{}/all'.format(name)
+    deliveries = Deliveries()
+    deliveries.expect(count * number)
+    subscribe_all(subscribers[:count], topic, deliveries)
+    start = time.time()
+    results = []
+    for i in range(number):
+        results.append(publisher.vip.pubsub.publish(
+            'pubsub', topic, headers={}, message=message))
+        if len(results) >= window:
+            gevent.wait(results)
+            results = []
+    gevent.wait(results)
+    if not deliveries.done.wait(timeout):
+        raise RuntimeError('timed out waiting for deliveries')
+    elapsed = time.time() - start
+    return {'points': len(message[0]), 'subscribers': count,
+            'messages': number, 'payload_bytes': len(json.dumps(message)),
+            'seconds': round(elapsed, 3),
+            'publishes_per_second': round(number / elapsed, 1),
+            'deliveries_per_second': round(count * number / elapsed, 1)}
+
+
+def run_benchmarks(router_messages=100000, router_size=64,
+                   subscriber_counts=(1, 10, 100, 1000), latency_messages=100,
+                   rpc_calls=2000, registry_files=None, subscribers=10,
+                   messages=2000):
+    '''Run every benchmark on a fresh platform and return the report.'''
+    if registry_files is None:
+        registry_files = [os.path.join(REGISTRY_DIR, name)
+                          for name in REGISTRY_FILES]
+    report = {
+        'version': __version__,
+        'python': platform.python_version(),
+        'zmq': zmq.zmq_version(),
+        'pyzmq': zmq.pyzmq_version(),
+        'date': datetime.datetime.utcnow().isoformat() + 'Z',
+    }
+    with BenchmarkPlatform() as bench:
+        report['router'] = router_throughput(
+            bench, number=router_messages, size=router_size)
+        publisher = bench.start_agent(identity='bench.publisher')
+        synthetic = []
+        report['publish_latency'] = [
+            publish_latency(bench, publisher, synthetic, count,
+                            number=latency_messages)
+            for count in subscriber_counts]
+        report['rpc'] = rpc_latency(bench, publisher, number=rpc_calls)
+        agents = []
+        report['pubsub_throughput'] = {
+            os.path.basename(path): pubsub_throughput(
+                bench, publisher, agents, path, count=subscribers,
+                number=messages)
+            for path in registry_files}
+    report['compression'] = {
+        os.path.basename(path): compression_tradeoff(path)
+        for path in registry_files}
+    return report
+
+
+def compare(baseline, report, path=()):
+    '''Yield (name, baseline, current) for each number in both reports.'''
+    if isinstance(baseline, list) and isinstance(report, list):
+        baseline = dict(enumerate(baseline))
+        report = dict(enumerate(report))
+    if isinstance(baseline, dict) and isinstance(report, dict):
+        for key in sorted(set(baseline) & set(report)):
+            for item in compare(baseline[key], report[key],
+                                path + (str(key),)):
+                yield item
+    elif (isinstance(baseline, (int, float)) and
+          isinstance(report, (int, float))):
+        yield '.'.join(path), baseline, report
+
+
+def main(argv=sys.argv):
+    parser = argparse.ArgumentParser(
+        prog=os.path.basename(argv[0]), description=__doc__.split('\n')[0])
+    parser.add_argument('--router-messages', type=int, default=100000,
+                        help='number of messages routed between raw sockets')
+    parser.add_argument('--router-size', type=int, default=64,
+                        help='payload size of the raw router messages')
+    parser.add_argument('--subscriber-counts', default='1,10,100,1000',
+                        help='comma separated subscriber counts for the '
+                             'publish latency benchmark')
+    parser.add_argument('--latency-messages', type=int, default=100,
+                        help='messages published for each subscriber count')
+    parser.add_argument('--rpc-calls', type=int, default=2000,
+                        help='number of RPC round trips to time')
+    parser.add_argument('--registry', action='append', metavar='CSV',
+                        help='driver registry file sizing the throughput '
+                             'payload (default: fake6, fake18 and fake48)')
+    parser.add_argument('--subscribers', type=int, default=10,
+                        help='subscribers for the throughput benchmark')
+    parser.add_argument('--messages', type=int, default=2000,
+                        help='messages published for each registry file')
+    parser.add_argument('--output', metavar='FILE',
+                        help='write the JSON report to FILE instead of '
+                             'stdout')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='print the change from the JSON report in FILE')
+    args = parser.parse_args(argv[1:])
+
+    logging.basicConfig(level=logging.WARNING)
+    report = run_benchmarks(
+        router_messages=args.router_messages, router_size=args.router_size,
+        subscriber_counts=[int(count) for count in
+                           args.subscriber_counts.split(',')],
+        latency_messages=args.latency_messages, rpc_calls=args.rpc_calls,
+        registry_files=args.registry, subscribers=args.subscribers,
+        messages=args.messages)
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        sys.stderr.write('{:<50} {:>12} {:>12} {:>8}\n'.format(
+            'measurement', 'baseline', 'current', 'change'))
+        for name, old, new in compare(baseline, report):
+            change = (new - old) * 100.0 / old if old else 0.0
+            sys.stderr.write('{:<50} {:>12} {:>12} {:>7.1f}%\n'.format(
+                name, old, new, change))
+
+
+if __name__ == '__main__':
+    main()
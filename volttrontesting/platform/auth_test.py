@@ -228,3 +228,31 @@ def test_pubsub_unauthorized_regex2(volttron_instance_encrypt):
 def test_pubsub_authorized_regex2(volttron_instance_encrypt):
     pubsub_authorized(volttron_instance_encrypt,
                       topic='foo/bar', regex='/foo\/.*/')
+
+
+@pytest.mark.auth
+def test_ipc_peer_credentials_map_to_agent_user(tmpdir):
+    """Agents connecting over the process-credential ipc address get
+    the user ID authorized for their CURVE key."""
+    from volttron.platform.auth import AuthEntry, AuthService, load_user
+
+    keys = keystore.KeyStore(str(tmpdir.join('keystore.json')))
+    keys.generate()
+
+    class FakeAIP(object):
+        def agent_uuid_from_pid(self, pid):
+            return 'agent-uuid' if pid == 1234 else None
+
+        def get_agent_keystore(self, agent_uuid):
+            return keys
+
+    service = AuthService(str(tmpdir.join('auth.json')), FakeAIP(),
+                          address='inproc://vip', identity='auth-test',
+                          volttron_home=str(tmpdir))
+    service.auth_entries = [AuthEntry(credentials=keys.public,
+                                      user_id='listener')]
+    address = 'localhost:{}:{}:1234'.format(os.getuid(), os.getgid())
+    assert service.authenticate('vip', address, 'NULL', []) == 'listener'
+    service.auth_entries = []
+    user = service.authenticate('vip', address, 'NULL', [])
+    assert load_user(user)[2:] == ['AGENT', 'agent-uuid']
@@ -80,3 +80,21 @@ def test_can_get_publickey(volttron_instance):
     id_serverkey_map = cn.call('get_all_agent_publickeys')
     assert listener_identity in id_serverkey_map
     assert id_serverkey_map.get(listener_identity) is not None
+
+
+@pytest.mark.control
+def test_stats_report_router_metrics(volttron_instance):
+    agent = volttron_instance.build_agent()
+    agent.vip.rpc.call('control', 'stats.enable').get(timeout=2)
+    try:
+        for _ in range(5):
+            agent.vip.ping('', 'hello').get(timeout=2)
+        stats = agent.vip.rpc.call('control', 'stats.get').get(timeout=2)
+    finally:
+        agent.vip.rpc.call('control', 'stats.disable').get(timeout=2)
+    assert sum(stats['routing']['ping'].values()) >= 5
+    identity = agent.core.identity
+    assert stats['incoming']['bytes'][identity] > 0
+    assert stats['outgoing']['bytes'][identity] > 0
+    assert sorted(int(window) for window in stats['rates']) == [1, 10, 60]
+    assert stats['socket']['sndhwm'] > 0
@@ -92,6 +92,15 @@ def test_known_hosts_update_entry(known_hosts_instance1):
     assert known_hosts_instance1.serverkey(host_pair1['addr']) == new_key
 
 
+@pytest.mark.keystore
+def test_known_hosts_distinguishes_ipc_addresses(known_hosts_instance1):
+    host = known_hosts_instance1
+    host.add('ipc://@/home/volttron/run/vip.socket', 'curvekey')
+    assert host.serverkey(
+        'ipc://@/home/volttron/run/vip.socket?identity=a') == 'curvekey'
+    assert host.serverkey('ipc://@/home/volttron/run/vip.ipc') is None
+
+
 @pytest.mark.keystore
 def test_invalid_unicode_key(keystore_instance1):
     """
@@ -2,7 +2,9 @@ import logging
 import os
 import sys
 import tempfile
+import time
 
+import gevent
 import pytest
 
 from volttron.platform.aip import AIPplatform
@@ -65,3 +67,95 @@ def aip(request):
 #     auuid = aip.install_agent(wheel)
 #     assert auuid
 
+
+
+class TieredAIP(AIPplatform):
+    def __init__(self, priorities):
+        super(TieredAIP, self).__init__(None)
+        self.priorities = priorities
+        self.running = []
+        self.events = []
+
+    def list_agents(self):
+        return {agent_uuid: agent_uuid for agent_uuid in self.priorities}
+
+    def _agent_priority(self, agent_uuid):
+        return self.priorities[agent_uuid]
+
+    def start_agent(self, agent_uuid):
+        if agent_uuid == 'broken':
+            raise ValueError('cannot start')
+        self.running.append(agent_uuid)
+        self.events.append(('start', agent_uuid, len(self.running)))
+        gevent.sleep(0.05)
+        self.running.remove(agent_uuid)
+        self.events.append(('end', agent_uuid, len(self.running)))
+
+
+@pytest.mark.control
+def test_autostart_starts_tiers_concurrently():
+    aip = TieredAIP({'a1': '50', 'a2': '50', 'a3': '50', 'broken': '50',
+                     'b1': '10', 'b2': '10', 'disabled': None})
+    errors = aip.autostart(concurrency=2)
+    assert errors == [('broken', 'cannot start')]
+    starts = [agent_uuid for event, agent_uuid, _ in aip.events
+              if event == 'start']
+    assert sorted(starts[:3]) == ['a1', 'a2', 'a3']
+    assert sorted(starts[3:]) == ['b1', 'b2']
+    assert max(running for _, _, running in aip.events) == 2
+    # The second tier starts only after the first has finished starting.
+    ends = [i for i, event in enumerate(aip.events)
+            if event[:2] == ('end', 'a3')]
+    first_b = min(i for i, event in enumerate(aip.events)
+                  if event[1].startswith('b'))
+    assert ends[0] < first_b
+
+
+class ReadyAIP(TieredAIP):
+    """Starts agents by connecting test agents to a running platform."""
+
+    def __init__(self, instance, priorities, delays):
+        super(ReadyAIP, self).__init__(priorities)
+        self.instance = instance
+        self.delays = delays
+        self.connected = []
+
+    def agent_identity(self, agent_uuid):
+        return 'ready.' + agent_uuid
+
+    def start_agent(self, agent_uuid):
+        self.agents[agent_uuid] = type(
+            'ExecutionEnvironment', (object,), {'start_time': time.time()})
+        self.events.append(('start', agent_uuid))
+        delay = self.delays.get(agent_uuid)
+        if delay is not None:
+            gevent.spawn_later(delay, self._connect, agent_uuid)
+
+    def _connect(self, agent_uuid):
+        self.connected.append(self.instance.build_agent(
+            identity=self.agent_identity(agent_uuid)))
+        self.events.append(('connected', agent_uuid))
+
+    def _ready_agent(self):
+        return self.instance.build_agent(should_spawn=False)
+
+
+@pytest.mark.control
+def test_autostart_waits_for_tier_to_connect(volttron_instance):
+    aip = ReadyAIP(volttron_instance,
+                   {'fast': '50', 'slow': '50', 'next': '10', 'lost': '10'},
+                   {'fast': 0, 'slow': 1, 'next': 0})
+    try:
+        start = time.time()
+        assert aip.autostart(concurrency=4, ready_timeout=3) == []
+        elapsed = time.time() - start
+    finally:
+        for agent in aip.connected:
+            agent.core.stop()
+    # The second tier starts only once the first has connected.
+    assert aip.events.index(('connected', 'slow')) < aip.events.index(
+        ('start', 'next'))
+    assert aip.start_durations['slow'] >= 1
+    assert set(aip.start_durations) == {'fast', 'slow', 'next'}
+    # An agent that never connects delays startup by at most the timeout.
+    assert 3 <= elapsed < 10
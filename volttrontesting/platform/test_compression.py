@@ -0,0 +1,152 @@
+from errno import EMSGSIZE, EPROTO
+import zlib
+
+import gevent
+import pytest
+
+from volttron.platform.vip import socket as vip_socket
+from volttron.platform.vip.agent import Agent, RPC
+from volttron.platform.vip.socket import (
+    Address, DecompressionError, ZLIB_MAX_SIZE, ZLIB_PROTO, compress_frames,
+    decompress_frames)
+
+
+class EchoAgent(Agent):
+    @RPC.export
+    def echo(self, value):
+        return value
+
+
+@pytest.mark.zmq
+def test_address_compress_parameter():
+    assert Address('tcp://127.0.0.1:22916').compress is None
+    address = Address('tcp://127.0.0.1:22916?compress=1024')
+    assert address.compress == 1024
+    assert 'compress=1024' in str(address)
+
+
+@pytest.mark.zmq
+def test_frames_round_trip():
+    frames = [b'', b'{"jsonrpc": "2.0"}' * 100]
+    compressed = compress_frames(frames)
+    assert len(compressed[1]) < len(frames[1])
+    assert decompress_frames(compressed) == frames
+
+
+@pytest.mark.zmq
+def test_decompress_rejects_bad_and_oversized_frames():
+    with pytest.raises(DecompressionError) as info:
+        decompress_frames([b'not zlib data'])
+    assert info.value.errnum == EPROTO
+    bomb = zlib.compress(b'\0' * 10000)
+    assert len(decompress_frames([bomb], 10000)[0]) == 10000
+    with pytest.raises(DecompressionError) as info:
+        decompress_frames([bomb], 9999)
+    assert info.value.errnum == EMSGSIZE
+    # The limit applies to the total of all frames.
+    with pytest.raises(DecompressionError):
+        decompress_frames([bomb, bomb], 15000)
+
+
+@pytest.fixture
+def wire(monkeypatch):
+    '''Count messages sent and received in this process as VIP1z.'''
+    counts = {'sent': 0, 'received': 0}
+    compress, decompress = compress_frames, decompress_frames
+
+    def counting_compress(frames):
+        counts['sent'] += 1
+        return compress(frames)
+
+    def counting_decompress(frames, *args):
+        counts['received'] += 1
+        return decompress(frames, *args)
+
+    monkeypatch.setattr(vip_socket, 'compress_frames', counting_compress)
+    monkeypatch.setattr(vip_socket, 'decompress_frames', counting_decompress)
+    return counts
+
+
+def send_compressed(agent, peer, args):
+    '''Send args to peer as a VIP1z RPC message without compressing them.'''
+    sock = agent.core.socket
+    sock._Socket__local.proto = ZLIB_PROTO
+    try:
+        sock.send_multipart([peer, b'', b'bad', b'RPC'] + args)
+    finally:
+        sock._Socket__local.proto = b'VIP1'
+
+
+def collect_errors(agent):
+    errors = []
+    agent.core.onviperror.connect(
+        lambda sender, error, **kwargs: errors.append(error.errno))
+    return errors
+
+
+@pytest.mark.agent
+def test_compressed_connection(volttron_instance, wire):
+    echo = volttron_instance.build_agent(identity='echo',
+                                         agent_class=EchoAgent)
+    remote = volttron_instance.build_agent(
+        address=volttron_instance.vip_address + '?compress=100')
+    plain = volttron_instance.build_agent()
+    try:
+        assert remote.core.socket.compress_threshold == 100
+        assert plain.core.socket.compress_threshold is None
+        value = {'point{}'.format(i): i * 0.5 for i in range(200)}
+        # Requests and responses are compressed in both directions between
+        # the remote agent and the router, but not the local agents.
+        before = dict(wire)
+        assert remote.vip.rpc.call('echo', 'echo', value).get(
+            timeout=5) == value
+        assert wire['sent'] == before['sent'] + 1
+        assert wire['received'] > before['received']
+        assert remote.vip.rpc.call('echo', 'echo', 'small').get(
+            timeout=5) == 'small'
+        assert wire['sent'] == before['sent'] + 1
+        assert plain.vip.rpc.call('echo', 'echo', value).get(
+            timeout=5) == value
+    finally:
+        for agent in [echo, remote, plain]:
+            agent.core.stop()
+
+
+@pytest.mark.agent
+def test_router_rejects_bad_compressed_messages(volttron_instance):
+    echo = volttron_instance.build_agent(identity='echo',
+                                         agent_class=EchoAgent)
+    remote = volttron_instance.build_agent(
+        address=volttron_instance.vip_address + '?compress=100')
+    errors = collect_errors(remote)
+    try:
+        send_compressed(remote, b'echo', [b'not zlib data'])
+        send_compressed(remote, b'echo',
+                        [zlib.compress(b'\0' * (ZLIB_MAX_SIZE + 1))])
+        gevent.sleep(1)
+        assert errors == [EPROTO, EMSGSIZE]
+        # The router is still routing.
+        assert remote.vip.rpc.call('echo', 'echo', 1).get(timeout=5) == 1
+    finally:
+        echo.core.stop()
+        remote.core.stop()
+
+
+@pytest.mark.agent
+def test_agent_rejects_bad_compressed_messages(volttron_instance):
+    address = volttron_instance.vip_address + '?compress=100'
+    echo = volttron_instance.build_agent(identity='echo', address=address,
+                                         agent_class=EchoAgent)
+    echo.core.socket.max_decompressed_size = 1000
+    remote = volttron_instance.build_agent(address=address)
+    errors = collect_errors(remote)
+    try:
+        send_compressed(remote, b'echo', [b'not zlib data'])
+        send_compressed(remote, b'echo', [zlib.compress(b'\0' * 2000)])
+        gevent.sleep(1)
+        assert errors == [EPROTO, EMSGSIZE]
+        # The agent is still serving calls.
+        assert remote.vip.rpc.call('echo', 'echo', 1).get(timeout=5) == 1
+    finally:
+        echo.core.stop()
+        remote.core.stop()
@@ -0,0 +1,107 @@
+import time
+
+import gevent
+import greenlet
+import pytest
+
+from volttron.platform import jsonrpc
+from volttron.platform.jsonrpc import RemoteError
+from volttron.platform.vip.agent import blocking
+from volttron.platform.vip.agent.subsystems.health import (
+    HUB_MONITOR_CAPABILITY)
+
+
+@pytest.mark.agent
+def test_monitor_reports_blocking_greenlet():
+    monitor = blocking.monitor()
+    blocks = []
+    listener = lambda duration, stack: blocks.append((duration, stack))
+
+    def block_hub():
+        time.sleep(0.3)
+
+    monitor.add(listener, 0.1)
+    try:
+        gevent.sleep(0.05)
+        gevent.spawn(block_hub).join()
+        gevent.sleep(0.05)
+        # Yielding greenlets are not reported.
+        gevent.spawn(gevent.sleep, 0.3).join()
+        gevent.sleep(0.05)
+    finally:
+        monitor.remove(listener)
+    assert len(blocks) == 1
+    duration, stack = blocks[0]
+    assert 0.25 <= duration < 1
+    assert 'block_hub' in stack
+
+
+@pytest.mark.agent
+def test_health_counts_hub_blocks(volttron_instance):
+    agent = volttron_instance.build_agent()
+    caller = volttron_instance.build_agent(
+        capabilities=[HUB_MONITOR_CAPABILITY])
+    try:
+        caller.vip.rpc.call(agent.core.identity, 'health.monitor_hub_blocks',
+                            100).get(timeout=5)
+        gevent.sleep(0.05)
+        time.sleep(0.3)
+        gevent.sleep(0.05)
+        blocks = caller.vip.rpc.call(agent.core.identity,
+                                     'health.get_hub_blocks').get(timeout=5)
+        assert blocks['threshold_ms'] == 100
+        assert blocks['count'] >= 1
+        assert blocks['max_duration_ms'] >= 250
+        assert 'test_health_counts_hub_blocks' in blocks['last']['stack']
+    finally:
+        caller.core.stop()
+        agent.core.stop()
+    assert blocking.monitor().threshold is None
+
+
+@pytest.mark.agent
+def test_monitor_keeps_tracers_installed_after_it():
+    monitor = blocking.monitor()
+    original = greenlet.gettrace()
+    events = []
+    listener = lambda duration, stack: None
+
+    def tracer(event, args):
+        events.append(event)
+        chained(event, args)
+
+    monitor.add(listener, 0.1)
+    chained = greenlet.settrace(tracer)
+    try:
+        monitor.remove(listener)
+        # The later tracer stays installed and still reaches the monitor,
+        # which passes events on to the tracer before it.
+        assert greenlet.gettrace() is tracer
+        gevent.sleep(0)
+        assert 'switch' in events
+        monitor.add(listener, 0.1)
+        gevent.sleep(0)
+        monitor.remove(listener)
+        assert greenlet.gettrace() is tracer
+    finally:
+        greenlet.settrace(chained)
+    monitor.add(listener, 0.1)
+    monitor.remove(listener)
+    assert greenlet.gettrace() is original
+
+
+@pytest.mark.agent
+def test_monitor_hub_blocks_requires_capability(volttron_instance):
+    agent = volttron_instance.build_agent()
+    caller = volttron_instance.build_agent()
+    try:
+        with pytest.raises(RemoteError) as excinfo:
+            caller.vip.rpc.call(agent.core.identity,
+                                'health.monitor_hub_blocks',
+                                100).get(timeout=5)
+        assert excinfo.value.exc_info['exc_args'][0] == (
+            jsonrpc.UNAUTHORIZED)
+        assert blocking.monitor().threshold is None
+    finally:
+        caller.core.stop()
+        agent.core.stop()
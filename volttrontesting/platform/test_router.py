@@ -0,0 +1,99 @@
+import os
+
+import pytest
+import zmq
+
+from volttron.platform.vip.router import BaseRouter
+from volttron.platform.vip.socket import ZLIB_PROTO, compress_frames
+
+
+class FakeRouter(BaseRouter):
+    '''Router which fails to send to the peers in gone.'''
+
+    def __init__(self, gone):
+        super(FakeRouter, self).__init__()
+        self.gone = gone
+
+    def _send(self, frames):
+        peer = bytes(frames[0])
+        return [peer] if peer in self.gone else []
+
+
+@pytest.mark.zmq
+def test_drop_many_unreachable_peers():
+    peers = [str(i) for i in range(1500)]
+    router = FakeRouter(set(peers))
+    router._peers.update(peers)
+    router._drop_peer('0')
+    assert not router._peers
+
+
+@pytest.mark.zmq
+def test_add_peer_drops_unreachable_peers():
+    router = FakeRouter({'a'})
+    router._peers.update(['a', 'b'])
+    router._add_peer('c')
+    assert router._peers == {'b', 'c'}
+
+
+class LaneRouter(BaseRouter):
+    '''Router recording the MSG_ID of the messages it routes.'''
+
+    def __init__(self, count):
+        super(LaneRouter, self).__init__(context=zmq.Context())
+        self.count = count
+        self.routed = []
+
+    def setup(self):
+        self.socket.bind('inproc://lanes')
+
+    def _route(self, frames):
+        self.routed.append(frames[4].bytes)
+        if len(self.routed) == self.count:
+            raise KeyboardInterrupt()
+
+
+@pytest.mark.zmq
+def test_control_messages_preempt_bulk():
+    router = LaneRouter(5)
+    sock = router.context.socket(zmq.DEALER)
+    # Queue all messages before the router starts reading.
+    sock.connect('inproc://lanes')
+    for msg_id in [b'bulk.1', b'bulk.2', b'1', b'bulk.3', b'2']:
+        sock.send_multipart([b'peer', b'VIP1', b'', msg_id, b'RPC', b'{}'])
+    with pytest.raises(KeyboardInterrupt):
+        router.run()
+    assert router.routed == [b'1', b'2', b'bulk.1', b'bulk.2', b'bulk.3']
+    sock.close(0)
+    router.context.term()
+
+
+class UnreachableSocket(object):
+    '''Socket which fails to send to the peers in gone.'''
+
+    def __init__(self, gone):
+        self.gone = gone
+        self.sent = []
+
+    def send_multipart(self, frames, flags=0, copy=True):
+        if bytes(frames[0]) in self.gone:
+            raise zmq.ZMQError(zmq.EHOSTUNREACH)
+        self.sent.append([bytes(frame) for frame in frames])
+
+
+@pytest.mark.zmq
+@pytest.mark.parametrize('proto', [b'VIP1', ZLIB_PROTO])
+def test_unreachable_compressed_recipient_error(proto):
+    router = BaseRouter()
+    router.socket = UnreachableSocket({b'recipient'})
+    router._compress.update({b'sender': 1, b'recipient': 1})
+    args = [b'x' * 100]
+    if proto == ZLIB_PROTO:
+        args = compress_frames(args)
+    frames = [b'sender', b'recipient', proto, b'', b'1', b'RPC'] + args
+    router._route([zmq.Frame(frame) for frame in frames])
+    [reply] = router.socket.sent
+    assert reply[:6] == [b'sender', b'', b'VIP1', b'', b'1', b'error']
+    assert reply[6:] == [str(zmq.EHOSTUNREACH).encode('ascii'),
+                         os.strerror(zmq.EHOSTUNREACH),
+                         b'recipient', b'RPC']
@@ -0,0 +1,46 @@
+import tempfile
+import threading
+
+import gevent
+import pytest
+
+from volttron.platform.keystore import KeyStore
+from volttron.platform.main import spawn_service_thread
+from volttron.platform.vip.agent import Agent, RPC
+
+
+class ThreadAgent(Agent):
+    @RPC.export
+    def thread_name(self):
+        return threading.current_thread().name
+
+
+@pytest.mark.agent
+def test_service_runs_in_own_thread(volttron_instance):
+    keys = KeyStore(tempfile.mktemp('.keys', 'agent',
+                                    volttron_instance.volttron_home))
+    keys.generate()
+    # Only used to authorize the keys of the threaded agent.
+    volttron_instance.build_agent(should_spawn=False,
+                                  publickey=keys.public,
+                                  secretkey=keys.secret)
+
+    def factory():
+        return ThreadAgent(address=volttron_instance.vip_address,
+                           identity='threaded', publickey=keys.public,
+                           secretkey=keys.secret,
+                           serverkey=volttron_instance.serverkey,
+                           volttron_home=volttron_instance.volttron_home)
+
+    event = gevent.event.Event()
+    task = spawn_service_thread(factory, event)
+    assert event.wait(timeout=10)
+    agent = volttron_instance.build_agent()
+    name = agent.vip.rpc.call('threaded', 'thread_name').get(timeout=5)
+    assert name != threading.current_thread().name
+
+    task.kill(timeout=10)
+    assert task.ready()
+    gevent.sleep(0.5)
+    assert 'threaded' not in agent.vip.peerlist().get(timeout=5)
+    agent.core.stop()
@@ -0,0 +1,136 @@
+from datetime import timedelta
+import time
+
+import gevent
+import pytest
+
+from volttron.platform.agent.utils import get_aware_utc_now
+from volttron.platform.vip.agent.core import ScheduledEvent
+from volttron.platform.vip.agent.timerwheel import TimerWheel
+
+
+def record(fired, name):
+    return ScheduledEvent(lambda: fired.append((name, time.time())))
+
+
+@pytest.mark.agent
+def test_callbacks_fire_in_order_across_levels():
+    # Four slots per level, so most of these must move down levels.
+    wheel = TimerWheel(tick=0.005, bits=2, levels=3)
+    fired = []
+    start = time.time()
+    delays = [0.3, 0.01, 0.17, 0.05, 0.02, 0.25, 0.09]
+    for delay in delays:
+        wheel.add(start + delay, record(fired, delay))
+    assert len(wheel) == len(delays)
+    gevent.sleep(0.5)
+    assert [name for name, _ in fired] == sorted(delays)
+    for delay, at in fired:
+        assert at >= start + delay - wheel.tick
+    assert not len(wheel)
+    assert wheel.stats['fired'] == len(delays)
+    assert sum(wheel.stats['lag'].values()) == len(delays)
+
+
+@pytest.mark.agent
+def test_deadlines_beyond_the_top_level_are_kept():
+    wheel = TimerWheel(tick=0.001, bits=2, levels=2)
+    fired = []
+    wheel.add(time.time() + 0.1, record(fired, 'far'))
+    gevent.sleep(0.2)
+    assert [name for name, _ in fired] == ['far']
+
+
+@pytest.mark.agent
+def test_cancel_removes_callback():
+    wheel = TimerWheel(tick=0.005)
+    fired = []
+    event = record(fired, 'canceled')
+    event.wheel = wheel
+    wheel.add(time.time() + 0.05, event)
+    wheel.add(time.time() + 0.05, record(fired, 'kept'))
+    event.cancel()
+    assert len(wheel) == 1
+    gevent.sleep(0.2)
+    assert [name for name, _ in fired] == ['kept']
+
+
+@pytest.mark.agent
+def test_due_callbacks_share_bounded_workers():
+    wheel = TimerWheel(tick=0.005, workers=3)
+    running = []
+    peak = []
+
+    def work():
+        running.append(1)
+        peak.append(len(running))
+        gevent.sleep(0.01)
+        running.pop()
+
+    deadline = time.time() + 0.02
+    for _ in range(20):
+        wheel.add(deadline, ScheduledEvent(work))
+    gevent.sleep(0.3)
+    assert len(peak) == 20
+    assert max(peak) == 3
+
+
+@pytest.mark.agent
+def test_core_schedule_uses_timer_wheel(volttron_instance):
+    agent = volttron_instance.build_agent(should_spawn=False)
+    agent.core.timer_wheel = wheel = TimerWheel()
+    gevent.spawn(agent.core.run)
+    gevent.sleep(1)
+    try:
+        fired = []
+        soon = get_aware_utc_now() + timedelta(seconds=0.1)
+        agent.core.schedule(soon, fired.append, 'kept')
+        canceled = agent.core.schedule(soon, fired.append, 'canceled')
+        canceled.cancel()
+        gevent.sleep(0.3)
+        assert fired == ['kept']
+        agent.core.schedule(soon + timedelta(seconds=5), fired.append,
+                            'stopped')
+        assert len(wheel) == 1
+    finally:
+        agent.core.stop()
+    assert not len(wheel)
+
+
+@pytest.mark.agent
+def test_stopping_agent_kills_its_running_wheel_events(volttron_instance):
+    wheel = TimerWheel()
+    agents = []
+    for _ in range(2):
+        agent = volttron_instance.build_agent(should_spawn=False)
+        agent.core.timer_wheel = wheel
+        gevent.spawn(agent.core.run)
+        agents.append(agent)
+    gevent.sleep(1)
+    stopped, kept = agents
+    events = []
+
+    def run(name, seconds):
+        events.append(('start', name))
+        gevent.sleep(seconds)
+        events.append(('end', name))
+
+    try:
+        soon = get_aware_utc_now() + timedelta(seconds=0.1)
+        stopped.core.schedule(soon, run, 'stopped', 1)
+        kept.core.schedule(soon, run, 'kept', 0.5)
+        gevent.sleep(0.3)
+        assert sorted(events) == [('start', 'kept'), ('start', 'stopped')]
+        stopped.core.stop()
+        gevent.sleep(1)
+        # Only the stopped agent's callback is interrupted; the wheel's
+        # shared workers keep running the other agent's.
+        assert ('end', 'stopped') not in events
+        assert ('end', 'kept') in events
+        later = get_aware_utc_now() + timedelta(seconds=0.1)
+        kept.core.schedule(later, run, 'later', 0)
+        gevent.sleep(0.3)
+        assert ('end', 'later') in events
+    finally:
+        for agent in agents:
+            agent.core.stop()
@@ -0,0 +1,86 @@
+import pytest
+from zmq import EAGAIN, EHOSTUNREACH
+
+from volttron.platform.vip.router import (OUTGOING, INCOMING, UNROUTABLE,
+                                          ERROR)
+from volttron.platform.vip.tracking import Tracker, bucket
+
+
+def frames(sender, recipient, subsystem, *args):
+    return [sender, recipient, b'VIP1', b'user', b'id', subsystem] + list(args)
+
+
+@pytest.mark.zmq
+def test_bucket():
+    assert bucket(0) == 1
+    assert bucket(0.000001) == 2
+    assert bucket(0.0001) == 128
+    assert bucket(0.001) == 1024
+
+
+@pytest.mark.zmq
+def test_disabled_tracker_counts_nothing():
+    tracker = Tracker()
+    tracker.hit(INCOMING, frames(b'a', b'b', b'RPC'), None)
+    assert tracker.get_stats()['incoming']['peer'] == {}
+    assert 'rates' not in tracker.get_stats()
+
+
+@pytest.mark.zmq
+def test_routing_and_bytes():
+    tracker = Tracker()
+    tracker.enable()
+    message = frames(b'a', b'b', b'RPC', b'x' * 100)
+    tracker.hit(INCOMING, message, None)
+    tracker.hit(OUTGOING, frames(b'b', b'a', b'RPC', b'x' * 100), None)
+    stats = tracker.get_stats()
+    assert sum(stats['routing'][b'RPC'].values()) == 1
+    assert stats['incoming']['bytes'][b'a'] == len(b''.join(message))
+    assert stats['outgoing']['bytes'][b'b'] == len(b''.join(message))
+    assert stats['incoming']['peer'][b'a'] == 1
+    # An outgoing message without a preceding incoming one is not timed.
+    tracker.hit(OUTGOING, frames(b'b', b'a', b'RPC'), None)
+    assert sum(tracker.get_stats()['routing'][b'RPC'].values()) == 1
+
+
+@pytest.mark.zmq
+def test_blocked_and_unreachable_peers():
+    tracker = Tracker()
+    tracker.enable()
+    for errnum in [EAGAIN, EAGAIN, EHOSTUNREACH]:
+        error = (str(errnum).encode('ascii'), b'error')
+        tracker.hit(ERROR, frames(b'slow', b'a', b'pubsub'), error)
+    tracker.hit(UNROUTABLE, [b'a', b''], 'router probe')
+    stats = tracker.get_stats()
+    assert stats['blocked'] == {b'slow': 2}
+    assert stats['unreachable'] == {b'slow': 1}
+    assert stats['unroutable']['peer'] == {b'a': 1}
+
+
+@pytest.mark.zmq
+def test_rates_use_whole_seconds(monkeypatch):
+    tracker = Tracker()
+    tracker.enable()
+    now = [1000.5]
+    monkeypatch.setattr('volttron.platform.vip.tracking.time.time',
+                        lambda: now[0])
+    for _ in range(10):
+        tracker.hit(INCOMING, frames(b'a', b'b', b'RPC'), None)
+    # Messages in the current, partial second are not counted yet.
+    assert tracker.get_stats()['rates'][1] == 0
+    now[0] = 1001.2
+    rates = tracker.get_stats()['rates']
+    assert rates[1] == 10
+    assert rates[10] == 1
+    now[0] = 1100.0
+    assert tracker.get_stats()['rates'][60] == 0
+
+
+@pytest.mark.zmq
+def test_stats_copy_is_independent():
+    tracker = Tracker()
+    tracker.enable()
+    tracker.hit(INCOMING, frames(b'a', b'b', b'RPC'), None)
+    stats = tracker.get_stats()
+    tracker.hit(INCOMING, frames(b'a', b'b', b'RPC'), None)
+    assert stats['incoming']['peer'][b'a'] == 1
@@ -0,0 +1,109 @@
+import gevent
+import pytest
+
+from volttron.platform.agent.base_historian import BaseQueryHistorianAgent
+from volttron.platform.vip.agent.subsystems.channel import StreamError
+
+
+class MemoryHistorian(BaseQueryHistorianAgent):
+    stream_chunk_size = 10
+
+    def __init__(self, records, **kwargs):
+        super(MemoryHistorian, self).__init__(**kwargs)
+        self.records = records
+        self.pages = []
+
+    def version(self):
+        return '0.1'
+
+    def query_topic_list(self):
+        return ['sensor']
+
+    def query_topics_metadata(self, topics):
+        return {}
+
+    def query_historian(self, topic, start=None, end=None, agg_type=None,
+                        agg_period=None, skip=0, count=None, order=None):
+        self.pages.append((skip, count))
+        end = None if count is None else skip + count
+        return {'values': self.records[skip:end],
+                'metadata': {'units': 'F'}}
+
+
+@pytest.fixture
+def stream_agents(volttron_instance):
+    sender = volttron_instance.build_agent(identity='stream.sender',
+                                           enable_channel=True)
+    receiver = volttron_instance.build_agent(identity='stream.receiver',
+                                             enable_channel=True)
+    yield sender, receiver
+    sender.core.stop()
+    receiver.core.stop()
+
+
+@pytest.mark.subsystems
+def test_stream_delivers_items_in_order(stream_agents):
+    sender, receiver = stream_agents
+    items = receiver.vip.channel.receive_stream('stream.sender', 'items')
+    task = gevent.spawn(sender.vip.channel.send_stream, 'stream.receiver',
+                        'items', xrange(2500), chunk_size=100, window=4)
+    assert list(items) == range(2500)
+    assert task.get(timeout=5) == 2500
+
+
+@pytest.mark.subsystems
+def test_stream_sender_is_paced_by_receiver(stream_agents):
+    sender, receiver = stream_agents
+    produced = []
+
+    def generate():
+        for i in xrange(1000):
+            produced.append(i)
+            yield i
+
+    items = receiver.vip.channel.receive_stream('stream.sender', 'paced')
+    task = gevent.spawn(sender.vip.channel.send_stream, 'stream.receiver',
+                        'paced', generate(), chunk_size=10, window=2)
+    assert next(items) == 0
+    gevent.sleep(0.5)
+    # Only a window of chunks may be produced ahead of the consumer.
+    assert len(produced) <= 40
+    items.close()
+    assert task.get(timeout=5) < 1000
+
+
+@pytest.mark.subsystems
+def test_stream_error_is_raised_by_receiver(stream_agents):
+    sender, receiver = stream_agents
+
+    def generate():
+        yield 1
+        raise ValueError('broken source')
+
+    items = receiver.vip.channel.receive_stream('stream.sender', 'broken')
+    task = gevent.spawn(sender.vip.channel.send_stream, 'stream.receiver',
+                        'broken', generate())
+    with pytest.raises(StreamError):
+        list(items)
+    with pytest.raises(ValueError):
+        task.get(timeout=5)
+
+
+@pytest.mark.historian
+def test_historian_query_streams_pages(volttron_instance):
+    records = [['2016-01-01T00:00:%02d' % (i % 60), i] for i in range(95)]
+    historian = volttron_instance.build_agent(
+        identity='stream.historian', agent_class=MemoryHistorian,
+        records=records)
+    client = volttron_instance.build_agent(enable_channel=True)
+    try:
+        values = client.vip.channel.receive_stream('stream.historian')
+        result = client.vip.rpc.call('stream.historian', 'query', 'sensor',
+                                     skip=3, count=80,
+                                     stream=values.name).get(timeout=5)
+        assert result == {'metadata': {'units': 'F'}}
+        assert list(values) == records[3:83]
+        assert historian.pages == [(3 + i, 10) for i in range(0, 80, 10)]
+    finally:
+        historian.core.stop()
+        client.core.stop()
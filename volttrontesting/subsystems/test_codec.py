@@ -0,0 +1,82 @@
+import pytest
+
+from volttron.platform import jsonrpc
+from volttron.platform.vip import codec
+
+
+def scrape_push():
+    results = {'OutsideAirTemperature{}'.format(i): 50.0 + i / 3.0
+               for i in range(18)}
+    meta = {point: {'units': 'F', 'type': 'float', 'tz': 'US/Pacific'}
+            for point in results}
+    return jsonrpc.json_method(
+        None, 'pubsub.push',
+        ['platform.driver', '', 'devices/campus/building1/all',
+         {'Date': '2016-11-14T18:00:00.000000+00:00'}, [results, meta]],
+        None)
+
+
+def codecs():
+    names = codec.available()
+    assert names[-1] == b'json'
+    return [codec.get(name) for name in names]
+
+
+@pytest.mark.subsystems
+@pytest.mark.parametrize('peer_codec', codecs(), ids=lambda c: c.name)
+def test_codec_round_trip(peer_codec):
+    push = scrape_push()
+    data = peer_codec.dumps(push)
+    assert codec.detect(data) is peer_codec
+    assert peer_codec.loads(data) == push
+
+
+@pytest.mark.subsystems
+@pytest.mark.parametrize('peer_codec', codecs(), ids=lambda c: c.name)
+def test_codec_join_decodes_as_batch(peer_codec):
+    pushes = [jsonrpc.json_method(None, 'pubsub.push', [i], None)
+              for i in range(20)]
+    data = peer_codec.join([peer_codec.dumps(push) for push in pushes])
+    assert codec.detect(data) is peer_codec
+    assert peer_codec.loads(data) == pushes
+
+
+@pytest.mark.subsystems
+def test_negotiate_falls_back_to_json():
+    assert codec.negotiate([]) is codec.JSON
+    assert codec.negotiate([b'json']) is codec.JSON
+    assert codec.negotiate(codec.available()) is codecs()[0]
+
+
+def typed(obj):
+    '''Return obj with each value paired with its type for comparison.'''
+    if isinstance(obj, dict):
+        return {typed(key): typed(value) for key, value in obj.iteritems()}
+    if isinstance(obj, list):
+        return [typed(value) for value in obj]
+    return type(obj), obj
+
+
+PAYLOADS = [
+    {1: 'a', 2.5: 'b', True: 'c', None: 'd'},
+    {'unicode': u'caf\xe9', 'utf8': 'caf\xc3\xa9', 'ascii': u'cafe'},
+    {'big': 2 ** 70, 'negative': -2 ** 70},
+    [('tuple', 1), {'nested': {3: [u'x', 'y']}}],
+]
+
+
+@pytest.mark.subsystems
+@pytest.mark.parametrize('peer_codec', codecs(), ids=lambda c: c.name)
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_codecs_decode_identical_objects(peer_codec, payload):
+    expected = typed(codec.JSON.loads(codec.JSON.dumps(payload)))
+    data = peer_codec.dumps(payload)
+    assert typed(codec.detect(data).loads(data)) == expected
+
+
+@pytest.mark.subsystems
+@pytest.mark.parametrize('peer_codec', codecs(), ids=lambda c: c.name)
+def test_codec_join_with_unpackable_object(peer_codec):
+    objects = [{'small': 1}, {'big': 2 ** 70}]
+    data = peer_codec.join([peer_codec.dumps(obj) for obj in objects])
+    assert codec.detect(data).loads(data) == objects
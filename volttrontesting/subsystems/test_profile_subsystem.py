@@ -0,0 +1,72 @@
+import time
+
+import gevent
+import pytest
+
+from volttron.platform import jsonrpc
+from volttron.platform.jsonrpc import RemoteError
+from volttron.platform.vip.agent.subsystems.profile import (
+    MAX_INTERVAL, MIN_INTERVAL, PROFILE_CAPABILITY)
+
+
+def spin(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+@pytest.mark.subsystems
+def test_profile_samples_running_greenlets(volttron_instance):
+    agent = volttron_instance.build_agent()
+    caller = volttron_instance.build_agent(capabilities=[PROFILE_CAPABILITY])
+    try:
+        caller.vip.rpc.call(agent.core.identity, 'profile.start',
+                            0.002).get(timeout=5)
+        gevent.spawn(spin, 0.3).join()
+        profile = caller.vip.rpc.call(agent.core.identity,
+                                      'profile.stop').get(timeout=5)
+        assert profile['samples'] == sum(profile['stacks'].values())
+        assert profile['samples'] > 50
+        spinning = sum(count for stack, count in profile['stacks'].items()
+                       if stack.endswith(__name__ + '.spin'))
+        assert spinning > 50
+        for snapshot in profile['snapshots'].values():
+            assert snapshot['total_objects'] > 0
+            assert snapshot['max_rss_kb'] > 0
+            assert snapshot['objects']
+        with pytest.raises(RemoteError):
+            caller.vip.rpc.call(agent.core.identity,
+                                'profile.stop').get(timeout=5)
+    finally:
+        caller.core.stop()
+        agent.core.stop()
+
+
+@pytest.mark.subsystems
+@pytest.mark.parametrize('interval', [0, -1, MIN_INTERVAL / 2,
+                                      MAX_INTERVAL * 2])
+def test_profile_rejects_bad_intervals(volttron_instance, interval):
+    agent = volttron_instance.build_agent()
+    try:
+        with pytest.raises(ValueError):
+            agent.vip.profile.start(interval)
+        assert agent.vip.profile.interval is None
+    finally:
+        agent.core.stop()
+
+
+@pytest.mark.subsystems
+def test_profile_requires_capability(volttron_instance):
+    agent = volttron_instance.build_agent()
+    caller = volttron_instance.build_agent()
+    try:
+        for method in ['profile.start', 'profile.stop']:
+            with pytest.raises(RemoteError) as excinfo:
+                caller.vip.rpc.call(agent.core.identity,
+                                    method).get(timeout=5)
+            assert excinfo.value.exc_info['exc_args'][0] == (
+                jsonrpc.UNAUTHORIZED)
+        assert agent.vip.profile.interval is None
+    finally:
+        caller.core.stop()
+        agent.core.stop()
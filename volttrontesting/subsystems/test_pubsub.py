@@ -0,0 +1,570 @@
+import errno
+import random
+
+import gevent
+import pytest
+from zmq import green as zmq
+
+from volttron.platform.vip.agent.subsystems.pubsub import (
+    LastValueCache, SubscriberQueue, SubscriptionTrie, _make_options,
+    _merge_options, _project_points, topic_matches)
+from volttron.platform.vip.socket import is_bulk
+from volttrontesting.utils.utils import poll_gevent_sleep
+
+
+def brute_force_match(subscriptions, topic):
+    subscribers = set()
+    for prefix, peers in subscriptions.iteritems():
+        if topic.startswith(prefix):
+            subscribers |= peers
+    return subscribers
+
+
+@pytest.mark.subsystems
+def test_trie_matches_prefixes():
+    trie = SubscriptionTrie()
+    trie[''] = {'all'}
+    trie['devices'] = {'devices'}
+    trie['devices/'] = {'devices/'}
+    trie['devices/campus/bui'] = {'partial'}
+    trie['devices/campus/building1/'] = {'building1'}
+    trie['analysis/'] = {'analysis'}
+
+    assert trie.match('devices/campus/building1/all') == {
+        'all', 'devices', 'devices/', 'partial', 'building1'}
+    assert trie.match('devices/campus/building2/all') == {
+        'all', 'devices', 'devices/', 'partial'}
+    assert trie.match('devices') == {'all', 'devices'}
+    assert trie.match('devicesX/foo') == {'all', 'devices'}
+    assert trie.match('heartbeat/agent') == {'all'}
+
+
+@pytest.mark.subsystems
+def test_trie_removal_prunes_nodes():
+    trie = SubscriptionTrie()
+    trie['devices/campus/building1/'] = {'a'}
+    trie['devices/campus/'] = {'b'}
+    assert len(trie) == 2
+    del trie['devices/campus/building1/']
+    assert 'devices/campus/building1/' not in trie
+    assert trie.match('devices/campus/building1/all') == {'b'}
+    assert trie.pop('devices/campus/') == {'b'}
+    assert trie.match('devices/campus/building1/all') == set()
+    assert not trie._root.children
+    with pytest.raises(KeyError):
+        trie.pop('devices/campus/')
+    assert trie.pop('devices/campus/', None) is None
+
+
+@pytest.mark.subsystems
+def test_trie_agrees_with_startswith():
+    rand = random.Random(0)
+    segments = ['devices', 'dev', 'campus', 'c', 'building1', 'all', '']
+
+    def make_topic():
+        return '/'.join(rand.choice(segments)
+                        for _ in range(rand.randint(1, 5)))
+
+    trie = SubscriptionTrie()
+    subscriptions = {}
+    for i in range(200):
+        prefix = make_topic()[:rand.randint(0, 30)]
+        trie[prefix] = subscriptions[prefix] = {i}
+    for prefix in rand.sample(sorted(subscriptions), 50):
+        del trie[prefix]
+        del subscriptions[prefix]
+    for _ in range(500):
+        topic = make_topic()
+        assert trie.match(topic) == brute_force_match(subscriptions, topic)
+
+
+@pytest.mark.subsystems
+@pytest.mark.parametrize('pattern, topic, expected', [
+    ('devices/campus/+/ahu*/all', 'devices/campus/b1/ahu2/all', True),
+    ('devices/campus/+/ahu*/all', 'devices/campus/b1/rtu2/all', False),
+    ('devices/campus/+/ahu*/all', 'devices/campus/b1/x/ahu2/all', False),
+    ('devices/campus/+/ahu*/all', 'devices/campus/b1/ahu2/all/x', False),
+    ('devices/campus/#', 'devices/campus', True),
+    ('devices/campus/#', 'devices/campus/b1/ahu2/all', True),
+    ('devices/campus/#', 'devices/campusx', False),
+    ('devices/ahu[12]/all', 'devices/ahu1/all', True),
+    ('devices/ahu[!12]/all', 'devices/ahu3/all', True),
+    ('devices/ahu[!12]/all', 'devices/ahu1/all', False),
+    ('devices/ahu?/all', 'devices/ahu/all', False),
+    ('+/all', 'devices/all', True),
+    ('#', 'devices/campus/all', True),
+])
+def test_wildcard_patterns(pattern, topic, expected):
+    assert topic_matches(pattern, topic) == expected
+    trie = SubscriptionTrie()
+    trie[pattern] = {1}
+    assert trie.match(topic) == ({1} if expected else set())
+    assert list(trie.iter_matches(topic)) == (
+        [(pattern, {1})] if expected else [])
+
+
+@pytest.mark.subsystems
+def test_trie_wildcards_agree_with_brute_force():
+    rand = random.Random(0)
+    segments = ['devices', 'campus', 'ahu1', 'ahu2', 'all']
+    wildcards = ['+', 'ahu*', 'ahu[2]', '?ll']
+
+    def make_topic():
+        return '/'.join(rand.choice(segments)
+                        for _ in range(rand.randint(1, 5)))
+
+    trie = SubscriptionTrie()
+    subscriptions = {}
+    for i in range(200):
+        pattern = [rand.choice(segments + wildcards)
+                   for _ in range(rand.randint(1, 4))]
+        if rand.random() < 0.3:
+            pattern.append('#')
+        pattern = '/'.join(pattern)
+        trie[pattern] = subscriptions[pattern] = {i}
+    for pattern in rand.sample(sorted(subscriptions), 50):
+        del trie[pattern]
+        del subscriptions[pattern]
+    for _ in range(500):
+        topic = make_topic()
+        expected = set()
+        for pattern, subscribers in subscriptions.items():
+            if topic_matches(pattern, topic):
+                expected |= subscribers
+        assert trie.match(topic) == expected
+
+
+@pytest.mark.subsystems
+def test_trie_rejects_misplaced_multilevel_wildcard():
+    trie = SubscriptionTrie()
+    with pytest.raises(ValueError):
+        trie['devices/#/all'] = {1}
+    assert 'devices/#/all' not in trie
+
+
+@pytest.mark.subsystems
+def test_trie_iter_matches_yields_prefixes():
+    trie = SubscriptionTrie()
+    for prefix in ['', 'dev', 'devices/', 'devices/campus/b', 'other']:
+        trie[prefix] = {prefix}
+    assert sorted(trie.iter_matches('devices/campus/building1')) == [
+        ('', {''}), ('dev', {'dev'}), ('devices/', {'devices/'}),
+        ('devices/campus/b', {'devices/campus/b'})]
+
+
+@pytest.mark.subsystems
+def test_publish_reaches_prefix_subscribers(volttron_instance):
+    publisher = volttron_instance.build_agent()
+    subscriber = volttron_instance.build_agent()
+    received = []
+
+    def callback(peer, sender, bus, topic, headers, message):
+        received.append((topic, message))
+
+    subscriber.vip.pubsub.subscribe(
+        'pubsub', 'devices/campus/bui', callback).get(timeout=5)
+    gevent.sleep(0.5)
+    publisher.vip.pubsub.publish(
+        'pubsub', 'devices/campus/building1/all', message=1).get(timeout=5)
+    publisher.vip.pubsub.publish(
+        'pubsub', 'devices/campus/other/all', message=2).get(timeout=5)
+    assert poll_gevent_sleep(5, lambda: received)
+    gevent.sleep(0.5)
+    assert received == [('devices/campus/building1/all', 1)]
+    publisher.core.stop()
+    subscriber.core.stop()
+
+
+@pytest.mark.subsystems
+def test_publish_many_batches_pushes(volttron_instance):
+    publisher = volttron_instance.build_agent()
+    subscriber = volttron_instance.build_agent()
+    received = []
+
+    def callback(peer, sender, bus, topic, headers, message):
+        received.append((topic, headers['Date'], message))
+
+    subscriber.vip.pubsub.subscribe(
+        'pubsub', 'devices/campus/', callback).get(timeout=5)
+    gevent.sleep(0.5)
+    headers = {'Date': 'now'}
+    messages = [('devices/campus/building1/point{}'.format(i), headers, i)
+                for i in range(5)]
+    messages.append(('analysis/campus/building1/all', headers, 5))
+    count = publisher.vip.pubsub.publish_many(
+        'pubsub', messages).get(timeout=5)
+    assert count == 5
+    assert poll_gevent_sleep(5, lambda: len(received) == 5)
+    assert received == [('devices/campus/building1/point{}'.format(i),
+                         'now', i) for i in range(5)]
+    publisher.core.stop()
+    subscriber.core.stop()
+
+
+@pytest.mark.subsystems
+def test_bulk_publish_pushes_in_bulk_lane(volttron_instance):
+    publisher = volttron_instance.build_agent()
+    subscriber = volttron_instance.build_agent()
+    received = []
+
+    def callback(peer, sender, bus, topic, headers, message):
+        msg_id = bytes(subscriber.vip.rpc.context.vip_message.id)
+        received.append((topic, msg_id))
+
+    subscriber.vip.pubsub.subscribe(
+        'pubsub', 'devices/campus/', callback).get(timeout=5)
+    gevent.sleep(0.5)
+    messages = [('devices/campus/building1/all', {}, 1)]
+    assert publisher.vip.pubsub.publish_many(
+        'pubsub', messages, bulk=True).get(timeout=5) == 1
+    publisher.vip.pubsub.publish(
+        'pubsub', 'devices/campus/building2/all', message=2).get(timeout=5)
+    assert poll_gevent_sleep(5, lambda: len(received) == 2)
+    assert sorted((topic, is_bulk(msg_id)) for topic, msg_id in received) == [
+        ('devices/campus/building1/all', True),
+        ('devices/campus/building2/all', False)]
+    publisher.core.stop()
+    subscriber.core.stop()
+
+
+@pytest.mark.subsystems
+def test_last_value_cache_is_bounded_and_filtered():
+    cache = LastValueCache(2, ['devices/'])
+    cache.update('', 'analysis/campus/all', 'a', {}, 0)
+    cache.update('', 'devices/campus/b1/all', 'a', {}, 1)
+    cache.update('', 'devices/campus/b2/all', 'a', {}, 2)
+    cache.update('', 'devices/campus/b1/all', 'a', {}, 3)
+    assert sorted(cache.get('devices/')) == [
+        ('a', 'devices/campus/b1/all', {}, 3),
+        ('a', 'devices/campus/b2/all', {}, 2)]
+    cache.update('', 'devices/campus/b3/all', 'a', {}, 4)
+    assert len(cache) == 2
+    assert cache.get('devices/campus/b2') == []
+    assert cache.get('analysis') == []
+    assert cache.get('devices/', bus='other') == []
+
+
+@pytest.mark.subsystems
+def test_subscriber_queue_waits_for_credit():
+    queue = SubscriberQueue(10, 'drop-oldest', 3)
+    for i in range(5):
+        queue.put(i)
+    assert queue.get() == [0, 1, 2]
+    assert len(queue) == 2
+    assert gevent.spawn(queue.get).join(0.1) is None
+    queue.ack(1)
+    assert queue.get() == [3]
+    assert queue.stats() == {'depth': 1, 'dropped': 0, 'conflated': 0,
+                             'undelivered': 0, 'expired': 0,
+                             'outstanding': 3, 'window': 3}
+
+
+@pytest.mark.subsystems
+@pytest.mark.parametrize('overflow, expected', [
+    ('drop-oldest', [2, 3, 4]),
+    ('drop-newest', [0, 1, 2]),
+])
+def test_subscriber_queue_overflow_drops(overflow, expected):
+    queue = SubscriberQueue(3, overflow, 10)
+    for i in range(5):
+        queue.put(i)
+    assert queue.dropped == 2
+    assert queue.get() == expected
+
+
+@pytest.mark.subsystems
+def test_subscriber_queue_overflow_blocks():
+    queue = SubscriberQueue(2, 'block', 10)
+    queue.put(0)
+    queue.put(1)
+    putter = gevent.spawn(queue.put, 2)
+    gevent.sleep(0.1)
+    assert not putter.ready()
+    assert queue.get() == [0, 1]
+    putter.join(1)
+    assert putter.ready()
+    assert queue.get() == [2]
+
+
+@pytest.mark.subsystems
+def test_snapshot_subscribe_to_prefix_list(volttron_instance):
+    owner = volttron_instance.build_agent(identity='snapshot.owner')
+    owner.vip.pubsub.add_bus('')
+    owner.vip.pubsub.last_values = LastValueCache(10)
+    publisher = volttron_instance.build_agent()
+    subscriber = volttron_instance.build_agent()
+    for topic in ['devices/campus/b1/all', 'analysis/campus/b1/all',
+                  'record/campus']:
+        publisher.vip.pubsub.publish(
+            'snapshot.owner', topic, message=topic).get(timeout=5)
+    received = []
+
+    def callback(peer, sender, bus, topic, headers, message):
+        received.append(message)
+
+    subscriber.vip.pubsub.subscribe(
+        'snapshot.owner', ['devices/', 'devices/campus/', 'analysis/'],
+        callback, snapshot=True).get(timeout=5)
+    assert sorted(received) == [
+        'analysis/campus/b1/all', 'devices/campus/b1/all']
+    publisher.core.stop()
+    subscriber.core.stop()
+    owner.core.stop()
+
+
+@pytest.mark.subsystems
+def test_platform_flow_control_is_opt_in(volttron_instance):
+    subscriber = volttron_instance.build_agent(identity='flow.default')
+    subscriber.vip.pubsub.subscribe(
+        'pubsub', 'devices/campus/', lambda *args: None).get(timeout=5)
+    gevent.sleep(0.5)
+    stats = subscriber.vip.rpc.call(
+        'pubsub', 'pubsub.queue_stats').get(timeout=5)
+    assert 'flow.default' not in stats
+    subscriber.core.stop()
+
+
+@pytest.mark.subsystems
+def test_flow_controlled_subscriber_queue_stats(volttron_instance):
+    owner = volttron_instance.build_agent(identity='flow.stats.owner')
+    owner.vip.pubsub.add_bus('')
+    owner.vip.pubsub.queue_size = 100
+    publisher = volttron_instance.build_agent()
+    subscriber = volttron_instance.build_agent(identity='flow_subscriber')
+    received = []
+
+    def callback(peer, sender, bus, topic, headers, message):
+        received.append(message)
+
+    subscriber.vip.pubsub.subscribe(
+        'flow.stats.owner', 'devices/campus/', callback).get(timeout=5)
+    gevent.sleep(0.5)
+    messages = [('devices/campus/building1/point', {}, i) for i in range(10)]
+    publisher.vip.pubsub.publish_many(
+        'flow.stats.owner', messages).get(timeout=5)
+    assert poll_gevent_sleep(5, lambda: len(received) == 10)
+    assert received == range(10)
+    stats = publisher.vip.rpc.call(
+        'flow.stats.owner', 'pubsub.queue_stats').get(timeout=5)
+    assert stats['flow_subscriber'] == {
+        'depth': 0, 'dropped': 0, 'conflated': 0, 'undelivered': 0,
+        'expired': 0, 'outstanding': 10,
+        'window': subscriber.vip.pubsub.flow_window}
+    publisher.core.stop()
+    subscriber.core.stop()
+    owner.core.stop()
+
+
+@pytest.mark.subsystems
+def test_subscriber_queue_conflates_pending_pushes():
+    queue = SubscriberQueue(10, 'drop-oldest', 1)
+    queue.put('a1', 'a')
+    queue.put('b1')
+    queue.put('a2', 'a')
+    queue.put('b2')
+    assert len(queue) == 3
+    assert queue.conflated == 1
+    assert queue.get() == ['a2']
+    queue.put('a3', 'a')
+    for expected in ['b1', 'b2', 'a3']:
+        queue.ack(1)
+        assert queue.get() == [expected]
+
+
+@pytest.mark.subsystems
+def test_subscriber_queue_returns_undelivered_credit():
+    queue = SubscriberQueue(10, 'drop-oldest', 2)
+    for i in range(4):
+        queue.put(i)
+    assert queue.get() == [0, 1]
+    queue.undeliver(2)
+    assert queue.get() == [2, 3]
+    assert queue.undelivered == 2
+
+
+@pytest.mark.subsystems
+def test_subscriber_queue_expires_unacked_credit():
+    queue = SubscriberQueue(10, 'drop-oldest', 2, credit_timeout=0.1)
+    for i in range(3):
+        queue.put(i)
+    assert queue.get() == [0, 1]
+    assert gevent.spawn(queue.get).get(timeout=1) == [2]
+    assert queue.expired == 2
+
+
+@pytest.fixture
+def flow_owner(volttron_instance):
+    '''Bus owner whose pushes to 'flow.dropped' are dropped on request.'''
+    owner = volttron_instance.build_agent(identity='flow.owner')
+    owner.vip.pubsub.add_bus('')
+    owner.vip.pubsub.queue_size = 100
+    subscriber = volttron_instance.build_agent(identity='flow.dropped')
+    subscriber.vip.pubsub.flow_window = 4
+    received = []
+
+    def callback(peer, sender, bus, topic, headers, message):
+        received.append(message)
+
+    subscriber.vip.pubsub.subscribe(
+        'flow.owner', 'devices/', callback).get(timeout=5)
+    pubsub = owner.vip.pubsub
+    assert poll_gevent_sleep(5, lambda: 'flow.dropped' in pubsub._queues)
+    send_pushes = pubsub._send_pushes
+    sent = []
+
+    def publish(start, stop, drop=None):
+        def dropping(subscriber, peer_codec, datas, msg_id=b''):
+            sent.append(msg_id)
+            return drop(len(datas), msg_id)
+        pubsub._send_pushes = send_pushes if drop is None else dropping
+        try:
+            pubsub._distribute_many('flow.owner', [
+                ('devices/x', {}, i) for i in range(start, stop)])
+            gevent.sleep(0.2)
+        finally:
+            pubsub._send_pushes = send_pushes
+
+    yield publish, received, sent, pubsub._queues['flow.dropped']
+    subscriber.core.stop()
+    owner.core.stop()
+
+
+@pytest.mark.subsystems
+def test_failed_push_sends_return_credit(flow_owner):
+    publish, received, _, queue = flow_owner
+
+    def fail(count, msg_id):
+        raise zmq.ZMQError(errno.EAGAIN)
+
+    publish(0, 4, fail)
+    publish(4, 8)
+    assert poll_gevent_sleep(5, lambda: received == [4, 5, 6, 7])
+    assert queue.undelivered == 4
+
+
+@pytest.mark.subsystems
+def test_pushes_dropped_by_router_return_credit(volttron_instance,
+                                                 flow_owner):
+    publish, received, sent, queue = flow_owner
+    # Lose the pushes on the way, then report it as the router does.
+    publish(0, 4, lambda count, msg_id: None)
+    assert len(sent) == 1
+    router = volttron_instance.build_agent()
+    try:
+        router.core.socket.send_vip(
+            'flow.owner', b'error',
+            [str(errno.EAGAIN), 'Resource temporarily unavailable',
+             'flow.dropped', b'RPC'], msg_id=sent[0])
+        assert poll_gevent_sleep(5, lambda: queue.undelivered == 4)
+    finally:
+        router.core.stop()
+    publish(4, 8)
+    assert poll_gevent_sleep(5, lambda: received == [4, 5, 6, 7])
+
+
+@pytest.mark.subsystems
+def test_conflated_subscriber_gets_newest_pending(volttron_instance):
+    owner = volttron_instance.build_agent(identity='flow.conflate.owner')
+    owner.vip.pubsub.add_bus('')
+    owner.vip.pubsub.queue_size = 100
+    publisher = volttron_instance.build_agent()
+    lossless = volttron_instance.build_agent()
+    conflated = volttron_instance.build_agent()
+    conflated.vip.pubsub.flow_window = 1
+    received = {lossless: [], conflated: []}
+
+    def callback(agent):
+        def receive(peer, sender, bus, topic, headers, message):
+            received[agent].append(message)
+        return receive
+
+    lossless.vip.pubsub.subscribe(
+        'flow.conflate.owner', 'devices/campus/', callback(lossless)).get(timeout=5)
+    conflated.vip.pubsub.subscribe(
+        'flow.conflate.owner', 'devices/campus/', callback(conflated),
+        conflate=True).get(timeout=5)
+    gevent.sleep(0.5)
+    messages = [('devices/campus/building1/all', {}, i) for i in range(10)]
+    publisher.vip.pubsub.publish_many(
+        'flow.conflate.owner', messages).get(timeout=5)
+    assert poll_gevent_sleep(5, lambda: len(received[lossless]) == 10)
+    gevent.sleep(0.5)
+    assert received[lossless] == range(10)
+    assert received[conflated] == [9]
+    publisher.core.stop()
+    lossless.core.stop()
+    conflated.core.stop()
+    owner.core.stop()
+
+
+@pytest.mark.subsystems
+def test_project_points_strips_device_all_messages():
+    message = [{'ZoneTemp': 72.5, 'SupplyFan': 1, 'Damper': 30},
+               {'ZoneTemp': {'units': 'F'}, 'Damper': {'units': '%'}}]
+    points = frozenset(['ZoneTemp', 'SupplyFan'])
+    assert _project_points('devices/campus/rtu1/all', message, points) == [
+        {'ZoneTemp': 72.5, 'SupplyFan': 1}, {'ZoneTemp': {'units': 'F'}}]
+    assert _project_points(
+        'devices/campus/rtu1/Damper', message, points) is message
+
+
+@pytest.mark.subsystems
+def test_merged_options_widen_point_projection():
+    a = _make_options(points=['ZoneTemp'])
+    b = _make_options(points=['SupplyFan'], conflate=True)
+    assert _merge_options(a, b) == {
+        'conflate': False, 'points': frozenset(['ZoneTemp', 'SupplyFan'])}
+    assert _merge_options(a, None) is None
+    assert _merge_options(a, _make_options(conflate=True)) is None
+
+
+@pytest.mark.subsystems
+def test_point_projected_subscription(volttron_instance):
+    publisher = volttron_instance.build_agent()
+    subscriber = volttron_instance.build_agent()
+    received = []
+
+    def callback(point):
+        def receive(peer, sender, bus, topic, headers, message):
+            received.append(message)
+        return receive
+
+    for point in ['ZoneTemp', 'SupplyFan']:
+        subscriber.vip.pubsub.subscribe(
+            'pubsub', 'devices/campus/rtu1/all', callback(point),
+            points=[point]).get(timeout=5)
+    gevent.sleep(0.5)
+    publisher.vip.pubsub.publish(
+        'pubsub', 'devices/campus/rtu1/all', {},
+        [{'ZoneTemp': 72.5, 'SupplyFan': 1, 'Damper': 30},
+         {'ZoneTemp': {'units': 'F'}, 'Damper': {'units': '%'}}]
+    ).get(timeout=5)
+    assert poll_gevent_sleep(5, lambda: len(received) == 2)
+    assert received[0] == [{'ZoneTemp': 72.5, 'SupplyFan': 1},
+                           {'ZoneTemp': {'units': 'F'}}]
+    publisher.core.stop()
+    subscriber.core.stop()
+
+
+@pytest.mark.subsystems
+def test_wildcard_subscription_filters_on_service(volttron_instance):
+    publisher = volttron_instance.build_agent()
+    subscriber = volttron_instance.build_agent()
+    received = []
+
+    def receive(peer, sender, bus, topic, headers, message):
+        received.append(topic)
+
+    subscriber.vip.pubsub.subscribe(
+        'pubsub', 'devices/campus/+/ahu*/all', receive).get(timeout=5)
+    gevent.sleep(0.5)
+    topics = ['devices/campus/b1/ahu1/all', 'devices/campus/b1/rtu1/all',
+              'devices/campus/b2/ahu2/all', 'devices/campus/b2/ahu2/Fan']
+    publisher.vip.pubsub.publish_many(
+        'pubsub', [(topic, {}, 0) for topic in topics]).get(timeout=5)
+    assert poll_gevent_sleep(5, lambda: len(received) == 2)
+    gevent.sleep(0.5)
+    assert received == ['devices/campus/b1/ahu1/all',
+                        'devices/campus/b2/ahu2/all']
+    publisher.core.stop()
+    subscriber.core.stop()
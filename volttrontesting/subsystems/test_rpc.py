@@ -0,0 +1,347 @@
+import os
+import time
+
+import gevent
+import pytest
+
+from volttron.platform import jsonrpc
+from volttron.platform.jsonrpc import RemoteError
+from volttron.platform.vip import codec
+from volttron.platform.vip.agent import Agent, Core, RPC
+from volttron.platform.vip.agent.errors import Again
+from volttron.platform.vip.agent.subsystems.rpc import Dispatcher
+
+
+class Callee(Agent):
+    def __init__(self, **kwargs):
+        super(Callee, self).__init__(**kwargs)
+        self.messages = []
+        self.finished = False
+
+    @RPC.export
+    def echo(self, value):
+        self.messages.append(bytes(self.vip.rpc.context.vip_message.id))
+        return value
+
+    @RPC.export
+    def fail(self):
+        raise ValueError('failed')
+
+    @RPC.export
+    def slow(self, seconds):
+        gevent.sleep(seconds)
+        self.finished = True
+
+    @RPC.export
+    def deadline(self):
+        return self.vip.rpc.context.deadline
+
+    @RPC.export
+    def forward_deadline(self, peer):
+        return self.vip.rpc.call(peer, 'deadline').get(timeout=5)
+
+    @RPC.export
+    def forward_echo(self, peer, value):
+        return self.vip.rpc.call(peer, 'echo', value).get(timeout=5)
+
+    @RPC.export(executor='thread', max_workers=2)
+    def blocking(self, seconds):
+        time.sleep(seconds)
+        return seconds
+
+    @staticmethod
+    @RPC.export(executor='process')
+    def pid():
+        return os.getpid()
+
+    @staticmethod
+    @RPC.export(executor='process', max_workers=2)
+    def open_files():
+        fds = os.listdir('/proc/self/fd')
+        return os.getppid(), [os.readlink('/proc/self/fd/' + fd)
+                              for fd in fds if os.path.exists(
+                                  '/proc/self/fd/' + fd)]
+
+
+@pytest.fixture
+def rpc_agents(volttron_instance):
+    callee = volttron_instance.build_agent(identity='rpc.callee',
+                                           agent_class=Callee)
+    caller = volttron_instance.build_agent()
+    yield caller, callee
+    caller.core.stop()
+    callee.core.stop()
+
+
+@pytest.mark.subsystems
+def test_calls_are_sent_alone_by_default(rpc_agents):
+    caller, callee = rpc_agents
+    assert caller.vip.rpc.call('rpc.callee', 'echo', 1).get(timeout=5) == 1
+    assert caller.vip.rpc.call('rpc.callee', 'echo', 2).get(timeout=5) == 2
+    assert len(set(callee.messages)) == 2
+
+
+@pytest.mark.subsystems
+def test_calls_within_window_are_batched(rpc_agents):
+    caller, callee = rpc_agents
+    caller.vip.rpc.coalesce_window = 0.05
+    results = [caller.vip.rpc.call('rpc.callee', 'echo', i)
+               for i in range(10)]
+    failed = caller.vip.rpc.call('rpc.callee', 'fail')
+    assert [result.get(timeout=5) for result in results] == range(10)
+    with pytest.raises(RemoteError):
+        failed.get(timeout=5)
+    assert len(callee.messages) == 10
+    assert len(set(callee.messages)) == 1
+
+
+@pytest.mark.subsystems
+def test_batch_is_sent_when_limit_is_reached(rpc_agents):
+    caller, callee = rpc_agents
+    caller.vip.rpc.coalesce_window = 60
+    caller.vip.rpc.coalesce_limit = 3
+    results = [caller.vip.rpc.call('rpc.callee', 'echo', i)
+               for i in range(3)]
+    assert [result.get(timeout=5) for result in results] == range(3)
+    pending = caller.vip.rpc.call('rpc.callee', 'echo', 3)
+    gevent.sleep(0.5)
+    assert not pending.ready()
+
+
+@pytest.mark.subsystems
+def test_timed_call_is_abandoned_by_both_sides(rpc_agents):
+    caller, callee = rpc_agents
+    result = caller.vip.rpc.timed_call(0.5, 'rpc.callee', 'slow', 2)
+    with pytest.raises(gevent.Timeout):
+        result.get(timeout=5)
+    assert not caller.vip.rpc._outstanding
+    gevent.sleep(2)
+    assert not callee.finished
+
+
+@pytest.mark.subsystems
+def test_deadline_is_propagated(volttron_instance, rpc_agents):
+    caller, callee = rpc_agents
+    middle = volttron_instance.build_agent(identity='rpc.middle',
+                                           agent_class=Callee)
+    try:
+        assert caller.vip.rpc.call('rpc.callee', 'deadline').get(
+            timeout=5) is None
+        deadline = time.time() + 10
+        forwarded = caller.vip.rpc.timed_call(
+            10, 'rpc.middle', 'forward_deadline', 'rpc.callee').get(timeout=5)
+        assert abs(forwarded - deadline) < 1
+    finally:
+        middle.core.stop()
+
+
+def _dispatch_batch(requests, received=None):
+    finished = []
+
+    def slow(seconds):
+        gevent.sleep(seconds)
+        finished.append(seconds)
+        return seconds
+
+    dispatcher = Dispatcher({'slow': slow, 'echo': lambda value: value},
+                            gevent.local.local())
+    response = dispatcher.dispatch(codec.JSON.dumps(requests),
+                                   received=received)
+    return {msg['id']: msg for msg in codec.JSON.loads(response)}, finished
+
+
+@pytest.mark.subsystems
+def test_expired_request_does_not_abandon_batch():
+    expiring = jsonrpc.json_method('1', 'slow', [1], {})
+    expiring['timeout'] = 0.1
+    responses, finished = _dispatch_batch(
+        [expiring, jsonrpc.json_method('2', 'echo', [2], {})])
+    assert responses['1']['error']['code'] == jsonrpc.DEADLINE_EXCEEDED
+    assert responses['2']['result'] == 2
+    assert not finished
+
+
+@pytest.mark.subsystems
+def test_deadline_counts_from_receipt():
+    queued = jsonrpc.json_method('1', 'slow', [0], {})
+    queued['timeout'] = 1
+    waiting = jsonrpc.json_method('2', 'slow', [0], {})
+    waiting['timeout'] = 10
+    # Both requests waited 2 seconds before being dispatched.
+    responses, finished = _dispatch_batch([queued, waiting],
+                                          received=time.time() - 2)
+    assert responses['1']['error']['code'] == jsonrpc.DEADLINE_EXCEEDED
+    assert responses['2']['result'] == 0
+    assert finished == [0]
+
+
+@pytest.mark.subsystems
+def test_coalesced_calls_inherit_deadline(volttron_instance, rpc_agents):
+    caller, callee = rpc_agents
+    middle = volttron_instance.build_agent(identity='rpc.coalescing',
+                                           agent_class=Callee)
+    try:
+        middle.vip.rpc.coalesce_window = 0.05
+        deadline = time.time() + 10
+        forwarded = caller.vip.rpc.timed_call(
+            10, 'rpc.coalescing', 'forward_deadline',
+            'rpc.callee').get(timeout=5)
+        assert abs(forwarded - deadline) < 1
+    finally:
+        middle.core.stop()
+
+
+@pytest.mark.subsystems
+def test_thread_executor_does_not_block_hub(rpc_agents):
+    caller, callee = rpc_agents
+    slow = [caller.vip.rpc.call('rpc.callee', 'blocking', 1)
+            for _ in range(3)]
+    gevent.sleep(0.1)
+    start = time.time()
+    assert caller.vip.rpc.call('rpc.callee', 'echo', 1).get(timeout=5) == 1
+    assert time.time() - start < 0.5
+    assert [result.get(timeout=5) for result in slow] == [1, 1, 1]
+    stats = callee.vip.rpc.executor_stats()['blocking']
+    assert stats['submitted'] == 3
+    assert stats['pending'] == 0
+    # Two workers, so the third call waited for one to finish.
+    assert stats['max_wait_time'] >= 0.9
+
+
+@pytest.mark.subsystems
+def test_process_executor_runs_in_other_process(rpc_agents):
+    caller, callee = rpc_agents
+    pid = caller.vip.rpc.call('rpc.callee', 'pid').get(timeout=10)
+    assert pid != os.getpid()
+
+
+@pytest.mark.subsystems
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'),
+                    reason='requires /proc')
+def test_process_executor_inherits_no_sockets(rpc_agents):
+    caller, callee = rpc_agents
+    results = [caller.vip.rpc.call('rpc.callee', 'open_files')
+               for _ in range(4)]
+    # The agent stays connected and responsive while the workers run.
+    assert caller.vip.rpc.call('rpc.callee', 'echo', 1).get(timeout=5) == 1
+    sockets = {os.readlink('/proc/self/fd/' + fd)
+               for fd in os.listdir('/proc/self/fd')
+               if os.path.exists('/proc/self/fd/' + fd)}
+    sockets = {name for name in sockets if name.startswith('socket:')}
+    assert sockets
+    for result in results:
+        parent, files = result.get(timeout=10)
+        assert parent == os.getpid()
+        assert not sockets.intersection(files)
+    assert caller.vip.rpc.call('rpc.callee', 'echo', 2).get(timeout=5) == 2
+    assert callee.vip.rpc.executor_stats()['open_files']['pending'] == 0
+
+
+@pytest.mark.subsystems
+def test_rpc_stats_profile_exported_methods(rpc_agents):
+    caller, callee = rpc_agents
+    for i in range(3):
+        caller.vip.rpc.call('rpc.callee', 'echo', i).get(timeout=5)
+    with pytest.raises(RemoteError):
+        caller.vip.rpc.call('rpc.callee', 'fail').get(timeout=5)
+    stats = caller.vip.rpc.call('rpc.callee', 'rpc.stats',
+                                reset=True).get(timeout=5)
+    echo = stats['echo']
+    assert (echo['calls'], echo['errors']) == (3, 0)
+    assert sum(echo['latency'].values()) == 3
+    assert echo['request_bytes'] > 0 and echo['response_bytes'] > 0
+    assert (stats['fail']['calls'], stats['fail']['errors']) == (1, 1)
+    # The platform may call the agent, e.g. pubsub.sync, meanwhile.
+    assert not {'echo', 'fail'}.intersection(callee.vip.rpc.stats())
+
+
+@pytest.mark.subsystems
+def test_rpc_requests_are_queued_beyond_spawn_limit(volttron_instance):
+    callee = volttron_instance.build_agent(identity='rpc.limited',
+                                           agent_class=Callee,
+                                           spawn_limits={'rpc': 2})
+    caller = volttron_instance.build_agent()
+    try:
+        slow = [caller.vip.rpc.call('rpc.limited', 'slow', 0.5)
+                for _ in range(5)]
+        gevent.sleep(0.2)
+        stats = callee.vip.health.get_spawn_stats()['rpc']
+        assert stats['active'] == 2 and stats['queued'] >= 3
+        for result in slow:
+            result.get(timeout=5)
+        stats = caller.vip.rpc.call('rpc.limited',
+                                    'health.get_spawn_stats').get(timeout=5)
+        rpc = stats['rpc']
+        assert (rpc['size'], rpc['max_active']) == (2, 2)
+        assert rpc['max_queued'] >= 3
+        assert rpc['queued'] == 0
+    finally:
+        caller.core.stop()
+        callee.core.stop()
+
+
+@pytest.mark.subsystems
+def test_responses_bypass_full_spawn_pool(volttron_instance, rpc_agents):
+    caller, callee = rpc_agents
+    limited = volttron_instance.build_agent(identity='rpc.limited',
+                                            agent_class=Callee,
+                                            spawn_limits={'rpc': 1})
+    try:
+        # The only greenlet waits on a response which mentions "method".
+        assert caller.vip.rpc.call(
+            'rpc.limited', 'forward_echo', 'rpc.callee',
+            {'method': 'not a request'}).get(timeout=5) == {
+                'method': 'not a request'}
+    finally:
+        limited.core.stop()
+
+
+@pytest.mark.subsystems
+def test_requests_beyond_queue_limit_are_refused(volttron_instance):
+    callee = volttron_instance.build_agent(identity='rpc.queued',
+                                           agent_class=Callee,
+                                           spawn_limits={'rpc': 1})
+    callee.core.pool('rpc').queue_size = 2
+    caller = volttron_instance.build_agent()
+    try:
+        gevent.sleep(0.5)
+        results = [caller.vip.rpc.call('rpc.queued', 'slow', 0.5)
+                   for _ in range(5)]
+        gevent.wait(results, timeout=5)
+        refused = [result for result in results if not result.successful()]
+        assert len(refused) == 2
+        for result in refused:
+            with pytest.raises(jsonrpc.Error) as info:
+                result.get()
+            assert info.value.code == jsonrpc.SERVER_BUSY
+        stats = callee.vip.health.get_spawn_stats()['rpc']
+        assert stats['queue_size'] == 2 and stats['rejected'] >= 2
+    finally:
+        caller.core.stop()
+        callee.core.stop()
+
+
+@pytest.mark.subsystems
+def test_bulk_calls_beyond_bulk_queue_are_refused(volttron_instance,
+                                                  monkeypatch):
+    monkeypatch.setattr(Core, 'bulk_queue_size', 1)
+    callee = volttron_instance.build_agent(identity='rpc.bulk.full',
+                                           agent_class=Callee)
+    monkeypatch.undo()
+    caller = volttron_instance.build_agent()
+    try:
+        gevent.sleep(0.5)
+        results = [caller.vip.rpc.bulk_call('rpc.bulk.full', 'echo', i)
+                   for i in range(50)]
+        gevent.wait(results, timeout=5)
+        assert all(result.ready() for result in results)
+        refused = [result for result in results if not result.successful()]
+        assert refused and callee.core.bulk_dropped == len(refused)
+        for result in refused:
+            with pytest.raises(Again):
+                result.get()
+        assert caller.vip.rpc.call(
+            'rpc.bulk.full', 'echo', 'control').get(timeout=5) == 'control'
+    finally:
+        caller.core.stop()
+        callee.core.stop()
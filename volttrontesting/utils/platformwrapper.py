@@ -290,11 +290,13 @@ class PlatformWrapper:
         :param secretkey:
         :param serverkey:
         :param agent_class: Agent class to build
+        :param capabilities: Capabilities granted to the agent's key
         :return:
         """
         self.logit("Building generic agent.")
 
         use_ipc = kwargs.pop('use_ipc', False)
+        capabilities = kwargs.pop('capabilities', None)
 
         if serverkey is None:
             serverkey = self.serverkey
@@ -324,7 +326,8 @@ class PlatformWrapper:
         # Automatically add agent's credentials to auth.json file
         if publickey:
             self.logit('Adding publickey to auth.json')
-            gevent.spawn(self._append_allow_curve_key, publickey)
+            gevent.spawn(self._append_allow_curve_key, publickey,
+                         capabilities)
             gevent.sleep(0.1)
 
         if should_spawn:
@@ -353,8 +356,8 @@ class PlatformWrapper:
             auth['allow'] = []
         return auth, auth_path
 
-    def _append_allow_curve_key(self, publickey):
-        entry = AuthEntry(credentials=publickey)
+    def _append_allow_curve_key(self, publickey, capabilities=None):
+        entry = AuthEntry(credentials=publickey, capabilities=capabilities)
         authfile = AuthFile(self.volttron_home + "/auth.json")
         try:
             authfile.add(entry)